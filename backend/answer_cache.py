@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from collection_version import read_collection_version
+from text_normalization import normalize_text
+
+# Minimum cosine similarity between two questions for the cached answer to be reused
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.93"))
+# Seconds a cached answer stays valid
+ANSWER_CACHE_TTL = int(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+
+
+class SemanticAnswerCache:
+    """
+    Reuse answers of previously answered questions whose embedding is within
+    `threshold` cosine similarity of the new question.
+
+    Answers are also kept by question text, for the paths that answer without
+    an embedding (lexical fast path). Entries expire after `ttl` seconds and
+    the whole cache is dropped when the qa_collection version changes (i.e.
+    after re-ingestion).
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: int = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # (n, d) unit vectors
+        self._entries: List[Dict] = []
+        self._by_question: "OrderedDict[str, Dict]" = OrderedDict()
+        self._version = read_collection_version()
+        self.counters = {"hits": 0, "misses": 0, "question_hits": 0, "invalidations": 0}
+
+    def _check_version(self):
+        version = read_collection_version()
+        if version != self._version:
+            self._version = version
+            self._clear()
+            self.counters["invalidations"] += 1
+
+    def _clear(self):
+        self._vectors = None
+        self._entries = []
+        self._by_question.clear()
+
+    @staticmethod
+    def _question_key(question: str) -> str:
+        return normalize_text(question).lower()
+
+    def _drop_expired(self, now: float):
+        keep = [i for i, entry in enumerate(self._entries) if entry["expires_at"] > now]
+        if len(keep) == len(self._entries):
+            return
+        self._entries = [self._entries[i] for i in keep]
+        self._vectors = self._vectors[keep] if keep else None
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding) -> Optional[str]:
+        """Return a cached answer for a semantically equivalent question, if any."""
+        with self._lock:
+            self._check_version()
+            now = time.time()
+            self._drop_expired(now)
+            if self._vectors is None or self._vectors.shape[1] != len(embedding):
+                self.counters["misses"] += 1
+                return None
+            similarities = self._vectors @ self._normalize(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.counters["misses"] += 1
+                return None
+            self.counters["hits"] += 1
+            return self._entries[best]["answer"]
+
+    def lookup_question(self, question: str) -> Optional[str]:
+        """Return the cached answer of exactly this question (up to case and whitespace), if any."""
+        with self._lock:
+            self._check_version()
+            entry = self._by_question.get(self._question_key(question))
+            if entry is None or entry["expires_at"] <= time.time():
+                return None
+            self.counters["hits"] += 1
+            self.counters["question_hits"] += 1
+            return entry["answer"]
+
+    def store(self, question: str, embedding, answer: str):
+        """Cache `answer` by question text and, when `embedding` is given, by embedding."""
+        with self._lock:
+            self._check_version()
+            entry = {
+                "question": question,
+                "answer": answer,
+                "expires_at": time.time() + self.ttl
+            }
+            key = self._question_key(question)
+            self._by_question[key] = entry
+            self._by_question.move_to_end(key)
+            while len(self._by_question) > self.max_entries:
+                self._by_question.popitem(last=False)
+            if embedding is None:
+                return
+            vector = self._normalize(embedding)[None, :]
+            if self._vectors is not None and self._vectors.shape[1] != vector.shape[1]:
+                self._clear()
+            if len(self._entries) >= self.max_entries:
+                # Oldest entries first
+                drop = len(self._entries) - self.max_entries + 1
+                self._entries = self._entries[drop:]
+                self._vectors = self._vectors[drop:] if self._entries else None
+            self._entries.append(entry)
+            self._vectors = vector if self._vectors is None else np.vstack([self._vectors, vector])
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+            self.counters["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "question_entries": len(self._by_question),
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+            }
+
+
+# Khởi tạo instance global
+answer_cache = SemanticAnswerCache()
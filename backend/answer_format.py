@@ -0,0 +1,112 @@
+import itertools
+import json
+import re
+
+# Markdown markers stripped from chatbot answers before they reach the UI
+HEADING_PATTERN = re.compile(r'#+\s*')
+BOLD_PATTERN = re.compile(r'\*\*')
+# Trailing text that may still change once the next delta arrives: a run of '#'
+# (plus whitespace) can keep growing, and a run of '*' can still pair up
+PENDING_HEADING_PATTERN = re.compile(r'#+\s*\Z')
+PENDING_BOLD_PATTERN = re.compile(r'\*+\Z')
+
+
+def to_answer_text(answer) -> str:
+    """Chuyển về string UTF-8, bỏ ký tự không decode được"""
+    if isinstance(answer, str):
+        return answer.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
+    return str(answer)
+
+
+def clean_answer_text(text: str) -> str:
+    """Loại bỏ ###, #### và **"""
+    text = HEADING_PATTERN.sub('', text)
+    return BOLD_PATTERN.sub('', text)
+
+
+def _split_pending(text: str, pattern: re.Pattern):
+    match = pattern.search(text)
+    cut = match.start() if match else len(text)
+    return text[:cut], text[cut:]
+
+
+class MarkdownStreamCleaner:
+    """
+    Apply `clean_answer_text` incrementally to a token stream.
+
+    Both passes run as separate stages, each holding back the trailing text that
+    the next delta could still change, so the concatenated output equals
+    `clean_answer_text` of the full answer.
+    """
+
+    def __init__(self):
+        self.pending_heading = ''
+        self.pending_bold = ''
+
+    def feed(self, delta: str) -> str:
+        safe, self.pending_heading = _split_pending(self.pending_heading + delta, PENDING_HEADING_PATTERN)
+        safe = self.pending_bold + HEADING_PATTERN.sub('', safe)
+        safe, self.pending_bold = _split_pending(safe, PENDING_BOLD_PATTERN)
+        return BOLD_PATTERN.sub('', safe)
+
+    def flush(self) -> str:
+        text = self.pending_bold + HEADING_PATTERN.sub('', self.pending_heading)
+        self.pending_heading = self.pending_bold = ''
+        return BOLD_PATTERN.sub('', text)
+
+
+def sse_event(payload, event=None) -> str:
+    """Đóng gói một sự kiện Server-Sent Events"""
+    data = json.dumps(payload, ensure_ascii=False)
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {data}\n\n"
+
+
+def iter_answer_events(deltas):
+    """
+    Turn raw answer deltas into SSE events carrying cleaned text, followed by a
+    final `done` event with the whole cleaned answer.
+    """
+    cleaner = MarkdownStreamCleaner()
+    parts = []
+    for delta in deltas:
+        text = cleaner.feed(to_answer_text(delta))
+        if text:
+            parts.append(text)
+            yield sse_event({"delta": text})
+    text = cleaner.flush()
+    if text:
+        parts.append(text)
+        yield sse_event({"delta": text})
+    yield sse_event({"response": "".join(parts)}, event="done")
+
+
+def start_events(events):
+    """
+    Run `events` up to its first item and return an iterator over all of them,
+    so errors raised before anything is sent (rate limits) reach the caller
+    while it can still choose the status code.
+    """
+    events = iter(events)
+    try:
+        first = next(events)
+    except StopIteration:
+        return iter(())
+    return itertools.chain([first], events)
+
+
+def iter_transcript_events(segments):
+    """
+    SSE events for a streamed transcription: one `partial` event per segment
+    (with the transcript so far), then `done` with the full text.
+    """
+    texts = []
+    try:
+        for segment in segments:
+            if segment["text"]:
+                texts.append(segment["text"])
+            yield sse_event({**segment, "transcript": " ".join(texts)}, event="partial")
+    except Exception as e:
+        yield sse_event({"error": str(e)}, event="error")
+        return
+    yield sse_event({"text": " ".join(texts)}, event="done")
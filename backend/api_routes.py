@@ -0,0 +1,627 @@
+"""
+The HTTP API, independent of the web framework.
+
+Each handler takes an ApiRequest and returns a Reply; server.py (Flask) and
+server_asgi.py (FastAPI) only translate requests and replies and register
+every entry of ROUTES, so the two servers cannot drift apart. `lane` says
+where the ASGI server runs a handler: LLM (I/O bound, large pool), DOCUMENT
+(OCR / PDF / DOCX parsing) or SPEECH (decode + wait on inference_executor);
+None runs it inline because it never blocks.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Mapping, NamedTuple, Optional, Union
+
+from startup import startup_report, env_flag, warm_up
+
+with startup_report.measure("import werkzeug"):
+    from werkzeug.utils import secure_filename
+with startup_report.measure("import personalized_roadmap"):
+    from personalized_roadmap import roadmap_manager
+    from roadmap_cache import roadmap_cache
+with startup_report.measure("import content_generator"):
+    from content_generator import content_generator
+with startup_report.measure("import document_extractor"):
+    from document_extractor import document_extractor
+with startup_report.measure("import chatbot"):
+    import chatbot
+    from answer_format import to_answer_text, clean_answer_text, iter_answer_events, iter_transcript_events, start_events
+    from embedding_cache import embedding_cache
+    from answer_cache import answer_cache
+    from response_registry import response_registry
+    from llm_gateway import llm_gateway
+    from rate_limiter import RateLimited
+with startup_report.measure("import tts, stt"):
+    from tts_cache import tts_cache
+    import tts
+    import stt
+    from inference_executor import inference_executor, InferenceQueueFull
+
+LLM = "llm"
+DOCUMENT = "document"
+SPEECH = "speech"
+
+JSON_TYPE = 'application/json; charset=utf-8'
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+# Cấu hình upload file
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+UPLOAD_FOLDER = './uploads'
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+ALLOWED_EXTENSIONS = {'pdf', 'docx', 'doc', 'txt', 'jpg', 'jpeg', 'png'}
+
+
+class UploadedFile(NamedTuple):
+    filename: str
+    data: bytes
+
+
+class ApiRequest:
+    """Dữ liệu của một request, đã được server đọc sẵn (JSON body, form, query, file, header, tham số đường dẫn)"""
+
+    def __init__(self, json_body=None, form: Optional[Mapping] = None, args: Optional[Mapping] = None,
+                 files: Optional[Dict[str, UploadedFile]] = None, headers: Optional[Mapping] = None,
+                 path_params: Optional[Dict[str, str]] = None):
+        self.json = json_body if isinstance(json_body, dict) else {}
+        self.form = form or {}
+        self.args = args or {}
+        self.files = files or {}
+        self.headers = headers or {}
+        self.path_params = path_params or {}
+
+
+class Reply:
+    """
+    Response of a handler. `body` is bytes, or an iterator of bytes/str for a
+    streamed response; `lane` overrides where the ASGI server iterates it.
+    """
+
+    def __init__(self, body: Union[bytes, Iterator] = b"", status: int = 200,
+                 media_type: Optional[str] = JSON_TYPE, headers: Optional[Dict[str, str]] = None,
+                 lane: Optional[str] = None):
+        self.body = body
+        self.status = status
+        self.media_type = media_type
+        self.headers = headers or {}
+        self.lane = lane
+
+    @property
+    def stream(self) -> bool:
+        return not isinstance(self.body, (bytes, str))
+
+
+def json_reply(payload, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Reply:
+    return Reply(json.dumps(payload, ensure_ascii=False).encode("utf-8"), status, JSON_TYPE, headers)
+
+
+def error(message: str, status: int, headers: Optional[Dict[str, str]] = None) -> Reply:
+    return json_reply({"error": message}, status, headers)
+
+
+class Route(NamedTuple):
+    method: str
+    path: str  # FastAPI style: /api/roadmap/position/{position_key}
+    handler: Callable[[ApiRequest], Reply]
+    lane: Optional[str]
+
+
+ROUTES: List[Route] = []
+
+
+def route(method: str, path: str, lane: Optional[str] = None):
+    def register(handler):
+        ROUTES.append(Route(method, path, handler, lane))
+        return handler
+    return register
+
+
+def start_background_jobs():
+    """Cảnh báo cấu hình thiếu và chạy các bước làm nóng (bật bằng biến môi trường) trên thread nền"""
+    # API key chỉ đọc từ biến môi trường: báo ngay khi khởi động nếu còn thiếu
+    for variable in llm_gateway.missing_api_keys():
+        print(f"⚠️ {variable} is not set; LLM calls that need it will fail")
+    # Tải trước model STT/TTS trên thread nền (mặc định tải khi có request đầu tiên)
+    if env_flag("SPEECH_WARMUP", default=False):
+        warm_up({"stt": stt.load_model, "tts": tts.load_model})
+    # Render sẵn audio cho các câu trả lời cố định (help, hướng dẫn lệnh) vào TTS cache
+    if env_flag("TTS_PREWARM", default=False):
+        canned_texts = [clean_answer_text(text) for text in chatbot.CANNED_RESPONSES]
+        warm_up({"tts cache": lambda: tts.prewarm(canned_texts)})
+    # Tạo sẵn lộ trình cho mọi vị trí x mức kinh nghiệm (gọi LLM cho các tổ hợp chưa có trong cache)
+    if env_flag("ROADMAP_PREGENERATE", default=False):
+        warm_up({"roadmap cache": roadmap_manager.pregenerate})
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def check_upload(req: ApiRequest) -> Optional[Reply]:
+    """Lỗi của file upload trong field `file` (None nếu hợp lệ)"""
+    upload = req.files.get('file')
+    if upload is None:
+        return error("No file provided", 400)
+    if upload.filename == '':
+        return error("No file selected", 400)
+    if not allowed_file(upload.filename):
+        return error("File type not allowed", 400)
+    if len(upload.data) > MAX_CONTENT_LENGTH:
+        return error("File too large", 413)
+    return None
+
+
+def save_upload(upload: UploadedFile) -> str:
+    """Lưu file upload tạm thời vào thư mục uploads, trả về đường dẫn"""
+    filename = secure_filename(upload.filename)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    file_path = os.path.join(UPLOAD_FOLDER, f"{timestamp}_{filename}")
+    with open(file_path, 'wb') as f:
+        f.write(upload.data)
+    return file_path
+
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+@route('POST', '/api/chatbot/suggestions', LLM)
+def chatbot_suggestions(req: ApiRequest) -> Reply:
+    """Trả về gợi ý câu hỏi dựa trên lịch sử câu hỏi của user"""
+    try:
+        history = req.json.get('history', [])
+        return json_reply({"suggestions": chatbot.get_smart_suggestions(history)})
+    except Exception:
+        return json_reply({"suggestions": ["help"]})
+
+
+@route('POST', '/api/chatbot', LLM)
+def chatbot_search(req: ApiRequest) -> Reply:
+    query = req.json.get('question', '')
+    if not query:
+        return error("No query provided", 400)
+
+    # Câu trả lời cố định (help, hướng dẫn lệnh) đã được render sẵn thành bytes JSON khi khởi động
+    intent = chatbot.route_question(query)
+    rendered = response_registry.get(intent["intent"])
+    if rendered is not None:
+        return Reply(rendered.json_body, headers=rendered.headers())
+
+    # Lấy câu trả lời từ chatbot, loại bỏ ###, #### và **
+    get_answer = chatbot.get_answer(query, top_k=5, threshold=0.2, intent=intent)
+    return json_reply({"response": clean_answer_text(to_answer_text(get_answer))})
+
+
+@route('POST', '/api/chatbot/stream', LLM)
+def chatbot_stream(req: ApiRequest) -> Reply:
+    """Trả lời câu hỏi dạng stream (SSE): mỗi sự kiện chứa một đoạn câu trả lời"""
+    query = req.json.get('question', '')
+    if not query:
+        return error("No query provided", 400)
+
+    intent = chatbot.route_question(query)
+    rendered = response_registry.get(intent["intent"])
+    if rendered is not None:
+        return Reply(rendered.sse_body, media_type='text/event-stream', headers=rendered.headers())
+
+    # Chạy tới sự kiện đầu tiên trước khi gửi header, để lỗi rate limit vẫn trả được 503
+    events = start_events(iter_answer_events(chatbot.stream_answer(query, top_k=5, threshold=0.2, intent=intent)))
+    return Reply(events, media_type='text/event-stream', headers=STREAM_HEADERS)
+
+
+@route('GET', '/api/chatbot/responses/{name}')
+def canned_response(req: ApiRequest) -> Reply:
+    """Câu trả lời cố định theo tên intent, hỗ trợ If-None-Match (304 khi client đã có bản mới nhất)"""
+    rendered = response_registry.get(req.path_params['name'])
+    if rendered is None:
+        return error("Response not found", 404)
+    if response_registry.not_modified(rendered, req.headers.get('If-None-Match')):
+        return Reply(status=304, media_type=None, headers=rendered.headers())
+    return Reply(rendered.json_body, headers=rendered.headers())
+
+
+def tts_stream_reply(text) -> Reply:
+    """Trả audio WAV dạng chunked: mỗi câu được gửi ngay khi tổng hợp xong"""
+    # Synthesis runs on the TTS pipeline thread; iterating only waits for frames
+    return Reply(tts.iter_tts_audio(text), media_type='audio/wav', headers=STREAM_HEADERS, lane=LLM)
+
+
+@route('POST', '/api/tts/stream')
+def tts_stream_endpoint(req: ApiRequest) -> Reply:
+    """Audio WAV dạng chunked cho client đọc bằng fetch, phát ngay khi câu đầu tiên sẵn sàng"""
+    text = req.json.get('text', '')
+    if not text:
+        return error("No text provided", 400)
+    return tts_stream_reply(text)
+
+
+@route('POST', '/api/tts', SPEECH)
+def tts_endpoint(req: ApiRequest) -> Reply:
+    text = req.json.get('text', '')
+    if not text:
+        return error("No text provided", 400)
+
+    if req.json.get('stream'):
+        return tts_stream_reply(text)
+
+    try:
+        audio_buffer = tts.generate_tts_audio(text)
+        return Reply(audio_buffer.getvalue(), media_type='audio/wav',
+                     headers={'Content-Disposition': 'attachment; filename=speech.wav'})
+    except InferenceQueueFull as e:
+        return error(str(e), 503, {'Retry-After': '1'})
+    except Exception as e:
+        return error(f"TTS generation failed: {str(e)}", 500)
+
+
+@route('POST', '/api/stt', SPEECH)
+def api_stt(req: ApiRequest) -> Reply:
+    # The first call loads the model, so it runs on the speech lane
+    if not stt.is_available():
+        return error("STT model not available", 500)
+
+    upload = req.files.get('audio')
+    if upload is None:
+        return error("No audio file provided", 400)
+
+    # stream=true (form hoặc query): trả transcript từng đoạn (SSE) khi mỗi đoạn được nhận dạng xong
+    if str(req.form.get('stream', req.args.get('stream', ''))).lower() in ('1', 'true'):
+        try:
+            # Decode trực tiếp từ request, không ghi file tạm
+            speech = stt.decode_audio(upload.data)
+        except Exception as e:
+            return error(str(e), 400)
+        return Reply(iter_transcript_events(stt.transcribe_segments(speech)),
+                     media_type='text/event-stream', headers=STREAM_HEADERS)
+
+    try:
+        return json_reply({"text": stt.transcribe_bytes(upload.data)})
+    except InferenceQueueFull as e:
+        return error(str(e), 503, {'Retry-After': '1'})
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@route('GET', '/api/cache/stats')
+def cache_stats(req: ApiRequest) -> Reply:
+    """Thống kê hit/miss của các cache"""
+    return json_reply({
+        "embedding_cache": embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "tts_cache": tts_cache.stats(),
+        "retriever": chatbot.retriever.stats(),
+        "lexical_index": chatbot.lexical_index.stats(),
+        "intent_router": chatbot.intent_router.stats(),
+        "response_registry": response_registry.stats(),
+        "roadmap_cache": roadmap_cache.stats()
+    })
+
+
+@route('GET', '/api/inference/stats')
+def inference_stats(req: ApiRequest) -> Reply:
+    """Thống kê hàng đợi suy luận của model giọng nói"""
+    return json_reply({
+        "stt_batcher": stt.stt_batcher.stats(),
+        "executor": inference_executor.stats()
+    })
+
+
+@route('GET', '/api/llm/stats')
+def llm_stats(req: ApiRequest) -> Reply:
+    """Độ trễ, số lần retry và token đã dùng của các lời gọi LLM/embedding, theo nơi gọi"""
+    return json_reply(llm_gateway.stats())
+
+
+@route('GET', '/api/startup')
+def startup_stats(req: ApiRequest) -> Reply:
+    """Thời gian import và khởi tạo của từng module"""
+    return json_reply(startup_report.as_dict())
+
+
+# Endpoints cho lộ trình onboarding cá nhân hóa
+@route('GET', '/api/roadmap/positions')
+def get_positions(req: ApiRequest) -> Reply:
+    """Lấy danh sách các vị trí có sẵn"""
+    try:
+        return json_reply({"positions": roadmap_manager.get_available_positions()})
+    except Exception as e:
+        return error(f"Failed to get positions: {str(e)}", 500)
+
+
+@route('POST', '/api/roadmap/generate', LLM)
+def generate_roadmap(req: ApiRequest) -> Reply:
+    """Tạo lộ trình onboarding cá nhân hóa"""
+    try:
+        position = req.json.get('position', '')
+        experience_level = req.json.get('experience_level', 'fresher')
+        specific_interests = req.json.get('specific_interests', [])
+
+        if not position:
+            return error("Position is required", 400)
+
+        roadmap = roadmap_manager.generate_personalized_roadmap(
+            position, experience_level, specific_interests
+        )
+        return json_reply({
+            "roadmap": roadmap,
+            "position": position,
+            "experience_level": experience_level
+        })
+    except RateLimited:
+        raise
+    except Exception as e:
+        return error(f"Failed to generate roadmap: {str(e)}", 500)
+
+
+@route('POST', '/api/roadmap/suggestions', LLM)
+def get_learning_suggestions(req: ApiRequest) -> Reply:
+    """Lấy gợi ý học tập tiếp theo"""
+    try:
+        position = req.json.get('position', '')
+        completed_items = req.json.get('completed_items', [])
+
+        if not position:
+            return error("Position is required", 400)
+
+        suggestions = roadmap_manager.get_learning_suggestions(position, completed_items)
+        return json_reply({"suggestions": suggestions, "position": position})
+    except RateLimited:
+        raise
+    except Exception as e:
+        return error(f"Failed to get suggestions: {str(e)}", 500)
+
+
+@route('GET', '/api/roadmap/position/{position_key}')
+def get_position_details(req: ApiRequest) -> Reply:
+    """Lấy chi tiết lộ trình cho vị trí cụ thể"""
+    try:
+        roadmap_data = roadmap_manager.get_roadmap_for_position(req.path_params['position_key'])
+        if roadmap_data:
+            return json_reply(roadmap_data)
+        return error("Position not found", 404)
+    except Exception as e:
+        return error(f"Failed to get position details: {str(e)}", 500)
+
+
+# Endpoints cho tạo nội dung tự động
+@route('POST', '/api/content/welcome-email', LLM)
+def generate_welcome_email(req: ApiRequest) -> Reply:
+    """Tạo email chào mừng tự động"""
+    try:
+        employee_info = req.json.get('employee_info', {})
+        email = content_generator.generate_welcome_email(employee_info)
+        return json_reply({"email": email, "generated_at": datetime.now().isoformat()})
+    except RateLimited:
+        raise
+    except Exception as e:
+        return error(f"Failed to generate welcome email: {str(e)}", 500)
+
+
+@route('POST', '/api/content/reminder-email', LLM)
+def generate_reminder_email(req: ApiRequest) -> Reply:
+    """Tạo email nhắc nhở"""
+    try:
+        employee_name = req.json.get('employee_name', '')
+        company_name = req.json.get('company_name', 'Công ty')
+        pending_tasks = req.json.get('pending_tasks', [])
+        deadline = req.json.get('deadline', '')
+
+        if not employee_name:
+            return error("Employee name is required", 400)
+
+        email = content_generator.generate_reminder_email(
+            employee_name, company_name, pending_tasks, deadline
+        )
+        return json_reply({"email": email, "generated_at": datetime.now().isoformat()})
+    except RateLimited:
+        raise
+    except Exception as e:
+        return error(f"Failed to generate reminder email: {str(e)}", 500)
+
+
+@route('POST', '/api/content/summarize', LLM)
+def summarize_document(req: ApiRequest) -> Reply:
+    """Tóm tắt tài liệu"""
+    try:
+        document_text = req.json.get('document_text', '')
+        summary_type = req.json.get('summary_type', 'general')  # general, key_points, action_items
+
+        if not document_text:
+            return error("Document text is required", 400)
+
+        summary = content_generator.summarize_document(document_text, summary_type)
+        return json_reply({
+            "summary": summary,
+            "summary_type": summary_type,
+            "original_length": len(document_text),
+            "generated_at": datetime.now().isoformat()
+        })
+    except RateLimited:
+        raise
+    except Exception as e:
+        return error(f"Failed to summarize document: {str(e)}", 500)
+
+
+@route('POST', '/api/content/training-questions', LLM)
+def generate_training_questions(req: ApiRequest) -> Reply:
+    """Sinh câu hỏi đào tạo"""
+    try:
+        content = req.json.get('content', '')
+        question_type = req.json.get('question_type', 'mixed')  # mixed, multiple_choice, true_false
+        num_questions = req.json.get('num_questions', 5)
+
+        if not content:
+            return error("Content is required", 400)
+
+        questions = content_generator.generate_training_questions(content, question_type, num_questions)
+        return json_reply({
+            "questions": questions,
+            "question_type": question_type,
+            "num_questions": len(questions),
+            "generated_at": datetime.now().isoformat()
+        })
+    except RateLimited:
+        raise
+    except Exception as e:
+        return error(f"Failed to generate training questions: {str(e)}", 500)
+
+
+@route('POST', '/api/content/onboarding-checklist', LLM)
+def generate_onboarding_checklist(req: ApiRequest) -> Reply:
+    """Tạo checklist onboarding"""
+    try:
+        position = req.json.get('position', '')
+        department = req.json.get('department', '')
+
+        if not position:
+            return error("Position is required", 400)
+
+        checklist = content_generator.generate_onboarding_checklist(position, department)
+        return json_reply({
+            "checklist": checklist,
+            "position": position,
+            "department": department,
+            "generated_at": datetime.now().isoformat()
+        })
+    except RateLimited:
+        raise
+    except Exception as e:
+        return error(f"Failed to generate checklist: {str(e)}", 500)
+
+
+# Endpoints cho trích xuất thông tin tự động
+@route('POST', '/api/extract/upload', DOCUMENT)
+def upload_document(req: ApiRequest) -> Reply:
+    """Upload và xử lý tài liệu"""
+    try:
+        problem = check_upload(req)
+        if problem is not None:
+            return problem
+        document_type = req.form.get('document_type', 'cv')  # cv, id_card, diploma, general
+
+        file_path = save_upload(req.files['file'])
+        try:
+            # OCR / PDF / DOCX parsing is CPU-bound; the LLM extraction runs on the same worker
+            result = document_extractor.process_document_file(file_path, document_type)
+        finally:
+            # Xóa file tạm sau khi xử lý
+            remove_quietly(file_path)
+
+        return json_reply({"result": result, "processed_at": datetime.now().isoformat()})
+    except RateLimited:
+        raise
+    except Exception as e:
+        return error(f"Failed to process document: {str(e)}", 500)
+
+
+@route('POST', '/api/extract/text', LLM)
+def extract_from_text(req: ApiRequest) -> Reply:
+    """Trích xuất thông tin từ text đã có"""
+    try:
+        text = req.json.get('text', '')
+        document_type = req.json.get('document_type', 'cv')
+
+        if not text:
+            return error("Text is required", 400)
+
+        if document_type == 'cv':
+            extracted_data = document_extractor.extract_cv_information(text)
+        else:
+            extracted_data = document_extractor.extract_document_information(text, document_type)
+        return json_reply({
+            "extracted_data": extracted_data,
+            "document_type": document_type,
+            "processed_at": datetime.now().isoformat()
+        })
+    except RateLimited:
+        raise
+    except Exception as e:
+        return error(f"Failed to extract information: {str(e)}", 500)
+
+
+@route('POST', '/api/extract/auto-fill', LLM)
+def auto_fill_form(req: ApiRequest) -> Reply:
+    """Tự động điền biểu mẫu từ dữ liệu đã trích xuất"""
+    try:
+        extracted_data = req.json.get('extracted_data', {})
+        form_template = req.json.get('form_template', 'employee_info_form')
+
+        if not extracted_data:
+            return error("Extracted data is required", 400)
+
+        filled_form = document_extractor.auto_fill_form(extracted_data, form_template)
+        return json_reply({
+            "filled_form": filled_form,
+            "form_template": form_template,
+            "processed_at": datetime.now().isoformat()
+        })
+    except RateLimited:
+        raise
+    except Exception as e:
+        return error(f"Failed to auto-fill form: {str(e)}", 500)
+
+
+@route('GET', '/api/extract/form-templates')
+def get_form_templates(req: ApiRequest) -> Reply:
+    """Lấy danh sách templates biểu mẫu"""
+    try:
+        return json_reply({"templates": document_extractor.get_form_templates()})
+    except Exception as e:
+        return error(f"Failed to get form templates: {str(e)}", 500)
+
+
+@route('POST', '/api/extract/form-templates')
+def add_form_template(req: ApiRequest) -> Reply:
+    """Thêm template biểu mẫu mới"""
+    try:
+        template_name = req.json.get('template_name', '')
+        template_data = req.json.get('template_data', {})
+
+        if not template_name or not template_data:
+            return error("Template name and data are required", 400)
+
+        document_extractor.add_form_template(template_name, template_data)
+        return json_reply({"message": "Template added successfully", "template_name": template_name})
+    except Exception as e:
+        return error(f"Failed to add template: {str(e)}", 500)
+
+
+@route('POST', '/api/extract/process-complete', DOCUMENT)
+def process_document_complete(req: ApiRequest) -> Reply:
+    """Xử lý tài liệu hoàn chỉnh: upload -> extract -> auto-fill"""
+    try:
+        problem = check_upload(req)
+        if problem is not None:
+            return problem
+        document_type = req.form.get('document_type', 'cv')
+        form_template = req.form.get('form_template', 'employee_info_form')
+
+        file_path = save_upload(req.files['file'])
+        try:
+            # Bước 1: Xử lý tài liệu
+            process_result = document_extractor.process_document_file(file_path, document_type)
+            if process_result.get("processing_status") != "success":
+                return json_reply({
+                    "error": "Document processing failed",
+                    "details": process_result
+                }, 400)
+
+            # Bước 2: Tự động điền biểu mẫu
+            extracted_data = process_result.get("extracted_data", {})
+            filled_form = document_extractor.auto_fill_form(extracted_data, form_template)
+            return json_reply({
+                "document_processing": process_result,
+                "auto_filled_form": filled_form,
+                "processed_at": datetime.now().isoformat()
+            })
+        finally:
+            # Xóa file tạm
+            remove_quietly(file_path)
+    except RateLimited:
+        raise
+    except Exception as e:
+        return error(f"Failed to process document completely: {str(e)}", 500)
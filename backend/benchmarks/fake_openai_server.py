@@ -0,0 +1,147 @@
+"""
+Minimal OpenAI-compatible server for offline benchmarks.
+
+Serves `/chat/completions` and `/embeddings` with deterministic payloads and an
+injected per-request latency, so pipeline changes can be measured without
+touching the real upstream.
+
+    python -m benchmarks.fake_openai_server --port 8765 --latency 0.3
+"""
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSIONS = 64
+
+
+def fake_embedding(text, dimensions=EMBEDDING_DIMENSIONS):
+    """Deterministic unit vector derived from the text hash."""
+    values = []
+    counter = 0
+    while len(values) < dimensions:
+        digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        values.extend((byte - 127.5) / 127.5 for byte in digest)
+        counter += 1
+    values = values[:dimensions]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+def fake_tool_arguments(function_name, prompt):
+    seed = hashlib.md5(prompt.encode("utf-8")).hexdigest()[:8]
+    if function_name == "generate_qa_pairs":
+        return {"qa_pairs": [
+            {"question": f"Câu hỏi {seed}-{i}?", "answer": f"Câu trả lời {seed}-{i}."}
+            for i in range(4)
+        ]}
+    if function_name == "paraphrase_questions":
+        return {"paraphrases": [f"Diễn đạt {seed}-{i}?" for i in range(2)]}
+    return {}
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    embedding_latency = 0.0
+    stats = {"chat": 0, "embeddings": 0, "embedded_inputs": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            time.sleep(self.latency)
+            self.send_json(self.chat_completion(body))
+        elif self.path.endswith("/embeddings"):
+            time.sleep(self.embedding_latency)
+            self.send_json(self.embeddings(body))
+        else:
+            self.send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+    def chat_completion(self, body):
+        with self.stats_lock:
+            self.stats["chat"] += 1
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        message = {"role": "assistant", "content": None}
+        finish_reason = "stop"
+        tool_choice = body.get("tool_choice")
+        if isinstance(tool_choice, dict):
+            name = tool_choice["function"]["name"]
+            message["tool_calls"] = [{
+                "id": "call_0",
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "arguments": json.dumps(fake_tool_arguments(name, prompt), ensure_ascii=False)
+                }
+            }]
+            finish_reason = "tool_calls"
+        else:
+            message["content"] = f"Câu trả lời mẫu cho: {prompt[-80:]}"
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 50,
+                      "total_tokens": len(prompt) // 4 + 50}
+        }
+
+    def embeddings(self, body):
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        with self.stats_lock:
+            self.stats["embeddings"] += 1
+            self.stats["embedded_inputs"] += len(inputs)
+        tokens = sum(len(text) // 4 for text in inputs)
+        return {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                     for i, text in enumerate(inputs)],
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    def send_json(self, payload, status=200):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_fake_server(port=0, latency=0.0, embedding_latency=None):
+    """Start the server on a background thread and return it (use `server.server_port`)."""
+    handler = type("Handler", (FakeOpenAIHandler,), {
+        "latency": latency,
+        "embedding_latency": latency if embedding_latency is None else embedding_latency,
+        "stats": {"chat": 0, "embeddings": 0, "embedded_inputs": 0},
+        "stats_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per chat request")
+    parser.add_argument("--embedding-latency", type=float, default=None)
+    args = parser.parse_args()
+    server = start_fake_server(args.port, args.latency, args.embedding_latency)
+    print(f"Fake OpenAI server on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
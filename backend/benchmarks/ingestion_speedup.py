@@ -0,0 +1,80 @@
+"""
+Measure sequential vs concurrent ingestion against the fake OpenAI server.
+
+Run from the backend directory:
+
+    python -m benchmarks.ingestion_speedup --chunks 20 --latency 0.2 --max-in-flight 1 4 8 16
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.fake_openai_server import start_fake_server
+
+
+class MemoryCollection:
+    """Stand-in for a Chroma collection that only counts rows."""
+
+    def __init__(self):
+        self.rows = 0
+        self.calls = 0
+
+    def add(self, documents, metadatas, embeddings, ids):
+        self.rows += len(documents)
+        self.calls += 1
+
+    def count(self):
+        return self.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per upstream request")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-in-flight", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    server = start_fake_server(latency=args.latency)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ.setdefault("EMBEDDING_API_KEY", "fake")
+    # The fake vectors must not land in the real embedding cache
+    os.environ["EMBEDDING_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_embedding_cache_")
+    # Measure the pipeline, not the client-side rate limiter
+    for limit in ("LLM_CHAT_RPM", "LLM_CHAT_TPM", "LLM_EMBEDDING_RPM", "LLM_EMBEDDING_TPM"):
+        os.environ.setdefault(limit, "0")
+
+    # Imported after the environment points at the fake server
+    import embedding
+
+    chunks = [embedding.make_chunk(f"Chunk {i}", f"Nội dung quy định số {i}", source="bench.json")
+              for i in range(args.chunks)]
+
+    results = []
+    collection = MemoryCollection()
+    started = time.perf_counter()
+    embedding.ingest_chunks(collection, chunks, batch_size=args.batch_size)
+    results.append(("sequential", time.perf_counter() - started, collection.rows, collection.calls))
+
+    for max_in_flight in args.max_in_flight:
+        collection = MemoryCollection()
+        engine = embedding.ConcurrentIngestionEngine(
+            collection, max_in_flight=max_in_flight, batch_size=args.batch_size
+        )
+        started = time.perf_counter()
+        engine.run(chunks)
+        results.append((f"concurrent x{max_in_flight}", time.perf_counter() - started,
+                        collection.rows, collection.calls))
+
+    baseline = results[0][1]
+    print(f"\n{args.chunks} chunks, {args.latency:.2f}s upstream latency, batch size {args.batch_size}")
+    print(f"{'mode':<18}{'seconds':>10}{'speedup':>10}{'rows':>8}{'adds':>6}")
+    for mode, seconds, rows, calls in results:
+        print(f"{mode:<18}{seconds:>10.2f}{baseline / seconds:>9.1f}x{rows:>8}{calls:>6}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Command routing accuracy and latency: the former keyword cascade of
+chatbot.get_answer against intent_router.
+
+The corpus is benchmarks/data/intent_questions.json (command phrasings, with
+and without accents, and policy questions that happen to contain a command
+keyword) plus every question of the retrieval eval set, labeled "rag". From
+the backend directory:
+
+    python -m benchmarks.intent_routing
+    python -m benchmarks.intent_routing --classifier --threshold 0.3   # + centroid classifier (local embedding)
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+
+from benchmarks.local_embedding import local_embedding, local_embeddings
+from benchmarks.retrieval_eval import load_eval_set
+from inference_executor import percentile
+from intent_router import INTENT_CLASSIFIER_THRESHOLD, RAG_INTENT, IntentRouter
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "data", "intent_questions.json")
+
+
+def legacy_route(question, positions):
+    """The keyword cascade get_command_response used before intent_router, returning the intent name."""
+    lower = question.lower().strip()
+    if any(keyword in lower for keyword in ['lộ trình', 'roadmap', 'onboarding', 'học tập']):
+        if any(keyword in lower for keyword in ['tạo', 'gợi ý', 'đề xuất']):
+            for pos in positions:
+                if pos in lower:
+                    return {"intent": "roadmap", "position": pos}
+            return {"intent": "roadmap_help", "position": None}
+    if any(keyword in lower for keyword in ['email', 'tóm tắt', 'câu hỏi', 'checklist']):
+        if 'email chào mừng' in lower or 'welcome email' in lower:
+            return {"intent": "welcome_email", "position": None}
+        if 'tóm tắt' in lower:
+            return {"intent": "summarize", "position": None}
+        if 'câu hỏi' in lower and 'đào tạo' in lower:
+            return {"intent": "training_questions", "position": None}
+    if any(keyword in lower for keyword in ['cv', 'hồ sơ', 'trích xuất', 'tự động điền']):
+        return {"intent": "extraction", "position": None}
+    if any(keyword in lower for keyword in ['help', 'trợ giúp', 'hướng dẫn', 'chức năng']):
+        return {"intent": "help", "position": None}
+    return {"intent": RAG_INTENT, "position": None}
+
+
+def load_corpus(path=DATA_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rows, queries = load_eval_set()
+    questions = data["questions"] + [{"text": text, "intent": RAG_INTENT} for text, _ in rows + queries]
+    return data["positions"], questions
+
+
+def evaluate(route, questions, repeats):
+    correct, errors, latencies = 0, Counter(), []
+    for question in questions:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = route(question["text"])
+            latencies.append((time.perf_counter() - started) * 1e6)
+        ok = result["intent"] == question["intent"] and result.get("position") == question.get("position")
+        correct += ok
+        if not ok:
+            errors[(question["intent"], result["intent"])] += 1
+    return correct / len(questions), errors, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--classifier", action="store_true", help="also route with the centroid classifier")
+    parser.add_argument("--threshold", type=float, default=INTENT_CLASSIFIER_THRESHOLD,
+                        help="classifier threshold (the local embedding scores lower than the real model)")
+    parser.add_argument("--data", default=DATA_FILE)
+    args = parser.parse_args()
+
+    positions, questions = load_corpus(args.data)
+    router = IntentRouter()
+    router.set_positions(positions)
+    routes = {
+        "legacy": lambda text: legacy_route(text, list(positions)),
+        "automaton": router.route,
+    }
+    if args.classifier:
+        classified = IntentRouter()
+        classified.set_positions(positions)
+        classified.enable_classifier(local_embeddings, args.threshold)
+        routes["automaton+centroid"] = lambda text: classified.route(text, embed=local_embedding)
+
+    commands = sum(question["intent"] != RAG_INTENT for question in questions)
+    print(f"{len(questions)} questions ({commands} commands, {len(questions) - commands} rag)")
+    print(f"{'router':>20}{'accuracy':>10}{'p50 us':>9}{'p99 us':>9}  errors (expected -> routed)")
+    for name, route in routes.items():
+        accuracy, errors, latencies = evaluate(route, questions, args.repeats)
+        summary = ", ".join(f"{expected}->{routed} x{count}" for (expected, routed), count in errors.most_common())
+        print(f"{name:>20}{accuracy:>10.3f}{percentile(latencies, 0.5):>9.1f}{percentile(latencies, 0.99):>9.1f}"
+              f"  {summary or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Offline stand-in for the embedding model, for benchmarks that must not call the API.
+
+Texts are accent-folded and turned into hashed word, word-bigram and character
+trigram features, then L2-normalized. Vectors of texts that share vocabulary
+are close, which is enough to compare retriever configurations against each
+other (absolute recall is lower than with the real model).
+"""
+import hashlib
+import re
+from typing import List
+
+import numpy as np
+
+from text_normalization import fold
+
+DIMENSIONS = 512
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def _bucket(feature: str, dimensions: int):
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dimensions, 1.0 if value >> 63 else -1.0
+
+
+def local_embedding(text: str, dimensions: int = DIMENSIONS) -> List[float]:
+    words = WORD_PATTERN.findall(fold(text))
+    features = [(f"w:{word}", 1.0) for word in words]
+    features += [(f"b:{a} {b}", 1.0) for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"#{word}#"
+        features += [(f"c:{padded[i:i + 3]}", 0.3) for i in range(len(padded) - 2)]
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature, weight in features:
+        index, sign = _bucket(feature, dimensions)
+        vector[index] += sign * weight
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+def local_embeddings(texts: List[str], dimensions: int = DIMENSIONS) -> List[List[float]]:
+    return [local_embedding(text, dimensions) for text in texts]
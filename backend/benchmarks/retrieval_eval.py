@@ -0,0 +1,191 @@
+"""
+Retrieval quality and latency for the chatbot's retriever configurations.
+
+Corpus rows (the questions ingestion would store in qa_collection) and held-out
+user queries come from benchmarks/data/retrieval_eval.json, each labeled with
+the chunk it belongs to. A query is a hit at k when one of the first k rows
+that pass the similarity threshold belongs to the expected chunk. Runs offline
+with the local embedding stand-in; from the backend directory:
+
+    python -m benchmarks.retrieval_eval
+    python -m benchmarks.retrieval_eval --top-k 1 3 5 10 --thresholds 0 0.2 0.4 --pad-rows 5000
+    python -m benchmarks.retrieval_eval --chroma     # also query real Chroma collections
+    python -m benchmarks.retrieval_eval --no-lexical # skip the BM25 hybrid configuration
+
+Metric configurations: "numpy" is the default in-memory retriever; "exact-*"
+reproduce the distances a Chroma collection created with that hnsw:space
+reports (exactly, without HNSW approximation); "legacy" is an l2 collection
+read with `1 - distance`, as chatbot.py did before the metadata fix.
+"numpy+bm25" fuses the numpy results with the BM25 index over the same rows
+(reciprocal rank fusion, as chatbot.retrieve_context does).
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.local_embedding import local_embeddings
+from inference_executor import percentile
+from retriever import ChromaRetriever, NumpyRetriever, filter_by_similarity
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "data", "retrieval_eval.json")
+
+
+class EvalCollection:
+    """
+    In-memory stand-in for a Chroma collection: `get` for NumpyRetriever and an
+    exact `query` that reports distances in the given hnsw:space.
+    """
+
+    def __init__(self, vectors, documents, metadatas, metric="cosine"):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.documents = documents
+        self.metadatas = metadatas
+        self.metadata = {"hnsw:space": metric}
+        self.ids = [str(i) for i in range(len(documents))]
+
+    def count(self):
+        return len(self.documents)
+
+    def get(self, include=None, limit=None, offset=0):
+        end = len(self.ids) if limit is None else offset + limit
+        return {"ids": self.ids[offset:end], "embeddings": self.vectors[offset:end],
+                "documents": self.documents[offset:end], "metadatas": self.metadatas[offset:end]}
+
+    def _distances(self, query):
+        metric = self.metadata["hnsw:space"]
+        if metric == "l2":
+            return np.sum((self.vectors - query) ** 2, axis=1)
+        if metric == "ip":
+            return 1 - self.vectors @ query
+        norms = np.linalg.norm(self.vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+        return 1 - (self.vectors @ query) / np.where(norms == 0, 1, norms)
+
+    def query(self, query_embeddings, n_results, include=None):
+        distances = self._distances(np.asarray(query_embeddings[0], dtype=np.float32))
+        top = np.argsort(distances)[:n_results]
+        return {"documents": [[self.documents[i] for i in top]],
+                "metadatas": [[self.metadatas[i] for i in top]],
+                "distances": [[float(distances[i]) for i in top]]}
+
+
+class LegacyRetriever(ChromaRetriever):
+    """l2 collection whose distances are read as `1 - distance` (the old chatbot behaviour)."""
+
+    def __init__(self, collection):
+        super().__init__(collection)
+        self.metric = "cosine"
+
+
+class HybridRetriever(NumpyRetriever):
+    """NumpyRetriever whose results are fused with a BM25 index over the same rows."""
+
+    def __init__(self, collection, lexical_index):
+        super().__init__(collection, reload_interval=float("inf"))
+        self.lexical_index = lexical_index
+
+
+def load_eval_set(path=DATA_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rows, queries = [], []
+    for chunk in data["chunks"]:
+        rows += [(question, chunk["chunk_hash"]) for question in chunk["indexed_questions"]]
+        queries += [(question, chunk["chunk_hash"]) for question in chunk["queries"]]
+    return rows, queries
+
+
+def padding_rows(count, dimensions, seed=0):
+    """Random unit vectors standing in for unrelated rows, to reach a realistic corpus size."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_retrievers(vectors, documents, metadatas, use_chroma, lexical_dir=None):
+    def collection(metric):
+        return EvalCollection(vectors, documents, metadatas, metric)
+
+    retrievers = {
+        "numpy": NumpyRetriever(collection("cosine"), reload_interval=float("inf")),
+        "exact-cosine": ChromaRetriever(collection("cosine")),
+        "exact-l2": ChromaRetriever(collection("l2")),
+        "exact-ip": ChromaRetriever(collection("ip")),
+        "legacy": LegacyRetriever(collection("l2")),
+    }
+    if lexical_dir:
+        from lexical_index import LexicalIndex, build_lexical_index
+        # No chunk texts in the eval set: only the row index takes part in the fusion
+        build_lexical_index(collection("cosine"), [], lexical_dir)
+        retrievers["numpy+bm25"] = HybridRetriever(collection("cosine"), LexicalIndex(lexical_dir))
+    if use_chroma:
+        import chromadb
+        client = chromadb.EphemeralClient()
+        for metric in ("cosine", "l2", "ip"):
+            chroma_collection = client.create_collection(f"eval_{metric}", metadata={"hnsw:space": metric})
+            for start in range(0, len(documents), 5000):
+                chroma_collection.add(ids=[str(i) for i in range(start, min(start + 5000, len(documents)))],
+                                      embeddings=vectors[start:start + 5000].tolist(),
+                                      documents=documents[start:start + 5000],
+                                      metadatas=metadatas[start:start + 5000])
+            retrievers[f"chroma-{metric}"] = ChromaRetriever(chroma_collection)
+    return retrievers
+
+
+def evaluate(retriever, query_vectors, query_texts, expected, top_k, threshold):
+    hits, reciprocal_ranks, latencies = 0, [], []
+    for vector, text, chunk_hash in zip(query_vectors, query_texts, expected):
+        started = time.perf_counter()
+        results = filter_by_similarity(retriever.query(vector, top_k), threshold, retriever.metric)
+        if isinstance(retriever, HybridRetriever):
+            results = retriever.lexical_index.fuse(results, text, top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        ranks = [rank for rank, metadata in enumerate(results["metadatas"][0], 1)
+                 if metadata["chunk_hash"] == chunk_hash]
+        hits += bool(ranks)
+        reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+    return {
+        "recall": hits / len(expected),
+        "mrr": sum(reciprocal_ranks) / len(expected),
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.0, 0.2, 0.4])
+    parser.add_argument("--pad-rows", type=int, default=3000, help="unrelated rows added to the corpus")
+    parser.add_argument("--chroma", action="store_true", help="also evaluate real Chroma collections")
+    parser.add_argument("--no-lexical", action="store_true", help="skip the numpy+bm25 configuration")
+    parser.add_argument("--data", default=DATA_FILE)
+    args = parser.parse_args()
+
+    rows, queries = load_eval_set(args.data)
+    row_vectors = np.asarray(local_embeddings([question for question, _ in rows]), dtype=np.float32)
+    vectors = np.concatenate([row_vectors, padding_rows(args.pad_rows, row_vectors.shape[1])])
+    documents = [question for question, _ in rows] + [f"padding {i}" for i in range(args.pad_rows)]
+    metadatas = ([{"answer": "", "chunk_hash": chunk_hash} for _, chunk_hash in rows]
+                 + [{"answer": "", "chunk_hash": "padding"}] * args.pad_rows)
+    query_texts = [question for question, _ in queries]
+    query_vectors = local_embeddings(query_texts)
+    expected = [chunk_hash for _, chunk_hash in queries]
+
+    lexical_dir = None if args.no_lexical else os.path.join(tempfile.mkdtemp(), "lexical_index")
+    retrievers = build_retrievers(vectors, documents, metadatas, args.chroma, lexical_dir)
+    print(f"{len(queries)} queries, {len(rows)} labeled rows + {args.pad_rows} padding rows")
+    print(f"{'retriever':>14}{'top_k':>7}{'thresh':>8}{'recall@k':>10}{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, retriever in retrievers.items():
+        for top_k in args.top_k:
+            for threshold in args.thresholds:
+                result = evaluate(retriever, query_vectors, query_texts, expected, top_k, threshold)
+                print(f"{name:>14}{top_k:>7}{threshold:>8.2f}{result['recall']:>10.3f}{result['mrr']:>8.3f}"
+                      f"{result['p50_ms']:>9.3f}{result['p95_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
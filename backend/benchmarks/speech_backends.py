@@ -0,0 +1,159 @@
+"""
+Compare SPEECH_BACKEND=eager|quantized|onnx: load time, latency, peak RSS and
+STT word error rate on a local sample set.
+
+The sample directory holds audio files plus a reference transcript per clip,
+either `<clip>.txt` next to it or a `transcripts.tsv` (file<TAB>text). Clips
+without a reference are scored against the eager backend's transcription.
+Each backend runs in its own process so RSS numbers do not mix. Run from the
+backend directory (export the ONNX files first with export_speech_onnx.py):
+
+    python -m benchmarks.speech_backends --samples ./samples/stt
+    python -m benchmarks.speech_backends --samples ./samples/stt --backends eager quantized --tts
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+AUDIO_EXTENSIONS = {".wav", ".flac", ".mp3", ".ogg", ".webm", ".m4a"}
+TTS_SENTENCES = [
+    "Chào mừng bạn đến với công ty.",
+    "Giờ làm việc bắt đầu từ tám giờ sáng đến năm giờ chiều.",
+    "Vui lòng hoàn thành khóa đào tạo an toàn thông tin trong tuần đầu tiên.",
+]
+
+
+def load_samples(directory):
+    """Return [(path, reference or None)] for every audio file in `directory`."""
+    references = {}
+    tsv = os.path.join(directory, "transcripts.tsv")
+    if os.path.exists(tsv):
+        with open(tsv, "r", encoding="utf-8") as f:
+            for line in f:
+                if "\t" in line:
+                    name, text = line.rstrip("\n").split("\t", 1)
+                    references[name] = text
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(name)
+        if extension.lower() not in AUDIO_EXTENSIONS:
+            continue
+        reference = references.get(name)
+        txt = os.path.join(directory, stem + ".txt")
+        if reference is None and os.path.exists(txt):
+            with open(txt, "r", encoding="utf-8") as f:
+                reference = f.read().strip()
+        samples.append((os.path.join(directory, name), reference))
+    return samples
+
+
+def word_errors(reference, hypothesis):
+    """Word-level Levenshtein distance and reference length."""
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def measure(backend, samples_dir, with_tts, repeats):
+    """Runs inside the child process with SPEECH_BACKEND already set."""
+    import stt
+    import tts
+    from startup import peak_rss_mb
+    from inference_executor import percentile
+
+    result = {"backend": backend}
+    started = time.perf_counter()
+    if not stt.load_model():
+        raise SystemExit(f"STT model not available for backend {backend}")
+    result["stt_load_s"] = round(time.perf_counter() - started, 2)
+
+    clips = [(path, stt.load_audio(path)) for path, _ in load_samples(samples_dir)]
+    stt.transcribe_batch([clips[0][1]])  # warm-up
+    latencies, transcripts = [], {}
+    for _ in range(repeats):
+        for path, speech in clips:
+            started = time.perf_counter()
+            transcripts[path] = stt.transcribe_batch([speech])[0]
+            latencies.append((time.perf_counter() - started) * 1000)
+    result["stt_p50_ms"] = round(percentile(latencies, 0.5), 1)
+    result["stt_p95_ms"] = round(percentile(latencies, 0.95), 1)
+    result["transcripts"] = transcripts
+
+    if with_tts:
+        started = time.perf_counter()
+        if not tts.load_model():
+            raise SystemExit(f"TTS model not available for backend {backend}")
+        result["tts_load_s"] = round(time.perf_counter() - started, 2)
+        tts._synthesize(TTS_SENTENCES[0])  # warm-up
+        latencies = []
+        for _ in range(repeats):
+            for sentence in TTS_SENTENCES:
+                started = time.perf_counter()
+                tts._synthesize(sentence)
+                latencies.append((time.perf_counter() - started) * 1000)
+        result["tts_p50_ms"] = round(percentile(latencies, 0.5), 1)
+        result["tts_p95_ms"] = round(percentile(latencies, 0.95), 1)
+
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return result
+
+
+def run_backend(backend, args):
+    command = [sys.executable, "-m", "benchmarks.speech_backends", "--child", backend,
+               "--samples", args.samples, "--repeats", str(args.repeats)]
+    if args.tts:
+        command.append("--tts")
+    env = {**os.environ, "SPEECH_BACKEND": backend}
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", required=True, help="directory of audio clips and transcripts")
+    parser.add_argument("--backends", nargs="+", default=["eager", "quantized", "onnx"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tts", action="store_true", help="also benchmark TTS latency")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.samples, args.tts, args.repeats), ensure_ascii=False))
+        return
+
+    samples = load_samples(args.samples)
+    if not samples:
+        raise SystemExit(f"No audio files found in {args.samples}")
+    backends = list(dict.fromkeys(["eager"] + args.backends))
+    results = {backend: run_backend(backend, args) for backend in backends}
+    baseline = results["eager"]["transcripts"]
+
+    print(f"{len(samples)} clips x {args.repeats} repeats")
+    header = f"{'backend':>10}{'load s':>8}{'p50 ms':>9}{'p95 ms':>9}{'WER':>8}{'RSS MB':>9}"
+    if args.tts:
+        header += f"{'TTS p50':>9}{'TTS p95':>9}"
+    print(header)
+    for backend in backends:
+        result = results[backend]
+        errors = words = 0
+        for path, reference in samples:
+            e, n = word_errors(reference or baseline[path], result["transcripts"][path])
+            errors, words = errors + e, words + n
+        line = (f"{backend:>10}{result['stt_load_s']:>8.2f}{result['stt_p50_ms']:>9.1f}"
+                f"{result['stt_p95_ms']:>9.1f}{errors / max(words, 1):>8.3f}{result['peak_rss_mb']:>9.1f}")
+        if args.tts:
+            line += f"{result['tts_p50_ms']:>9.1f}{result['tts_p95_ms']:>9.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Latency of concurrent speech requests with and without the shared inference executor.
+
+"direct" calls the model from every request thread, as the servers used to;
+"executor" goes through the bounded inference lane. Run from the backend
+directory (downloads the model on first run):
+
+    python -m benchmarks.speech_load --model stt --concurrency 1 4 8 16 --requests 64
+    INFERENCE_TORCH_THREADS=2 INFERENCE_MAX_CONCURRENCY=2 python -m benchmarks.speech_load --model tts
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import stt
+import tts
+from inference_executor import INFERENCE_TORCH_THREADS, inference_executor, percentile
+from benchmarks.stt_batching import synthetic_clips
+
+SENTENCES = [
+    "Chào mừng bạn đến với công ty.",
+    "Giờ làm việc bắt đầu từ tám giờ sáng đến năm giờ chiều.",
+    "Bạn có thể hỏi phòng nhân sự về chính sách nghỉ phép.",
+    "Vui lòng hoàn thành khóa đào tạo an toàn thông tin trong tuần đầu tiên.",
+]
+
+
+def workload(model, requests):
+    """Return (direct call, executor call, inputs) for the chosen model."""
+    if model == "stt":
+        if not stt.load_model():
+            raise SystemExit("STT model not available")
+        clips = synthetic_clips(requests, 2.0, 5.0)
+        return (lambda clip: stt.transcribe_batch([clip]),
+                lambda clip: stt.run_transcribe_batch([clip]), clips)
+    if not tts.load_model():
+        raise SystemExit("TTS model not available")
+    texts = [SENTENCES[i % len(SENTENCES)] for i in range(requests)]
+    return tts._synthesize, tts.synthesize, texts
+
+
+def run(call, inputs, concurrency):
+    latencies = []
+
+    def timed(item):
+        started = time.perf_counter()
+        call(item)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, inputs))
+    return time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", choices=["stt", "tts"], default="stt")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    direct, through_executor, inputs = workload(args.model, args.requests)
+    direct(inputs[0])  # warm-up
+
+    lane = inference_executor.lanes[args.model]
+    print(f"{args.model}: {args.requests} requests, lane workers={lane.workers}, "
+          f"torch threads={INFERENCE_TORCH_THREADS}, max concurrency={inference_executor.max_concurrency}")
+    print(f"{'mode':>10}{'clients':>9}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    # All direct runs first: lane workers change torch's thread settings once they start
+    for mode, call in (("direct", direct), ("executor", through_executor)):
+        for concurrency in args.concurrency:
+            seconds, latencies = run(call, inputs, concurrency)
+            print(f"{mode:>10}{concurrency:>9}{len(inputs) / seconds:>9.2f}"
+                  f"{percentile(latencies, 0.5):>10.0f}{percentile(latencies, 0.95):>10.0f}"
+                  f"{percentile(latencies, 0.99):>10.0f}")
+    print(f"max queue depth: {lane.stats()['max_queue_depth']}, "
+          f"rejected: {lane.stats()['rejected']}")
+
+
+if __name__ == "__main__":
+    main()
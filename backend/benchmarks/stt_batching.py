@@ -0,0 +1,67 @@
+"""
+STT throughput (requests/sec) versus micro-batch size on CPU, with synthetic audio.
+
+Run from the backend directory (downloads the Wav2Vec2 model on first run):
+
+    python -m benchmarks.stt_batching --requests 64 --concurrency 16 --batch-sizes 1 2 4 8 16
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import stt
+from inference_batcher import MicroBatcher
+
+
+def synthetic_clips(count, min_seconds, max_seconds, seed=0):
+    """Speech-like clips: a few harmonics with a syllable-rate envelope plus noise."""
+    rng = np.random.default_rng(seed)
+    clips = []
+    for _ in range(count):
+        seconds = rng.uniform(min_seconds, max_seconds)
+        t = np.arange(int(seconds * stt.SAMPLE_RATE)) / stt.SAMPLE_RATE
+        pitch = rng.uniform(100, 220)
+        voice = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 4))
+        envelope = 0.5 * (1 + np.sin(2 * np.pi * rng.uniform(3, 5) * t))
+        clip = 0.3 * voice * envelope + 0.01 * rng.standard_normal(len(t))
+        clips.append(clip.astype(np.float32))
+    return clips
+
+
+def run(batcher, clips, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(batcher.process, clips))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--min-seconds", type=float, default=2.0)
+    parser.add_argument("--max-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    if not stt.load_model():
+        raise SystemExit("STT model not available")
+    clips = synthetic_clips(args.requests, args.min_seconds, args.max_seconds)
+    stt.transcribe_batch(clips[:1])  # warm-up
+
+    print(f"{args.requests} clips of {args.min_seconds}-{args.max_seconds}s, "
+          f"{args.concurrency} concurrent callers, max wait {args.max_wait_ms} ms")
+    print(f"{'batch size':>10}{'seconds':>10}{'req/s':>10}{'avg batch':>11}")
+    for batch_size in args.batch_sizes:
+        batcher = MicroBatcher(stt.transcribe_batch, max_batch_size=batch_size,
+                               max_wait_ms=args.max_wait_ms, name=f"bench-{batch_size}")
+        seconds = run(batcher, clips, args.concurrency)
+        stats = batcher.stats()
+        print(f"{batch_size:>10}{seconds:>10.2f}{args.requests / seconds:>10.2f}{stats['avg_batch']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
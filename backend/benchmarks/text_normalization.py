@@ -0,0 +1,88 @@
+"""
+Accent stripping and NFC normalization: the old per-letter `re.sub` passes of
+StructExtract.no_accent_vietnamese against the str.translate table in
+text_normalization.py.
+
+Texts are the chunk texts in ./chunk plus the questions of the retrieval eval
+set, so both long passages and short queries are covered. From the backend
+directory:
+
+    python -m benchmarks.text_normalization
+    python -m benchmarks.text_normalization --repeats 20 --queries-only
+"""
+import argparse
+import json
+import re
+import time
+import unicodedata
+from pathlib import Path
+
+from benchmarks.retrieval_eval import load_eval_set
+from text_normalization import fold, normalize_many, strip_accents
+
+LEGACY_PATTERNS = [
+    (re.compile(r'[àáạảãâầấậẩẫăằắặẳẵ]'), 'a'), (re.compile(r'[ÀÁẠẢÃĂẰẮẶẲẴÂẦẤẬẨẪ]'), 'A'),
+    (re.compile(r'[èéẹẻẽêềếệểễ]'), 'e'), (re.compile(r'[ÈÉẸẺẼÊỀẾỆỂỄ]'), 'E'),
+    (re.compile(r'[òóọỏõôồốộổỗơờớợởỡ]'), 'o'), (re.compile(r'[ÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠ]'), 'O'),
+    (re.compile(r'[ìíịỉĩ]'), 'i'), (re.compile(r'[ÌÍỊỈĨ]'), 'I'),
+    (re.compile(r'[ùúụủũưừứựửữ]'), 'u'), (re.compile(r'[ƯỪỨỰỬỮÙÚỤỦŨ]'), 'U'),
+    (re.compile(r'[ỳýỵỷỹ]'), 'y'), (re.compile(r'[ỲÝỴỶỸ]'), 'Y'),
+    (re.compile(r'[Đ]'), 'D'), (re.compile(r'[đ]'), 'd'),
+]
+
+
+def legacy_no_accent(s):
+    """The former StructExtract.no_accent_vietnamese (patterns precompiled, which only helps it)."""
+    for pattern, replacement in LEGACY_PATTERNS:
+        s = pattern.sub(replacement, s)
+    return s
+
+
+def load_texts(chunk_dir, queries_only):
+    rows, queries = load_eval_set()
+    texts = [question for question, _ in rows + queries]
+    if not queries_only:
+        for path in sorted(Path(chunk_dir).glob("*.json")):
+            with open(path, "r", encoding="utf-8") as f:
+                texts += [f"{chunk['title']} - {chunk['text']}" for chunk in json.load(f)]
+    return texts
+
+
+def timed(function, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", default="./chunk", help="directory of chunk JSON files")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--queries-only", action="store_true", help="only the short eval questions")
+    args = parser.parse_args()
+
+    texts = load_texts(args.chunks, args.queries_only)
+    mismatches = sum(legacy_no_accent(text) != strip_accents(text) for text in texts)
+    characters = sum(len(text) for text in texts)
+    print(f"{len(texts)} texts, {characters} characters, {mismatches} outputs differing from the old implementation")
+
+    cases = [
+        ("strip accents", "re.sub x14", lambda: [legacy_no_accent(text) for text in texts]),
+        ("strip accents", "translate", lambda: [strip_accents(text) for text in texts]),
+        ("fold (lower)", "re.sub x14", lambda: [legacy_no_accent(text.lower()) for text in texts]),
+        ("fold (lower)", "translate", lambda: [fold(text) for text in texts]),
+        ("NFC", "normalize", lambda: [unicodedata.normalize("NFC", text) for text in texts]),
+        ("NFC + spaces", "normalize_many", lambda: normalize_many(texts)),
+    ]
+    print(f"{'operation':>14}{'implementation':>18}{'total ms':>10}{'us/text':>9}{'Mchar/s':>9}")
+    for operation, name, function in cases:
+        seconds = timed(function, args.repeats)
+        print(f"{operation:>14}{name:>18}{seconds * 1000:>10.2f}{seconds * 1e6 / len(texts):>9.2f}"
+              f"{characters / seconds / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
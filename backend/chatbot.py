@@ -1,27 +1,38 @@
 import os
 import json
-from openai import OpenAI
 import chromadb
 from personalized_roadmap import roadmap_manager
 from content_generator import content_generator
 from document_extractor import document_extractor
-import random
-
-embedding_client = OpenAI(
-    base_url="https://aiportalapi.stu-platform.live/jpe",
-    api_key= "sk-AtDMlHQInyQArPQ_ZyvFBA"
-)
-EMBEDDING_MODEL = "text-embedding-3-small"
-
-client = OpenAI(
-    base_url="https://aiportalapi.stu-platform.live/jpe",
-    api_key= "sk-xvI5gYSbiDQ3c4blptwn0A"
-)
+from embedding_cache import embedding_cache
+from text_normalization import normalize_text
+from answer_cache import answer_cache
+from retriever import create_retriever, collection_metric, similarity_from_distance, filter_by_similarity
+from collection_version import open_qa_collection
+from lexical_index import lexical_index, LEXICAL_RETRIEVAL
+from intent_router import intent_router, INTENT_CLASSIFIER, RAG_INTENT
+from response_registry import response_registry
+from llm_gateway import llm_gateway, EMBEDDING_MODEL
+from rate_limiter import RateLimited
 
 
 # Initialize ChromaDB client
 chroma_client = chromadb.PersistentClient(path="./database")
-collection = chroma_client.get_or_create_collection(name="qa_collection")
+collection = open_qa_collection(chroma_client)
+if collection_metric(collection) != "cosine":
+    # Created before the metadata was passed here; similarities are converted accordingly
+    print(f"⚠️ qa_collection uses '{collection_metric(collection)}' distance; re-create it with the embedding script for cosine")
+# Top-k search over qa_collection (in-memory matrix by default, see retriever.py)
+retriever = create_retriever(collection)
+
+
+# Smart suggestion settings
+SUGGESTION_HISTORY = 3          # recent questions used as queries
+SUGGESTION_CANDIDATES = 15      # rows retrieved per query
+SUGGESTION_COUNT = 2
+SUGGESTION_RECENCY_DECAY = 0.7  # weight of each older question relative to the next one
+# A candidate this close to an asked question is a rephrasing of it, not a suggestion
+SUGGESTION_DUPLICATE_SIMILARITY = 0.95
 
 
 # Smart suggestion function for chatbot
@@ -32,56 +43,66 @@ def get_smart_suggestions(history):
     Otherwise, use RAG to find relevant questions based on history.
     history: List of previous user questions (strings)
     Returns: List of suggested questions (strings)
+
+    The recent questions are embedded in one call (earlier ones come from the
+    embedding cache, so usually only the newest is sent to the API) and searched
+    with one multi-vector query. Candidates are grouped by original question,
+    scored by their recency-weighted similarity summed over the queries, and
+    questions the user already asked are left out.
     """
     try:
         # If history is null or empty, return only help
         if not history:
             return ["help"]
         
-        # Use RAG approach: search for relevant content based on recent questions
-        last_questions = history[-3:] if len(history) >= 3 else history
-        
         # Check if collection is empty
-        if collection.count() == 0:
+        if retriever.count() == 0:
             return ["help"]
         
-        # Get relevant documents based on recent questions
-        relevant_docs = []
-        for question in last_questions:
-            try:
-                query_embedding = get_embedding(question)
-                results = collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=15,  # Get top 2 relevant docs per question
-                    include=["documents", "metadatas"]
-                )
-                if results['documents'][0]:
-                    for i, doc in enumerate(results['documents'][0]):
-                        relevant_docs.append({
-                            'question': doc,
-                            'answer': results['metadatas'][0][i]['answer']
-                        })
-            except Exception:
-                continue
+        last_questions = history[-SUGGESTION_HISTORY:]
+        results = retriever.query_many(get_embeddings(last_questions), SUGGESTION_CANDIDATES)
         
-        # If no relevant docs found, return help
-        if not relevant_docs:
-            return ["help"]
+        asked = {normalize_text(question).lower() for question in history}
+        excluded = set()
+        scores = {}
+        best = {}
+        for age, (documents, metadatas, distances) in enumerate(zip(
+                reversed(results['documents']), reversed(results['metadatas']), reversed(results['distances']))):
+            weight = SUGGESTION_RECENCY_DECAY ** age
+            for doc, metadata, distance in zip(documents, metadatas, distances):
+                # Variants generated from the same question count as one suggestion
+                group = (metadata or {}).get('original_question') or doc
+                similarity = similarity_from_distance(distance, retriever.metric)
+                if normalize_text(doc).lower() in asked or similarity >= SUGGESTION_DUPLICATE_SIMILARITY:
+                    excluded.add(group)
+                    continue
+                scores[group] = scores.get(group, 0.0) + weight * similarity
+                if similarity > best.get(group, (None, -1.0))[1]:
+                    best[group] = (doc, similarity)
         
-        listQuestion = [doc['question'] for doc in relevant_docs]
-
-        # return random 2 questions
-        return random.sample(listQuestion, 2)
+        ranked = sorted((group for group in scores if group not in excluded), key=scores.get, reverse=True)
+        suggestions = [best[group][0] for group in ranked[:SUGGESTION_COUNT]]
+        
+        # If no relevant docs found, return help
+        return suggestions or ["help"]
     except Exception as e:
         print(e)
         return ["help"]
+def request_embeddings(texts):
+    """Get embeddings from OpenAI API"""
+    return llm_gateway.embed("chatbot.embedding", texts, model=EMBEDDING_MODEL)
+
 def get_embedding(text):
-    """Get embedding from OpenAI API"""
-    response = embedding_client.embeddings.create(
-        model=EMBEDDING_MODEL,
-        input=text
-    )
-    return response.data[0].embedding
+    """Get embedding, served from the embedding cache when this text was seen before"""
+    return embedding_cache.get_or_embed(EMBEDDING_MODEL, [text], request_embeddings)[0]
+
+def get_embeddings(texts):
+    """Get embeddings for several texts with at most one API call (for the cache misses)"""
+    return embedding_cache.get_or_embed(EMBEDDING_MODEL, texts, request_embeddings)
+
+if INTENT_CLASSIFIER:
+    # Câu lệnh không chứa từ khóa (hoặc khớp yếu) được phân loại theo centroid embedding
+    intent_router.enable_classifier(get_embeddings)
 
 def search(query, top_k=3):
     """
@@ -90,19 +111,15 @@ def search(query, top_k=3):
     """
     try:
         # Check if collection is empty
-        if collection.count() == 0:
+        if retriever.count() == 0:
             print("❌ No data in the database. Please run the embedding script first.")
             return
             
         # Get embedding for the query
         query_embedding = get_embedding(query)
         
-        # Search in ChromaDB
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=min(top_k, collection.count()),
-            include=["documents", "metadatas", "distances"]
-        )
+        # Search in qa_collection
+        results = retriever.query(query_embedding, top_k)
         
         # Print results
         if results['documents'][0]:
@@ -110,78 +127,84 @@ def search(query, top_k=3):
                 question = results['documents'][0][i]
                 answer = results['metadatas'][0][i]['answer']
                 distance = results['distances'][0][i]
-                similarity = 1 - distance  # Convert distance to similarity
+                similarity = similarity_from_distance(distance, retriever.metric)
                 print(f"❓ {question}\n💡 {answer}\n🔍 Similarity: {similarity:.2f}\n" + "-" * 40)
         else:
             print("❌ No results found.")
     except Exception as e:
         print(f"❌ SeaopenAI_generate_answerrch error: {e}")
 
+def build_answer_messages(user_question, results):
+    """
+    Build the chat messages for answering user_question with the retrieved results as context.
+    """
+    # Prepare context from results
+    if results and results['documents'][0]:
+        context_parts = []
+        for i in range(len(results['documents'][0])):
+            question = results['documents'][0][i]
+            answer = results['metadatas'][0][i]['answer']
+            context_parts.append(f"Q: {question}\nA: {answer}")
+        
+        context = "\n".join(context_parts)
+        system_prompt = (
+            "You are a helpful assistant for new employees. Use the following Q&A pairs as context. "
+            "If the user's question matches one or more context, answer based on all context matching. "
+            "If not, generate a helpful answer based on the user's question. Answer in Vietnamese."
+        )
+        user_content = f"User question: {user_question}\nContext:\n{context}"
+    else:
+        system_prompt = (
+            "You are a helpful assistant for new employees. There is no relevant context. "
+            "Generate a helpful answer based on the user's question. Answer in Vietnamese."
+        )
+        user_content = f"User question: {user_question}"
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
+
 def openAI_generate_answer(user_question, results):
     """
     Use OpenAI API to generate an answer based on the top results.
     If no relevant result, generate an answer based on user_question.
     """
     try:
-        # Prepare context from results
-        if results and results['documents'][0]:
-            context_parts = []
-            for i in range(len(results['documents'][0])):
-                question = results['documents'][0][i]
-                answer = results['metadatas'][0][i]['answer']
-                context_parts.append(f"Q: {question}\nA: {answer}")
-            
-            context = "\n".join(context_parts)
-            system_prompt = (
-                "You are a helpful assistant for new employees. Use the following Q&A pairs as context. "
-                "If the user's question matches one or more context, answer based on all context matching. "
-                "If not, generate a helpful answer based on the user's question. Answer in Vietnamese."
-            )
-            user_content = f"User question: {user_question}\nContext:\n{context}"
-        else:
-            system_prompt = (
-                "You are a helpful assistant for new employees. There is no relevant context. "
-                "Generate a helpful answer based on the user's question. Answer in Vietnamese."
-            )
-            user_content = f"User question: {user_question}"
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content}
-        ]
-
-        response = client.chat.completions.create(
+        response = llm_gateway.chat(
+            "chatbot.answer",
             model="GPT-4o-mini",
-            messages=messages,
+            messages=build_answer_messages(user_question, results),
             max_tokens=300,
             temperature=0.7
         )
 
         return response.choices[0].message.content
+    except RateLimited:
+        # Servers answer 503 + Retry-After
+        raise
     except Exception as e:
         return f"❌ Error generating answer: {e}"
 
-def get_answer(user_question, top_k=5, threshold=0.2):
+def openAI_stream_answer(user_question, results):
     """
-    Find the most similar question in ChromaDB to the user's question.
-    Generate answer using OpenAI API based on retrieved context.
-    Also handle special commands for new features.
+    Streaming variant of openAI_generate_answer: yields completion deltas as they arrive.
     """
-    try:
-        # Kiểm tra các lệnh đặc biệt cho chức năng mới
-        user_question_lower = user_question.lower().strip()
-        
-        # Lệnh tạo lộ trình onboarding
-        if any(keyword in user_question_lower for keyword in ['lộ trình', 'roadmap', 'onboarding', 'học tập']):
-            if any(keyword in user_question_lower for keyword in ['tạo', 'gợi ý', 'đề xuất']):
-                # Trích xuất vị trí từ câu hỏi
-                positions = roadmap_manager.get_available_positions()
-                for pos in positions:
-                    if pos in user_question_lower:
-                        roadmap = roadmap_manager.generate_personalized_roadmap(pos)
-                        return f"🎯 **Lộ trình onboarding cho vị trí {pos}:**\n\n{roadmap}"
-                
-                return """🎯 **Tạo lộ trình onboarding cá nhân hóa**
+    response = llm_gateway.chat(
+        "chatbot.stream",
+        model="GPT-4o-mini",
+        messages=build_answer_messages(user_question, results),
+        max_tokens=300,
+        temperature=0.7,
+        stream=True
+    )
+    for event in response:
+        if event.choices and event.choices[0].delta.content:
+            yield event.choices[0].delta.content
+
+# Canned responses for the special commands; identical on every request, so
+# their TTS audio can be rendered into the cache at startup (TTS_PREWARM, see tts.prewarm)
+ROADMAP_HELP_RESPONSE = """🎯 **Tạo lộ trình onboarding cá nhân hóa**
 
 Tôi có thể tạo lộ trình onboarding cho các vị trí sau:
 - Developer (Lập trình viên)
@@ -192,10 +215,7 @@ Tôi có thể tạo lộ trình onboarding cho các vị trí sau:
 
 Hãy cho tôi biết vị trí bạn quan tâm, ví dụ: "Tạo lộ trình cho developer" hoặc "Gợi ý học tập cho marketing"."""
 
-        # Lệnh tạo nội dung tự động
-        if any(keyword in user_question_lower for keyword in ['email', 'tóm tắt', 'câu hỏi', 'checklist']):
-            if 'email chào mừng' in user_question_lower or 'welcome email' in user_question_lower:
-                return """📧 **Tạo email chào mừng tự động**
+WELCOME_EMAIL_RESPONSE = """📧 **Tạo email chào mừng tự động**
 
 Tôi có thể tạo email chào mừng cho nhân viên mới. Cần thông tin:
 - Tên nhân viên
@@ -206,8 +226,7 @@ Tôi có thể tạo email chào mừng cho nhân viên mới. Cần thông tin:
 
 Sử dụng API endpoint: `/api/content/welcome-email`"""
 
-            if 'tóm tắt' in user_question_lower:
-                return """📄 **Tóm tắt tài liệu tự động**
+SUMMARIZE_RESPONSE = """📄 **Tóm tắt tài liệu tự động**
 
 Tôi có thể tóm tắt tài liệu theo các kiểu:
 - Tóm tắt tổng quan (general)
@@ -216,8 +235,7 @@ Tôi có thể tóm tắt tài liệu theo các kiểu:
 
 Sử dụng API endpoint: `/api/content/summarize`"""
 
-            if 'câu hỏi' in user_question_lower and 'đào tạo' in user_question_lower:
-                return """❓ **Sinh câu hỏi đào tạo tự động**
+TRAINING_QUESTIONS_RESPONSE = """❓ **Sinh câu hỏi đào tạo tự động**
 
 Tôi có thể tạo câu hỏi đào tạo từ nội dung:
 - Trắc nghiệm (multiple_choice)
@@ -226,9 +244,7 @@ Tôi có thể tạo câu hỏi đào tạo từ nội dung:
 
 Sử dụng API endpoint: `/api/content/training-questions`"""
 
-        # Lệnh trích xuất thông tin
-        if any(keyword in user_question_lower for keyword in ['cv', 'hồ sơ', 'trích xuất', 'tự động điền']):
-            return """🔍 **Trích xuất thông tin tự động**
+EXTRACTION_RESPONSE = """🔍 **Trích xuất thông tin tự động**
 
 Tôi có thể xử lý các loại tài liệu:
 - CV/Resume
@@ -244,9 +260,7 @@ Sử dụng API endpoints:
 - `/api/extract/upload` - Upload file
 - `/api/extract/process-complete` - Xử lý hoàn chỉnh"""
 
-        # Lệnh trợ giúp
-        if any(keyword in user_question_lower for keyword in ['help', 'trợ giúp', 'hướng dẫn', 'chức năng']):
-            return """🤖 **Chatbot Onboarding - Hướng dẫn sử dụng**
+HELP_RESPONSE = """🤖 **Chatbot Onboarding - Hướng dẫn sử dụng**
 
 **Chức năng cơ bản:**
 - Hỏi đáp về chính sách, quy trình, phúc lợi công ty
@@ -269,41 +283,180 @@ Sử dụng API endpoints:
 
 Hãy thử các lệnh trên hoặc hỏi bất kỳ câu hỏi nào về onboarding!"""
 
+CANNED_RESPONSES = [
+    ROADMAP_HELP_RESPONSE,
+    WELCOME_EMAIL_RESPONSE,
+    SUMMARIZE_RESPONSE,
+    TRAINING_QUESTIONS_RESPONSE,
+    EXTRACTION_RESPONSE,
+    HELP_RESPONSE,
+]
+
+# Canned response of each command intent (see intent_router.py); "roadmap" is generated per position
+INTENT_RESPONSES = {
+    "roadmap_help": ROADMAP_HELP_RESPONSE,
+    "welcome_email": WELCOME_EMAIL_RESPONSE,
+    "summarize": SUMMARIZE_RESPONSE,
+    "training_questions": TRAINING_QUESTIONS_RESPONSE,
+    "extraction": EXTRACTION_RESPONSE,
+    "help": HELP_RESPONSE,
+}
+
+# Pre-rendered once into the final JSON / SSE bytes the servers send back
+for name, text in INTENT_RESPONSES.items():
+    response_registry.register(name, text)
+
+def route_question(user_question):
+    """
+    Intent of the question (see intent_router.route): a command intent, or "rag".
+    Never raises: when routing fails the question goes through RAG.
+    """
+    try:
+        # Kiểm tra các lệnh đặc biệt: một lượt quét bằng intent_router (từ khóa đã bỏ dấu + tên vị trí)
+        intent_router.set_positions({key: position.get("name", "")
+                                     for key, position in roadmap_manager.data["positions"].items()})
+        return intent_router.route(user_question, embed=get_embedding)
+    except Exception as e:
+        print(f"❌ Intent routing failed, answering with RAG: {e}")
+        return {"intent": RAG_INTENT, "confidence": 0.0, "source": "keywords", "position": None}
+
+def get_command_response(user_question, intent=None):
+    """
+    Return the response for special commands (roadmap, content generation, extraction, help),
+    or None when the question should go through RAG.
+    intent: result of route_question when the caller already routed the question.
+    """
+    if intent is None:
+        intent = route_question(user_question)
+
+    # Lệnh tạo lộ trình onboarding cho vị trí được nhắc tới
+    if intent["intent"] == "roadmap":
+        pos = intent["position"]
+        roadmap = roadmap_manager.generate_personalized_roadmap(pos)
+        return f"🎯 **Lộ trình onboarding cho vị trí {pos}:**\n\n{roadmap}"
+
+    return INTENT_RESPONSES.get(intent["intent"])
+
+def retrieve_context(query_embedding, top_k=5, threshold=0.2, query_text=None):
+    """
+    Query qa_collection and keep the results whose similarity is at least threshold.
+    When query_text is given, the results are fused with BM25 matches of the text.
+    Returns None when the collection is empty.
+    """
+    # Search in qa_collection; an empty result set means nothing was ingested yet
+    results = retriever.query(query_embedding, top_k)
+    if not results['documents'][0]:
+        print("❌ Database is empty. Please run the embedding script first.")
+        return None
+
+    # Filter results by threshold (cosine similarity, whatever the collection's metric)
+    filtered_results = filter_by_similarity(results, threshold, retriever.metric)
+    if query_text and LEXICAL_RETRIEVAL:
+        # Policy terms and abbreviations ("OT", "BHXH") that the embedding matches poorly
+        filtered_results = lexical_index.fuse(filtered_results, query_text, top_k)
+
+    print(filtered_results)
+    return filtered_results
+
+def get_answer(user_question, top_k=5, threshold=0.2, intent=None):
+    """
+    Find the most similar question in ChromaDB to the user's question.
+    Generate answer using OpenAI API based on retrieved context.
+    Also handle special commands for new features.
+    intent: result of route_question when the caller already routed the question.
+    """
+    try:
+        command_response = get_command_response(user_question, intent)
+        if command_response is not None:
+            return command_response
+
+        # Câu hỏi vừa được trả lời: dùng lại câu trả lời, không cần embedding
+        cached_answer = answer_cache.lookup_question(user_question)
+        if cached_answer is not None:
+            return cached_answer
+
+        # Câu hỏi chỉ gồm thuật ngữ có sẵn trong tài liệu: trả lời từ chỉ mục từ khóa, không cần embedding
+        lexical_results = lexical_index.exact_match(user_question, top_k)
+        if lexical_results is not None:
+            answer = openAI_generate_answer(user_question, lexical_results)
+            if answer and not answer.startswith("❌"):
+                answer_cache.store(user_question, None, answer)
+            return answer
+
         # Xử lý câu hỏi thông thường
-        # Check if collection is empty
-        if collection.count() == 0:
-            print("❌ Database is empty. Please run the embedding script first.")
-            return
-            
         # Get embedding for the user's question
         query_embedding = get_embedding(user_question)
-        
-        # Search in ChromaDB
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=min(top_k, collection.count()),
-            include=["documents", "metadatas", "distances"]
-        )
 
-        # Filter results by threshold
-        filtered_results = {"documents": [[]], "metadatas": [[]], "distances": [[]]}
-        if results['documents'][0]:
-            for i in range(len(results['documents'][0])):
-                similarity = 1 - results['distances'][0][i]
-                if similarity >= threshold:
-                    filtered_results['documents'][0].append(results['documents'][0][i])
-                    filtered_results['metadatas'][0].append(results['metadatas'][0][i])
-                    filtered_results['distances'][0].append(results['distances'][0][i])
+        # Near-duplicate of a question answered recently
+        cached_answer = answer_cache.lookup(query_embedding)
+        if cached_answer is not None:
+            return cached_answer
+
+        filtered_results = retrieve_context(query_embedding, top_k, threshold, user_question)
+        if filtered_results is None:
+            return
 
-        print(filtered_results)
         # Call OpenAI API to generate an answer
         answer = openAI_generate_answer(user_question, filtered_results)
+        if answer and not answer.startswith("❌"):
+            answer_cache.store(user_question, query_embedding, answer)
         return answer
-        
+
+    except RateLimited:
+        raise
     except Exception as e:
         print(f"❌ Error: {e}")
         return f"❌ Đã xảy ra lỗi: {e}"
 
+def stream_answer(user_question, top_k=5, threshold=0.2, intent=None):
+    """
+    Same flow as get_answer, but yields the answer in pieces as the completion is generated.
+    Commands and cached answers are yielded whole.
+    """
+    try:
+        command_response = get_command_response(user_question, intent)
+        if command_response is not None:
+            yield command_response
+            return
+
+        cached_answer = answer_cache.lookup_question(user_question)
+        if cached_answer is not None:
+            yield cached_answer
+            return
+
+        lexical_results = lexical_index.exact_match(user_question, top_k)
+        if lexical_results is not None:
+            parts = []
+            for delta in openAI_stream_answer(user_question, lexical_results):
+                parts.append(delta)
+                yield delta
+            if parts:
+                answer_cache.store(user_question, None, "".join(parts))
+            return
+
+        query_embedding = get_embedding(user_question)
+        cached_answer = answer_cache.lookup(query_embedding)
+        if cached_answer is not None:
+            yield cached_answer
+            return
+
+        filtered_results = retrieve_context(query_embedding, top_k, threshold, user_question)
+        if filtered_results is None:
+            return
+
+        parts = []
+        for delta in openAI_stream_answer(user_question, filtered_results):
+            parts.append(delta)
+            yield delta
+        if parts:
+            answer_cache.store(user_question, query_embedding, "".join(parts))
+
+    except RateLimited:
+        raise
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        yield f"❌ Đã xảy ra lỗi: {e}"
+
 def show_stats():
     """Show database statistics"""
     try:
@@ -1,5 +1,4 @@
 import copy
-import unicodedata
 import uuid
 import re
 import xmltodict
@@ -11,6 +10,7 @@ from pathlib import Path
 from typing import Any, List, Optional, Union
 import json
 import roman
+from text_normalization import nfc, strip_accents
 
 # Constants for splitting titles, list parsing, and mapping custom symbols
 TITLE_COMMA_SPLIT = "#|#"
@@ -334,25 +334,12 @@ class StructExtract:
         unique[nested_part] = {}
     return '\n'.join([key for key in unique])
 
-  def no_accent_vietnamese(self, s: str):
+  @staticmethod
+  def no_accent_vietnamese(s: str):
     """
     Remove Vietnamese accents from string.
     """
-    s = re.sub(r'[àáạảãâầấậẩẫăằắặẳẵ]', 'a', s)
-    s = re.sub(r'[ÀÁẠẢÃĂẰẮẶẲẴÂẦẤẬẨẪ]', 'A', s)
-    s = re.sub(r'[èéẹẻẽêềếệểễ]', 'e', s)
-    s = re.sub(r'[ÈÉẸẺẼÊỀẾỆỂỄ]', 'E', s)
-    s = re.sub(r'[òóọỏõôồốộổỗơờớợởỡ]', 'o', s)
-    s = re.sub(r'[ÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠ]', 'O', s)
-    s = re.sub(r'[ìíịỉĩ]', 'i', s)
-    s = re.sub(r'[ÌÍỊỈĨ]', 'I', s)
-    s = re.sub(r'[ùúụủũưừứựửữ]', 'u', s)
-    s = re.sub(r'[ƯỪỨỰỬỮÙÚỤỦŨ]', 'U', s)
-    s = re.sub(r'[ỳýỵỷỹ]', 'y', s)
-    s = re.sub(r'[ỲÝỴỶỸ]', 'Y', s)
-    s = re.sub(r'[Đ]', 'D', s)
-    s = re.sub(r'[đ]', 'd', s)
-    return s
+    return strip_accents(s)
 
   def split_element_content(self, element: Union[Paragraph, Table]):
     """
@@ -371,7 +358,7 @@ class StructExtract:
 
     text = element.text.strip()
     style = element.style.name.lower()
-    text = unicodedata.normalize("NFC", text)
+    text = nfc(text)
     is_heading = style.startswith("heading")
     is_custom_list = style.startswith("list")
     is_default_list = self.get_list_item_value(
@@ -776,7 +763,7 @@ class StructExtract:
     is_single_cell_table = self.is_single_cell_table(table)
     if is_single_cell_table:
       text = table.rows[0].cells[0].text.strip()
-      text = unicodedata.normalize('NFC', text)
+      text = nfc(text)
       return text
 
     texts = []
@@ -811,7 +798,7 @@ class StructExtract:
         first_row = False
         num_cols = len(row_texts)
     text = '\n'.join(texts)
-    text = unicodedata.normalize('NFC', text)
+    text = nfc(text)
     text = '\n' + text
     return text
 
@@ -0,0 +1,34 @@
+import os
+import time
+
+QA_COLLECTION_NAME = "qa_collection"
+# Both the ingestion script and the chatbot must open the collection with this
+# metadata: Chroma only applies it when the collection is first created, and
+# distances are only comparable to the chatbot's threshold in cosine space.
+QA_COLLECTION_METADATA = {"hnsw:space": "cosine"}
+
+# Touched by the ingestion script whenever qa_collection changes, so long-running
+# processes (answer cache, in-memory indexes) know their derived data is stale.
+COLLECTION_VERSION_FILE = "./database/qa_collection.version"
+
+
+def read_collection_version(path: str = COLLECTION_VERSION_FILE) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def bump_collection_version(path: str = COLLECTION_VERSION_FILE) -> str:
+    version = str(time.time_ns())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+def open_qa_collection(chroma_client):
+    return chroma_client.get_or_create_collection(name=QA_COLLECTION_NAME, metadata=QA_COLLECTION_METADATA)
@@ -1,15 +1,11 @@
 import json
 import os
 from typing import Dict, List, Optional
-from openai import OpenAI
+from llm_gateway import llm_gateway
+from rate_limiter import RateLimited
 from datetime import datetime
 import re
 
-# Khởi tạo OpenAI client
-client = OpenAI(
-    base_url="https://aiportalapi.stu-platform.live/jpe",
-    api_key="sk-xvI5gYSbiDQ3c4blptwn0A"
-)
 
 class ContentGenerator:
     def __init__(self):
@@ -123,7 +119,8 @@ Trả về format JSON với "subject" và "body".
 """
         
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat(
+                "content.generate_welcome_email",
                 model="GPT-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=800,
@@ -145,6 +142,8 @@ Trả về format JSON với "subject" và "body".
                 body = template["body_template"].format(**default_info)
                 return {"subject": subject, "body": body}
                 
+        except RateLimited:
+            raise
         except Exception as e:
             # Fallback về template cơ bản
             subject = template["subject_template"].format(**default_info)
@@ -180,7 +179,8 @@ Trả về format JSON với "subject" và "body".
 """
         
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat(
+                "content.generate_reminder_email",
                 model="GPT-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=600,
@@ -198,6 +198,8 @@ Trả về format JSON với "subject" và "body".
             except json.JSONDecodeError:
                 return {"subject": "Nhắc nhở: Hoàn thành các bước onboarding", "body": content}
                 
+        except RateLimited:
+            raise
         except Exception as e:
             # Fallback
             template = self.templates["reminder_email"]
@@ -265,13 +267,16 @@ Trả lời bằng tiếng Việt.
 """
         
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat(
+                "content.summarize_document",
                 model="GPT-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=800,
                 temperature=0.5
             )
             return response.choices[0].message.content
+        except RateLimited:
+            raise
         except Exception as e:
             return f"❌ Lỗi khi tóm tắt tài liệu: {e}"
     
@@ -369,7 +374,8 @@ Trả lời bằng tiếng Việt.
 """
         
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat(
+                "content.generate_training_questions",
                 model="GPT-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=1200,
@@ -400,6 +406,8 @@ Trả lời bằng tiếng Việt.
                     "explanation": "Câu hỏi tổng hợp kiến thức"
                 }]
                 
+        except RateLimited:
+            raise
         except Exception as e:
             return [{
                 "type": "error",
@@ -443,7 +451,8 @@ Trả lời bằng tiếng Việt.
 """
         
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat(
+                "content.generate_onboarding_checklist",
                 model="GPT-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=1500,
@@ -473,6 +482,8 @@ Trả lời bằng tiếng Việt.
                 }]
             }]
             
+        except RateLimited:
+            raise
         except Exception as e:
             return [{
                 "timeline": "Error",
@@ -2,7 +2,8 @@ import json
 import os
 import re
 from typing import Dict, List, Optional, Union
-from openai import OpenAI
+from llm_gateway import llm_gateway
+from rate_limiter import RateLimited
 import base64
 from pathlib import Path
 import tempfile
@@ -30,11 +31,6 @@ except ImportError:
 # pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
 
-# Khởi tạo OpenAI client
-client = OpenAI(
-    base_url="https://aiportalapi.stu-platform.live/jpe",
-    api_key="sk-xvI5gYSbiDQ3c4blptwn0A"
-)
 
 class DocumentExtractor:
     def __init__(self):
@@ -230,7 +226,8 @@ Trả về format JSON với cấu trúc rõ ràng. Nếu không tìm thấy th
 """
         
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat(
+                "extractor.extract_cv_information",
                 model="GPT-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=2000,
@@ -255,6 +252,8 @@ Trả về format JSON với cấu trúc rõ ràng. Nếu không tìm thấy th
             except json.JSONDecodeError:
                 return {"error": "Could not parse CV information", "raw_content": content}
                 
+        except RateLimited:
+            raise
         except Exception as e:
             return {"error": f"Failed to extract CV information: {e}"}
     
@@ -334,7 +333,8 @@ Format JSON với các field phù hợp.
 """
         
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat(
+                "extractor.extract_document_information",
                 model="GPT-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=1000,
@@ -358,6 +358,8 @@ Format JSON với các field phù hợp.
             except json.JSONDecodeError:
                 return {"error": "Could not parse document information", "raw_content": content}
                 
+        except RateLimited:
+            raise
         except Exception as e:
             return {"error": f"Failed to extract document information: {e}"}
     
@@ -402,7 +404,8 @@ Chỉ điền những trường có thông tin rõ ràng.
 """
         
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat(
+                "extractor.auto_fill_form",
                 model="GPT-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=1500,
@@ -436,6 +439,8 @@ Chỉ điền những trường có thông tin rõ ràng.
             # Fallback: simple mapping
             return self.simple_form_mapping(extracted_data, template)
             
+        except RateLimited:
+            raise
         except Exception as e:
             return {"error": f"Failed to auto-fill form: {e}"}
     
@@ -511,6 +516,8 @@ Chỉ điền những trường có thông tin rõ ràng.
                 "processing_status": "success"
             }
             
+        except RateLimited:
+            raise
         except Exception as e:
             return {
                 "file_path": file_path,
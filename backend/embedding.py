@@ -1,22 +1,26 @@
 import chromadb
-from openai import OpenAI
 import os
 import json
+import hashlib
+import queue
+import threading
 from pathlib import Path
 from tqdm import tqdm
+from embedding_cache import embedding_cache
+from collection_version import bump_collection_version, open_qa_collection
+from lexical_index import build_lexical_index
+from llm_gateway import llm_gateway, EMBEDDING_MODEL
+from rate_limiter import BATCH
+from text_normalization import normalize_text
 from dotenv import load_dotenv
 load_dotenv()
 
-embedding_client = OpenAI(
-    base_url="https://aiportalapi.stu-platform.live/jpe",
-    api_key= os.environ.get("EMBEDDING_API_KEY")
-)
-EMBEDDING_MODEL = "text-embedding-3-small"
-
-client = OpenAI(
-    base_url="https://aiportalapi.stu-platform.live/jpe",
-    api_key= os.environ.get("OPENAI_API_KEY")
-)
+# Number of question variants sent per embeddings request / collection.add call
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+# Maximum number of QA-generation / paraphrase requests in flight at once (1 = sequential)
+INGESTION_MAX_IN_FLIGHT = int(os.environ.get("INGESTION_MAX_IN_FLIGHT", "8"))
+# Records which chunks (by content hash) are already in qa_collection
+MANIFEST_PATH = "./database/ingestion_manifest.json"
 
 # Function schemas for OpenAI function calling
 QA_FUNCTION_SCHEMA = {
@@ -57,12 +61,23 @@ PARAPHRASE_FUNCTION_SCHEMA = {
     }
 }
 
+def request_embeddings(texts):
+    """
+    Embed a list of strings with a single request (the endpoint accepts a list input).
+    Results are returned in the same order as `texts`.
+    """
+    return llm_gateway.embed("ingestion.embedding", texts, model=EMBEDDING_MODEL, priority=BATCH)
+
 def get_embedding(text):
-    response = embedding_client.embeddings.create(
-        input=text,
-        model= EMBEDDING_MODEL
-    )
-    return response.data[0].embedding 
+    return get_embeddings([text])[0]
+
+def get_embeddings(texts):
+    """
+    Embed a list of strings, only sending the ones missing from the embedding cache.
+    """
+    if not texts:
+        return []
+    return embedding_cache.get_or_embed(EMBEDDING_MODEL, texts, request_embeddings)
 
 def generate_qa_pairs(chunk):
     """
@@ -77,7 +92,9 @@ Tạo các câu hỏi thực tế và hữu ích mà nhân viên mới có thể
 Đảm bảo câu trả lời ngắn gọn và dễ hiểu.
 """
     try:
-        response = client.chat.completions.create(
+        response = llm_gateway.chat(
+            "ingestion.qa_pairs",
+            priority=BATCH,
             model="GPT-4o-mini",
             messages=[{"role": "user", "content": prompt}],
             tools=[{"type": "function", "function": QA_FUNCTION_SCHEMA}],
@@ -106,7 +123,9 @@ Viết lại câu hỏi sau theo 2 cách khác nhau có cùng ý nghĩa:
 Đảm bảo các phiên bản khác nhau về cách diễn đạt nhưng giữ nguyên ý nghĩa.
 """
     try:
-        response = client.chat.completions.create(
+        response = llm_gateway.chat(
+            "ingestion.paraphrase",
+            priority=BATCH,
             model="GPT-4o-mini",
             messages=[{"role": "user", "content": prompt}],
             tools=[{"type": "function", "function": PARAPHRASE_FUNCTION_SCHEMA}],
@@ -123,68 +142,367 @@ Viết lại câu hỏi sau theo 2 cách khác nhau có cùng ý nghĩa:
         print(f"❌ Function calling error in paraphrase_question: {e}")
         return []
 
-chroma_client = chromadb.PersistentClient(path="./database")
-collection = chroma_client.get_or_create_collection(
-    name="qa_collection",
-    metadata={"hnsw:space": "cosine"}
-)
+def get_collection():
+    chroma_client = chromadb.PersistentClient(path="./database")
+    return open_qa_collection(chroma_client)
 
-listChunks = Path("./chunk").glob("*.json")
-for file in listChunks:
-    print(f"Processing {file.name}")
+def chunk_hash(title, text):
+    """
+    Stable content hash of a chunk (unlike hash(), not salted per process).
+    """
+    return hashlib.sha256(f"{title}\n{text}".encode("utf-8")).hexdigest()
 
-    # Load JSON content
+def make_chunk(title, text, source=""):
+    return {
+        "hash": chunk_hash(title, text),
+        "title": title,
+        "text": title + " - " + text,
+        "source": source
+    }
+
+def load_chunks(file):
+    """
+    Load a chunk file produced by chunking.py and combine title and text for each chunk.
+    Chunks with identical content are only returned once.
+    """
     with open(file, "r", encoding="utf-8") as f:
         chunksJson = json.load(f)
-    # Combine title and text for each chunk
-    chunks = [chunk["title"] + " - " + chunk["text"] for chunk in chunksJson]
+    chunks = {}
+    for chunk in chunksJson:
+        record = make_chunk(chunk["title"], chunk["text"], source=Path(file).name)
+        chunks.setdefault(record["hash"], record)
+    return list(chunks.values())
+
+def variant_id(chunk, version, answer):
+    """Row id of a question variant: identical texts for the same answer of a chunk share one row."""
+    key = f"{chunk['source']}\n{chunk['hash']}\n{normalize_text(version)}\n{answer}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def build_question_variants(chunk):
+    """
+    Generate QA pairs for a chunk and expand every question with its paraphrases.
+    Returns a list of (chunk, version, metadata, variant_index) tuples ready to be embedded.
+    """
+    variants = []
+    qa_pairs = generate_qa_pairs(chunk["text"])
+    for question, answer in qa_pairs:
+        variants.extend(expand_question(chunk, question, answer))
+    return variants
+
+def expand_question(chunk, question, answer):
+    """
+    Paraphrase a single question and return its (chunk, version, metadata, variant_index) tuples.
+    """
+    variants = []
+    try:
+        # Get original and paraphrased questions
+        paraphrases = paraphrase_question(question)
+        all_versions = [question] + paraphrases
+
+        for i, version in enumerate(all_versions):
+            if version.strip():  # Skip empty versions
+                variants.append((chunk, version, {
+                    "answer": answer,
+                    "original_question": question,
+                    "is_paraphrase": i > 0,
+                    "chunk_hash": chunk["hash"],
+                    "source": chunk["source"]
+                }, i))
+    except Exception as e:
+        print(f"❌ Paraphrase error: {e}")
+    return variants
+
+class VariantBatcher:
+    """
+    Collect question variants across chunks and flush them in fixed-size batches:
+    one embeddings request and one `collection.add` per batch.
+    Tracks rows written per chunk so the manifest only records complete chunks.
+    Variants whose id was already queued (the same text for the same answer) are dropped,
+    so a batch never carries duplicate ids.
+    """
+
+    def __init__(self, collection, batch_size=EMBEDDING_BATCH_SIZE):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.pending = []
+        self.total_added = 0
+        self.added_by_chunk = {}
+        self.failed_chunks = set()
+        self.seen_ids = set()
+        self.duplicates = 0
+
+    def add(self, variants):
+        for variant in variants:
+            chunk, version, metadata, _ = variant
+            row_id = variant_id(chunk, version, metadata["answer"])
+            if row_id in self.seen_ids:
+                self.duplicates += 1
+                continue
+            self.seen_ids.add(row_id)
+            self.pending.append(variant)
+        while len(self.pending) >= self.batch_size:
+            batch = self.pending[:self.batch_size]
+            self.pending = self.pending[self.batch_size:]
+            self.write_batch(batch)
 
-    # Process each chunk
+    def flush(self):
+        if self.pending:
+            batch = self.pending
+            self.pending = []
+            self.write_batch(batch)
+
+    def write_batch(self, batch):
+        documents = [version for _, version, _, _ in batch]
+        try:
+            embeddings = get_embeddings(documents)
+            self.collection.add(
+                documents=documents,
+                metadatas=[metadata for _, _, metadata, _ in batch],
+                embeddings=embeddings,
+                ids=[variant_id(chunk, version, metadata["answer"]) for chunk, version, metadata, _ in batch]
+            )
+            self.total_added += len(documents)
+            for chunk, _, _, _ in batch:
+                self.added_by_chunk[chunk["hash"]] = self.added_by_chunk.get(chunk["hash"], 0) + 1
+            print(f"✅ Added {len(documents)} question variants")
+        except Exception as e:
+            print(f"❌ Embedding batch error: {e}")
+            self.failed_chunks.update(chunk["hash"] for chunk, _, _, _ in batch)
+
+    def completed_chunks(self):
+        """Rows written per chunk hash, excluding chunks with a failed batch."""
+        return {h: n for h, n in self.added_by_chunk.items() if h not in self.failed_chunks}
+
+def ingest_chunks(collection, chunks, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    Generate QA variants for every chunk and write them to `collection` in batches.
+    Returns {chunk_hash: rows_added} for chunks that were fully written.
+    """
+    batcher = VariantBatcher(collection, batch_size)
     for chunk in tqdm(chunks, desc="Ingesting"):
         try:
-            qa_pairs = generate_qa_pairs(chunk)
-            for question, answer in qa_pairs:
-                try:
-                    # Get original and paraphrased questions
-                    paraphrases = paraphrase_question(question)
-                    all_versions = [question] + paraphrases
-                    
-                    # Prepare data for ChromaDB batch insert
-                    documents = []
-                    metadatas = []
-                    embeddings = []
-                    ids = []
-                    
-                    for i, version in enumerate(all_versions):
-                        if version.strip():  # Skip empty versions
-                            # Generate embedding
-                            embedding = get_embedding(version)
-                            
-                            documents.append(version)
-                            metadatas.append({
-                                "answer": answer, 
-                                "original_question": question,
-                                "is_paraphrase": i > 0
-                            })
-                            embeddings.append(embedding)
-                            ids.append(f"{abs(hash(version + answer))}_{i}")
-                    
-                    # Insert batch into ChromaDB
-                    if documents:  # Only insert if we have documents
-                        collection.add(
-                            documents=documents,
-                            metadatas=metadatas,
-                            embeddings=embeddings,
-                            ids=ids
-                        )
-                        print(f"✅ Added {len(documents)} question variants")
-                        
-                except Exception as e:
-                    print(f"❌ Paraphrase error: {e}")
+            batcher.add(build_question_variants(chunk))
         except Exception as e:
             print(f"❌ QA generation error: {e}")
+    batcher.flush()
+    return batcher.completed_chunks()
+
+_STOP = object()
+
+class ConcurrentIngestionEngine:
+    """
+    Pipelined ingestion: chunk -> QA pairs -> paraphrases -> batched embeddings.
+
+    QA generation and paraphrasing run on worker threads that share a semaphore of
+    `max_in_flight` upstream requests. Stages are connected by bounded queues, so a
+    slow stage blocks the one feeding it instead of buffering the whole corpus.
+    A single writer thread embeds and stores variants through a VariantBatcher.
+    """
+
+    def __init__(self, collection, max_in_flight=INGESTION_MAX_IN_FLIGHT,
+                 batch_size=EMBEDDING_BATCH_SIZE, queue_size=None):
+        self.collection = collection
+        self.max_in_flight = max(1, max_in_flight)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = queue_size or self.max_in_flight * 2
+        self.in_flight = threading.BoundedSemaphore(self.max_in_flight)
+
+    def run(self, chunks):
+        """
+        Ingest `chunks` and return {chunk_hash: rows_added} for chunks that were fully written.
+        """
+        chunk_queue = queue.Queue(maxsize=self.queue_size)
+        question_queue = queue.Queue(maxsize=self.queue_size)
+        variant_queue = queue.Queue(maxsize=self.queue_size)
+        batcher = VariantBatcher(self.collection, self.batch_size)
+        progress = tqdm(total=len(chunks), desc="Ingesting")
+
+        def qa_worker():
+            while True:
+                chunk = chunk_queue.get()
+                if chunk is _STOP:
+                    return
+                try:
+                    with self.in_flight:
+                        qa_pairs = generate_qa_pairs(chunk["text"])
+                    for question, answer in qa_pairs:
+                        question_queue.put((chunk, question, answer))
+                except Exception as e:
+                    print(f"❌ QA generation error: {e}")
+                finally:
+                    progress.update(1)
+
+        def paraphrase_worker():
+            while True:
+                item = question_queue.get()
+                if item is _STOP:
+                    return
+                chunk, question, answer = item
+                with self.in_flight:
+                    variants = expand_question(chunk, question, answer)
+                if variants:
+                    variant_queue.put(variants)
+
+        def writer():
+            while True:
+                variants = variant_queue.get()
+                if variants is _STOP:
+                    batcher.flush()
+                    return
+                batcher.add(variants)
+
+        qa_threads = [threading.Thread(target=qa_worker, daemon=True) for _ in range(self.max_in_flight)]
+        paraphrase_threads = [threading.Thread(target=paraphrase_worker, daemon=True) for _ in range(self.max_in_flight)]
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        for thread in qa_threads + paraphrase_threads + [writer_thread]:
+            thread.start()
+
+        for chunk in chunks:
+            chunk_queue.put(chunk)
+        for _ in qa_threads:
+            chunk_queue.put(_STOP)
+        for thread in qa_threads:
+            thread.join()
+        for _ in paraphrase_threads:
+            question_queue.put(_STOP)
+        for thread in paraphrase_threads:
+            thread.join()
+        variant_queue.put(_STOP)
+        writer_thread.join()
+        progress.close()
+        return batcher.completed_chunks()
+
+class IngestionManifest:
+    """
+    On-disk record of which chunks are already in qa_collection, keyed by source file
+    and chunk content hash. Used to skip unchanged chunks and garbage-collect rows of
+    chunks that were edited or removed.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.is_new = not os.path.exists(path)
+        self.data = {"version": 1, "sources": {}}
+        if not self.is_new:
+            with open(path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def sources(self):
+        return list(self.data["sources"].keys())
+
+    def chunk_hashes(self, source):
+        return set(self.data["sources"].get(source, {}).keys())
+
+    def plan(self, source, chunks):
+        """
+        Split `chunks` into those that need ingesting and the hashes of recorded
+        chunks that no longer exist in the source.
+        """
+        known = self.chunk_hashes(source)
+        current = {chunk["hash"] for chunk in chunks}
+        pending = [chunk for chunk in chunks if chunk["hash"] not in known]
+        removed = sorted(known - current)
+        return pending, removed
+
+    def mark_done(self, chunk, rows):
+        self.data["sources"].setdefault(chunk["source"], {})[chunk["hash"]] = {
+            "title": chunk["title"],
+            "rows": rows
+        }
+
+    def forget(self, source, hashes):
+        entries = self.data["sources"].get(source, {})
+        for h in hashes:
+            entries.pop(h, None)
+
+    def drop_source(self, source):
+        self.data["sources"].pop(source, None)
+
+def delete_chunk_rows(collection, source, hashes, batch_size=100):
+    """
+    Delete the QA rows generated from the given chunk hashes of one source file;
+    identical chunks of other sources keep their rows.
+    """
+    hashes = list(hashes)
+    for start in range(0, len(hashes), batch_size):
+        collection.delete(where={"$and": [
+            {"source": source},
+            {"chunk_hash": {"$in": hashes[start:start + batch_size]}}
+        ]})
+
+def purge_legacy_rows(collection):
+    """
+    Delete rows written before the manifest existed (no chunk_hash metadata); their
+    ids were salted per process and would otherwise stay as duplicates.
+    """
+    results = collection.get(include=["metadatas"])
+    legacy_ids = [
+        row_id for row_id, metadata in zip(results["ids"], results["metadatas"])
+        if not metadata or "chunk_hash" not in metadata
+    ]
+    if legacy_ids:
+        collection.delete(ids=legacy_ids)
+        print(f"🧹 Removed {len(legacy_ids)} rows from before incremental ingestion")
+
+def ingest_source(collection, manifest, source, chunks):
+    """
+    Bring qa_collection in line with the current chunks of one source file:
+    skip unchanged chunks, regenerate new/edited ones, delete rows of removed ones.
+    """
+    pending, removed = manifest.plan(source, chunks)
+    print(f"{source}: {len(chunks) - len(pending)} unchanged, {len(pending)} to ingest, {len(removed)} removed")
+    if not pending and not removed:
+        return
+
+    # Partial rows from an interrupted run are cleared before regenerating
+    delete_chunk_rows(collection, source, removed + [chunk["hash"] for chunk in pending])
+    manifest.forget(source, removed)
+
+    if pending:
+        if INGESTION_MAX_IN_FLIGHT > 1:
+            completed = ConcurrentIngestionEngine(collection).run(pending)
+        else:
+            completed = ingest_chunks(collection, pending)
+        for chunk in pending:
+            if completed.get(chunk["hash"]):
+                manifest.mark_done(chunk, completed[chunk["hash"]])
+    manifest.save()
+    bump_collection_version()
+
+if __name__ == "__main__":
+    collection = get_collection()
+    manifest = IngestionManifest()
+    if manifest.is_new and collection.count() > 0:
+        purge_legacy_rows(collection)
+        bump_collection_version()
 
-print(f"✅ Done! Total entries in database: {collection.count()}")
+    seen_sources = set()
+    all_chunks = []
+    listChunks = Path("./chunk").glob("*.json")
+    for file in listChunks:
+        print(f"Processing {file.name}")
+        seen_sources.add(file.name)
+        chunks = load_chunks(file)
+        all_chunks.extend(chunks)
+        ingest_source(collection, manifest, file.name, chunks)
 
+    # Garbage-collect chunk files that were deleted since the last run
+    for source in manifest.sources():
+        if source not in seen_sources:
+            delete_chunk_rows(collection, source, manifest.chunk_hashes(source))
+            manifest.drop_source(source)
+            bump_collection_version()
+            print(f"🧹 Removed rows of deleted source {source}")
+    manifest.save()
 
+    # BM25 index over the rows and chunk texts, fused with vector search by the chatbot
+    build_lexical_index(collection, all_chunks)
 
+    print(f"✅ Done! Total entries in database: {collection.count()}")
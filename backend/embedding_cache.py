@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from file_lock import FileLock
+from text_normalization import normalize_text
+
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", "./database/embedding_cache")
+# Maximum number of vectors kept on disk; the oldest slots are overwritten first
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+# Number of vectors kept in the in-memory LRU tier
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MEMORY_ENTRIES", "4096"))
+
+KEY_BYTES = 20  # sha1 digest
+INITIAL_SLOTS = 1024
+
+
+def cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha1(f"{model}\n{normalize_text(text)}".encode("utf-8")).digest()
+
+
+def model_dir_name(model: str) -> str:
+    """Filesystem-safe directory name for one model's disk tier."""
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", model).strip("._") or "default"
+
+
+class _ModelStore:
+    """
+    Disk tier for a single embedding model.
+
+    Vectors live in a memory-mapped float32 matrix (`vectors.f32`) next to a compact
+    key index of sha1 digests (`keys.bin`), one row per slot, in a ring of at most
+    `max_entries` slots. Each model gets its own directory so models of different
+    dimensionality never share a matrix.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.meta_file = os.path.join(path, "meta.json")
+        self.keys_file = os.path.join(path, "keys.bin")
+        self.vectors_file = os.path.join(path, "vectors.f32")
+        self.lock_file = os.path.join(path, "lock")
+
+        self.index: Dict[bytes, int] = {}
+        self.keys = None
+        self.vectors = None
+        self.meta = {"dimensions": None, "allocated": 0, "next_slot": 0, "size": 0}
+        self.mismatch_warned = False
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _read_meta(self):
+        if os.path.exists(self.meta_file):
+            with open(self.meta_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return None
+
+    def _write_meta(self):
+        tmp_file = self.meta_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_file, self.meta_file)
+
+    def _open_maps(self):
+        allocated = self.meta["allocated"]
+        dimensions = self.meta["dimensions"]
+        if not allocated or not dimensions:
+            self.keys = self.vectors = None
+            return
+        self.keys = np.memmap(self.keys_file, dtype=np.uint8, mode="r+", shape=(allocated, KEY_BYTES))
+        self.vectors = np.memmap(self.vectors_file, dtype=np.float32, mode="r+", shape=(allocated, dimensions))
+
+    def _load(self):
+        meta = self._read_meta()
+        if not meta:
+            return
+        try:
+            self.meta = meta
+            self._open_maps()
+            if self.keys is None:
+                return
+            for slot in range(self.meta["size"]):
+                key = self.keys[slot].tobytes()
+                if any(key):
+                    self.index[key] = slot
+        except Exception as e:
+            print(f"❌ Embedding cache {self.path} is unreadable, starting empty: {e}")
+            self.meta = {"dimensions": None, "allocated": 0, "next_slot": 0, "size": 0}
+            self.index = {}
+            self.keys = self.vectors = None
+
+    def _grow(self, needed_slots: int):
+        """Extend the backing files (doubling, capped at max_entries) to hold `needed_slots`."""
+        allocated = self.meta["allocated"]
+        if needed_slots <= allocated:
+            return
+        new_allocated = max(INITIAL_SLOTS, allocated)
+        while new_allocated < needed_slots:
+            new_allocated *= 2
+        new_allocated = min(new_allocated, self.max_entries)
+        dimensions = self.meta["dimensions"]
+        self.keys = self.vectors = None
+        with open(self.keys_file, "ab") as f:
+            f.truncate(new_allocated * KEY_BYTES)
+        with open(self.vectors_file, "ab") as f:
+            f.truncate(new_allocated * dimensions * 4)
+        self.meta["allocated"] = new_allocated
+        self._open_maps()
+
+    def lookup(self, key: bytes) -> Optional[List[float]]:
+        slot = self.index.get(key)
+        # The slot may have been reused by another process since the index was built
+        if slot is not None and self.keys is not None and slot < len(self.keys) \
+                and self.keys[slot].tobytes() == key:
+            return self.vectors[slot].tolist()
+        return None
+
+    def write(self, keys: List[bytes], vectors: List[List[float]]) -> int:
+        """Append vectors to the ring; returns the number of evicted slots."""
+        evictions = 0
+        with FileLock(self.lock_file):
+            # Another process may have appended since we last looked
+            meta = self._read_meta()
+            if meta and meta.get("allocated", 0) >= self.meta["allocated"]:
+                self.meta = meta
+                self._open_maps()
+            if self.meta["dimensions"] is None:
+                self.meta["dimensions"] = len(vectors[0])
+
+            for key, vector in zip(keys, vectors):
+                if len(vector) != self.meta["dimensions"]:
+                    if not self.mismatch_warned:
+                        print(f"⚠️ Embedding cache {self.path}: got {len(vector)}-dim vectors, "
+                              f"store holds {self.meta['dimensions']}; keeping them in memory only")
+                        self.mismatch_warned = True
+                    continue
+                slot = self.meta["next_slot"]
+                self._grow(slot + 1)
+                old_key = self.keys[slot].tobytes()
+                if any(old_key):
+                    self.index.pop(old_key, None)
+                    evictions += 1
+                self.vectors[slot] = np.asarray(vector, dtype=np.float32)
+                self.keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self.index[key] = slot
+                self.meta["size"] = max(self.meta["size"], slot + 1)
+                self.meta["next_slot"] = (slot + 1) % self.max_entries
+
+            if self.keys is not None:
+                self.vectors.flush()
+                self.keys.flush()
+            self._write_meta()
+        return evictions
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model, normalized text).
+
+    Each model has its own disk ring under `path/<model>/` (see `_ModelStore`);
+    recently used vectors are also kept in an LRU dict so hot keys never touch
+    the memmap.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_DIR, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 memory_entries: int = EMBEDDING_CACHE_MEMORY_ENTRIES):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.memory_entries = max(0, memory_entries)
+
+        self._lock = threading.RLock()
+        self._memory: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        self._stores: Dict[str, _ModelStore] = {}
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "api_calls": 0, "evictions": 0}
+
+        os.makedirs(path, exist_ok=True)
+
+    def _store(self, model: str) -> _ModelStore:
+        store = self._stores.get(model)
+        if store is None:
+            store = _ModelStore(os.path.join(self.path, model_dir_name(model)), self.max_entries)
+            self._stores[model] = store
+        return store
+
+    # ---- lookups -----------------------------------------------------------
+
+    def _remember(self, key: bytes, vector: List[float]):
+        if not self.memory_entries:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, model: str, key: bytes) -> Optional[List[float]]:
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return vector
+        vector = self._store(model).lookup(key)
+        if vector is not None:
+            self._remember(key, vector)
+            self.counters["disk_hits"] += 1
+            return vector
+        self.counters["misses"] += 1
+        return None
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        with self._lock:
+            return self._lookup(model, cache_key(model, text))
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        if not texts:
+            return
+        keys = [cache_key(model, text) for text in texts]
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, list(vector))
+            self.counters["evictions"] += self._store(model).write(keys, vectors)
+
+    def put(self, model: str, text: str, vector: List[float]):
+        self.put_many(model, [text], [vector])
+
+    def get_or_embed(self, model: str, texts: List[str],
+                     embed: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """
+        Return embeddings for `texts`, calling `embed` once for the distinct misses only.
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing: "OrderedDict[str, List[int]]" = OrderedDict()
+        with self._lock:
+            for i, text in enumerate(texts):
+                vector = self._lookup(model, cache_key(model, text))
+                if vector is None:
+                    missing.setdefault(normalize_text(text), []).append(i)
+                else:
+                    results[i] = vector
+        if missing:
+            missing_texts = list(missing.keys())
+            vectors = embed(missing_texts)
+            with self._lock:
+                self.counters["api_calls"] += 1
+            self.put_many(model, missing_texts, vectors)
+            for text, vector in zip(missing_texts, vectors):
+                for i in missing[text]:
+                    results[i] = vector
+        return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "hits": hits,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "disk_entries": sum(len(store.index) for store in self._stores.values()),
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "models": {model: store.meta["dimensions"] for model, store in self._stores.items()},
+            }
+
+
+# Khởi tạo instance global
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,146 @@
+"""
+Export the STT (Wav2Vec2) and TTS (VITS) models to ONNX for SPEECH_BACKEND=onnx.
+
+    python export_speech_onnx.py                # both models, fp32
+    python export_speech_onnx.py --int8         # + int8 dynamic quantization of the weights
+    python export_speech_onnx.py --models stt
+
+Files are written to SPEECH_ONNX_DIR (default ./database/onnx).
+"""
+import argparse
+import inspect
+import os
+
+import numpy as np
+import torch
+
+import stt
+import tts
+from speech_backends import SPEECH_ONNX_DIR, onnx_path, onnx_session
+
+OPSET = 17
+# Longer than the text the TTS graph is traced with
+TTS_CHECK_TEXT = "Giờ làm việc bắt đầu từ tám giờ sáng đến năm giờ chiều, vui lòng hoàn thành khóa đào tạo trong tuần đầu."
+
+
+def onnx_export(module, args, path, **kwargs):
+    """
+    torch.onnx.export with the TorchScript exporter: the exports below rely on
+    its dynamic_axes, and torch >= 2.9 defaults to the dynamo exporter.
+    """
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    torch.onnx.export(module, args, path, **kwargs)
+
+
+class CTCLogits(torch.nn.Module):
+    def __init__(self, model, with_mask):
+        super().__init__()
+        self.model = model
+        self.with_mask = with_mask
+
+    def forward(self, input_values, attention_mask=None):
+        if self.with_mask:
+            return self.model(input_values, attention_mask=attention_mask).logits
+        return self.model(input_values).logits
+
+
+class VitsWaveform(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).waveform
+
+
+def export_stt(path):
+    from transformers import Wav2Vec2ForCTC
+    model = Wav2Vec2ForCTC.from_pretrained(stt.MODEL_NAME).eval()
+    with_mask = model.config.feat_extract_norm == "layer"
+    input_values = torch.randn(1, stt.SAMPLE_RATE)
+    args = (input_values, torch.ones(1, stt.SAMPLE_RATE, dtype=torch.int64)) if with_mask else (input_values,)
+    input_names = ["input_values", "attention_mask"] if with_mask else ["input_values"]
+    dynamic_axes = {name: {0: "batch", 1: "samples"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch", 1: "frames"}
+    # The wrapper is put in eval mode too: export restores the wrapper's mode on the model afterwards
+    onnx_export(CTCLogits(model, with_mask).eval(), args, path, input_names=input_names,
+                output_names=["logits"], dynamic_axes=dynamic_axes, opset_version=OPSET)
+
+    # A clip of another length than the traced one through both runtimes
+    input_values = torch.randn(1, stt.SAMPLE_RATE * 5 // 2)
+    with torch.no_grad():
+        expected = model(input_values).logits.numpy()
+    actual = onnx_session(path).run(["logits"], {"input_values": input_values.numpy(), **(
+        {"attention_mask": np.ones(input_values.shape, dtype=np.int64)} if with_mask else {})})[0]
+    print(f"   max |logits diff| vs eager: {np.abs(expected - actual).max():.2e}")
+
+
+def export_tts(path):
+    from transformers import VitsModel, AutoTokenizer
+    model = VitsModel.from_pretrained(tts.MODEL_NAME).eval()
+    tokenizer = AutoTokenizer.from_pretrained(tts.MODEL_NAME)
+    inputs = tokenizer("xin chào các bạn", return_tensors="pt")
+
+    def export(target):
+        onnx_export(VitsWaveform(model).eval(), (inputs.input_ids, inputs.attention_mask), target,
+                    input_names=["input_ids", "attention_mask"], output_names=["waveform"],
+                    dynamic_axes={"input_ids": {0: "batch", 1: "tokens"},
+                                  "attention_mask": {0: "batch", 1: "tokens"},
+                                  "waveform": {0: "batch", 1: "samples"}},
+                    opset_version=OPSET)
+
+    # VITS samples noise, so the trace is checked on a noise-free copy: texts shorter and
+    # longer than the traced one must give the same samples as eager (the graph has
+    # length-dependent padding that a trace could have frozen)
+    noise = model.noise_scale, model.noise_scale_duration
+    model.noise_scale = model.noise_scale_duration = 0.0
+    check_path = path + ".check"
+    export(check_path)
+    session, worst = onnx_session(check_path), 0.0
+    for text in ("chào", TTS_CHECK_TEXT):
+        check_inputs = tokenizer(text, return_tensors="pt")
+        with torch.no_grad():
+            expected = model(**check_inputs).waveform.numpy()
+        actual = session.run(["waveform"], {"input_ids": check_inputs.input_ids.numpy(),
+                                            "attention_mask": check_inputs.attention_mask.numpy()})[0]
+        if actual.shape != expected.shape:
+            raise RuntimeError(f"ONNX waveform has {actual.shape[-1]} samples for {text!r}, eager {expected.shape[-1]}")
+        worst = max(worst, float(np.abs(expected - actual).max()))
+    del session
+    os.remove(check_path)
+    print(f"   max |waveform diff| vs eager (noise off): {worst:.2e}")
+
+    model.noise_scale, model.noise_scale_duration = noise
+    export(path)
+
+
+def quantize_file(path):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    tmp_path = path + ".int8.tmp"
+    quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--models", nargs="+", choices=["stt", "tts"], default=["stt", "tts"])
+    parser.add_argument("--int8", action="store_true", help="quantize weights to int8 after export")
+    parser.add_argument("--output-dir", default=SPEECH_ONNX_DIR)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    exporters = {"stt": (stt.MODEL_NAME, export_stt), "tts": (tts.MODEL_NAME, export_tts)}
+    for name in args.models:
+        model_name, export = exporters[name]
+        path = onnx_path(model_name, args.output_dir)
+        print(f"📦 Exporting {model_name} -> {path}")
+        export(path)
+        if args.int8:
+            quantize_file(path)
+            print("   quantized weights to int8")
+        print(f"✅ {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
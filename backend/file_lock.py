@@ -0,0 +1,28 @@
+try:
+    import fcntl
+except ImportError:  # Windows: single-process writes only
+    fcntl = None
+
+
+class FileLock:
+    """
+    Advisory inter-process lock (fcntl.flock on `path`), so the server workers
+    and the ingestion script can share files under ./database. Not reentrant;
+    a no-op where fcntl is unavailable.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.handle = open(self.path, "a")
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.handle is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+            self.handle.close()
+            self.handle = None
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+# Forward passes allowed to run at the same time across all models
+INFERENCE_MAX_CONCURRENCY = int(os.environ.get("INFERENCE_MAX_CONCURRENCY", "2"))
+# Waiting calls per model before new ones are rejected
+INFERENCE_MAX_QUEUE = int(os.environ.get("INFERENCE_MAX_QUEUE", "64"))
+# Number of recent calls used for the latency percentiles in stats()
+LATENCY_WINDOW = 512
+
+
+def default_model_threads() -> int:
+    """Intra-op threads per forward pass: the cores split between the passes allowed to run at once."""
+    return max(1, (os.cpu_count() or 1) // max(1, INFERENCE_MAX_CONCURRENCY))
+
+
+# torch's intra-op thread count is a process-wide setting shared by every torch
+# model, so there is one value for all lanes (ONNX Runtime sessions have their own)
+INFERENCE_TORCH_THREADS = int(os.environ.get("INFERENCE_TORCH_THREADS", str(default_model_threads())))
+
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class InferenceQueueFull(RuntimeError):
+    """Raised when a model's queue is at its limit; callers should answer 503."""
+
+
+class InferenceLane:
+    """
+    Dedicated worker threads for one model.
+
+    Each worker applies the process-wide INFERENCE_TORCH_THREADS when it
+    starts (the same value on every lane, so lanes never override each
+    other); together with the shared concurrency slots this keeps concurrent
+    requests queued instead of oversubscribing the cores.
+    """
+
+    def __init__(self, name: str, workers: int, max_queue: int, slots: threading.BoundedSemaphore):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.slots = slots
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"infer-{name}",
+                                            initializer=self._init_worker)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.counters = {"completed": 0, "failed": 0, "rejected": 0, "max_queue_depth": 0}
+        self.wait_ms = deque(maxlen=LATENCY_WINDOW)
+        self.run_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def _init_worker(self):
+        try:
+            import torch
+            torch.set_num_threads(INFERENCE_TORCH_THREADS)
+        except ImportError:
+            pass
+
+    def _call(self, fn: Callable, args, kwargs, queued_at: float):
+        with self.slots:
+            started = time.perf_counter()
+            with self._lock:
+                self.waiting -= 1
+                self.running += 1
+                self.wait_ms.append((started - queued_at) * 1000)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.counters["failed"] += 1
+                raise
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.run_ms.append((time.perf_counter() - started) * 1000)
+            with self._lock:
+                self.counters["completed"] += 1
+            return result
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise InferenceQueueFull(f"{self.name} inference queue is full ({self.max_queue} waiting)")
+            self.waiting += 1
+            self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], self.waiting)
+        return self._executor.submit(self._call, fn, args, kwargs, time.perf_counter())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            wait_ms, run_ms = list(self.wait_ms), list(self.run_ms)
+            return {
+                **self.counters,
+                "queue_depth": self.waiting,
+                "running": self.running,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "wait_ms_p50": round(percentile(wait_ms, 0.5), 2),
+                "wait_ms_p99": round(percentile(wait_ms, 0.99), 2),
+                "run_ms_p50": round(percentile(run_ms, 0.5), 2),
+                "run_ms_p99": round(percentile(run_ms, 0.99), 2),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class InferenceExecutor:
+    """
+    Runs every torch forward pass of the speech models.
+
+    Each model gets its own lane (workers + torch thread budget + bounded
+    queue); a shared semaphore caps how many forward passes run at once
+    across all lanes.
+    """
+
+    def __init__(self, max_concurrency: int = INFERENCE_MAX_CONCURRENCY, max_queue: int = INFERENCE_MAX_QUEUE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.lanes: Dict[str, InferenceLane] = {}
+
+    def register(self, name: str, workers: int = 1, max_queue: int = None):
+        if name not in self.lanes:
+            self.lanes[name] = InferenceLane(
+                name, workers,
+                max_queue if max_queue is not None else self.max_queue,
+                self.slots
+            )
+        return self.lanes[name]
+
+    def run(self, name: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` on the model's lane and wait for the result."""
+        return self.lanes[name].submit(fn, *args, **kwargs).result()
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "torch_threads": INFERENCE_TORCH_THREADS,
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+        }
+
+    def shutdown(self):
+        for lane in self.lanes.values():
+            lane.shutdown()
+
+
+# Khởi tạo instance global
+inference_executor = InferenceExecutor()
@@ -0,0 +1,325 @@
+import os
+import re
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from startup import env_flag
+from text_normalization import fold, nfc
+
+# Confirm weak keyword matches (and catch commands phrased without keywords) with the
+# centroid-embedding classifier; costs no extra API call, the RAG path embeds the question anyway
+INTENT_CLASSIFIER = env_flag("INTENT_CLASSIFIER", default=False)
+# Keyword matches covering less of the question than this are checked by the classifier
+INTENT_KEYWORD_CONFIDENCE = float(os.environ.get("INTENT_KEYWORD_CONFIDENCE", "0.5"))
+# Minimum cosine similarity to an intent centroid for the classifier to dispatch
+INTENT_CLASSIFIER_THRESHOLD = float(os.environ.get("INTENT_CLASSIFIER_THRESHOLD", "0.6"))
+
+RAG_INTENT = "rag"
+WORD_PATTERN = re.compile(r"\w+")
+# Stands in for accented words in the folded pass, so they can only match with their own accents
+MASKED_WORD = "\0"
+
+# Keyword groups, written as users type them with accents (matched on word boundaries; words
+# typed without accents also match their accented keyword, see IntentRouter.match_keywords)
+KEYWORD_GROUPS = {
+    "roadmap_topic": ["lộ trình", "roadmap", "onboarding", "học tập"],
+    "create": ["tạo", "gợi ý", "đề xuất"],
+    "content": ["email", "tóm tắt", "câu hỏi", "checklist"],
+    "welcome_email": ["email chào mừng", "welcome email"],
+    "summary": ["tóm tắt"],
+    "question": ["câu hỏi"],
+    "training": ["đào tạo"],
+    "extraction": ["cv", "hồ sơ", "trích xuất", "tự động điền"],
+    "help": ["help", "trợ giúp", "hướng dẫn", "chức năng"],
+}
+
+# Intents in priority order, each with the keyword groups that must all be present
+# ("position" = one of the roadmap positions, by key or display name)
+INTENT_RULES = [
+    ("roadmap", ["roadmap_topic", "create", "position"]),
+    ("roadmap_help", ["roadmap_topic", "create"]),
+    ("welcome_email", ["content", "welcome_email"]),
+    ("summarize", ["content", "summary"]),
+    ("training_questions", ["content", "question", "training"]),
+    ("extraction", ["extraction"]),
+    ("help", ["help"]),
+]
+
+# Example phrasings per intent for the centroid classifier
+INTENT_EXAMPLES = {
+    "roadmap_help": [
+        "Tạo lộ trình onboarding cho tôi",
+        "Gợi ý lộ trình học tập cho nhân viên mới",
+        "Tôi nên học gì trong tháng đầu tiên?",
+        "Lập kế hoạch làm quen công việc cho vị trí của tôi",
+    ],
+    "welcome_email": [
+        "Viết email chào mừng nhân viên mới",
+        "Soạn thư chào đón đồng nghiệp mới vào công ty",
+        "Tạo welcome email cho bạn mới vào team",
+    ],
+    "summarize": [
+        "Tóm tắt tài liệu này giúp tôi",
+        "Tóm tắt nội quy công ty",
+        "Cho tôi bản tóm tắt ngắn của chính sách",
+    ],
+    "training_questions": [
+        "Tạo câu hỏi đào tạo về an toàn lao động",
+        "Soạn bộ câu hỏi kiểm tra sau khóa đào tạo",
+        "Ra đề trắc nghiệm cho buổi training",
+    ],
+    "extraction": [
+        "Trích xuất thông tin từ CV",
+        "Đọc hồ sơ ứng viên và điền form",
+        "Tự động điền thông tin nhân viên từ file",
+    ],
+    "help": [
+        "Bạn làm được những gì?",
+        "Trợ giúp",
+        "Chatbot có những chức năng nào?",
+        "Hướng dẫn sử dụng chatbot",
+    ],
+    RAG_INTENT: [
+        "Giờ làm việc của công ty là mấy giờ?",
+        "Nhân viên được nghỉ phép năm bao nhiêu ngày?",
+        "Đi muộn bị xử lý như thế nào?",
+        "Công ty đóng BHXH cho nhân viên thử việc không?",
+        "Làm thêm giờ được tính lương ra sao?",
+        "Đồng phục được phát khi nào?",
+    ],
+}
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over keyword phrases, with words as the
+    alphabet: one pass over the words of the question finds every keyword
+    occurrence, however many keywords there are. Working on words keeps
+    matches on word boundaries ("cv" does not match inside another word) and
+    makes the pass a handful of dict lookups.
+    """
+
+    def __init__(self, patterns: Dict[tuple, List]):
+        # patterns: tuple of words -> labels reported when the phrase occurs
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail = [0]
+        self.outputs: List[List] = [[]]
+        for pattern, labels in patterns.items():
+            node = 0
+            for word in pattern:
+                if word not in self.goto[node]:
+                    self.goto[node][word] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                node = self.goto[node][word]
+            self.outputs[node].append((len(pattern), labels))
+
+        # Breadth-first, so the fail target of a node is always finished before the node
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self.goto[node].items():
+                queue.append(child)
+                target = self.fail[node]
+                while target and word not in self.goto[target]:
+                    target = self.fail[target]
+                self.fail[child] = self.goto[target].get(word, 0)
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def find(self, words: List[str]):
+        """Yield (start, end, labels) word ranges for every keyword occurrence in `words`."""
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        node = 0
+        for i, word in enumerate(words):
+            while node and word not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(word, 0)
+            for length, labels in outputs[node]:
+                yield i + 1 - length, i + 1, labels
+
+
+class CentroidClassifier:
+    """
+    Nearest intent centroid by cosine similarity. Centroids are the normalized
+    means of the embedded INTENT_EXAMPLES, computed on first use with one
+    batched embedding call.
+    """
+
+    def __init__(self, embed_many: Callable[[List[str]], List[List[float]]],
+                 examples: Dict[str, List[str]] = INTENT_EXAMPLES):
+        self.embed_many = embed_many
+        self.examples = examples
+        self._lock = threading.Lock()
+        self._centroids = None
+        self._intents: List[str] = []
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _build(self):
+        with self._lock:
+            if self._centroids is not None:
+                return
+            intents = list(self.examples)
+            texts = [text for intent in intents for text in self.examples[intent]]
+            vectors = self._normalize(self.embed_many(texts))
+            centroids, start = [], 0
+            for intent in intents:
+                count = len(self.examples[intent])
+                centroids.append(vectors[start:start + count].mean(axis=0))
+                start += count
+            self._intents = intents
+            self._centroids = self._normalize(centroids)
+
+    def classify(self, embedding) -> Dict:
+        if self._centroids is None:
+            self._build()
+        similarities = self._centroids @ self._normalize(embedding)
+        best = int(np.argmax(similarities))
+        return {"intent": self._intents[best], "confidence": float(similarities[best])}
+
+
+class IntentRouter:
+    """
+    Routes a question to a command intent or to RAG: the lowercased NFC
+    question is scanned once by a KeywordAutomaton over every keyword and
+    position name, then INTENT_RULES are checked against the matched groups.
+    Accents are significant, so words that differ only in diacritics ("họ sợ"
+    vs "hồ sơ") do not collide. Only when no rule matches is the question
+    scanned again against the accent-folded keywords, with its accented words
+    masked: that lets questions typed without accents ("tao lo trinh") match,
+    while an accented word still matches only its own keyword.
+
+    Confidence of a keyword match is the fraction of the question's words the
+    matched keywords cover ("help" -> 1.0, "hướng dẫn xin nghỉ phép" -> 0.4).
+    With a classifier, matches below INTENT_KEYWORD_CONFIDENCE and questions
+    without keywords are decided by the nearest intent centroid instead.
+    """
+
+    def __init__(self, keyword_groups: Dict[str, List[str]] = KEYWORD_GROUPS, rules=INTENT_RULES):
+        self.keyword_groups = keyword_groups
+        self.rules = rules
+        self.classifier: Optional[CentroidClassifier] = None
+        self.classifier_threshold = INTENT_CLASSIFIER_THRESHOLD
+        self._positions: Dict[str, str] = {}
+        self._automaton, self._folded_automaton = self._build({})
+        self.counters = {"keywords": 0, "classifier": 0, RAG_INTENT: 0, "classifier_errors": 0}
+
+    @staticmethod
+    def _words(text: str) -> tuple:
+        return tuple(WORD_PATTERN.findall(nfc(text).lower()))
+
+    @staticmethod
+    def _folded_words(words: tuple) -> tuple:
+        """Words of the folded pass: accent-free words as typed, accented words masked."""
+        return tuple(word if fold(word) == word else MASKED_WORD for word in words)
+
+    def _build(self, positions: Dict[str, str]):
+        """Automata over the keywords as written and over their accent-folded forms."""
+        labelled = [(keyword, ("group", group))
+                    for group, keywords in self.keyword_groups.items() for keyword in keywords]
+        labelled += [(alias, ("position", key)) for key, name in positions.items() for alias in {key, name}]
+        patterns: Dict[tuple, List] = {}
+        folded: Dict[tuple, List] = {}
+        for text, label in labelled:
+            words = self._words(text)
+            if words:
+                patterns.setdefault(words, []).append(label)
+                folded.setdefault(tuple(fold(word) for word in words), []).append(label)
+        return KeywordAutomaton(patterns), KeywordAutomaton(folded)
+
+    def set_positions(self, positions: Dict[str, str]):
+        """Roadmap positions as {key: display name}; the automaton is rebuilt only when they change."""
+        if positions != self._positions:
+            automata = self._build(positions)
+            self._positions = dict(positions)
+            self._automaton, self._folded_automaton = automata
+
+    def enable_classifier(self, embed_many: Callable[[List[str]], List[List[float]]],
+                          threshold: float = INTENT_CLASSIFIER_THRESHOLD):
+        self.classifier = CentroidClassifier(embed_many)
+        self.classifier_threshold = threshold
+
+    @staticmethod
+    def _collect(matches, spans: Dict[str, List], positions: List[str]):
+        for start, end, labels in matches:
+            for kind, value in labels:
+                if kind == "position":
+                    positions.append(value)
+                    spans.setdefault("position", []).append((start, end))
+                else:
+                    spans.setdefault(value, []).append((start, end))
+
+    def _apply_rules(self, words: tuple, spans: Dict[str, List], positions: List[str]) -> Optional[Dict]:
+        # Most questions contain no keyword at all and skip the rules
+        for intent, groups in (self.rules if spans else ()):
+            if all(group in spans for group in groups):
+                covered = {i for group in groups for start, end in spans[group] for i in range(start, end)}
+                return {
+                    "intent": intent,
+                    "confidence": len(covered) / len(words),
+                    "source": "keywords",
+                    # First position mentioned in the question
+                    "position": positions[0] if "position" in groups else None,
+                }
+        return None
+
+    def match_keywords(self, question: str) -> Dict:
+        """Intent from the keyword rules alone (intent "rag" when no rule matches)."""
+        words = self._words(question)
+        spans: Dict[str, List] = {}
+        positions: List[str] = []
+        self._collect(self._automaton.find(words), spans, positions)
+        result = self._apply_rules(words, spans, positions)
+        if result is None:
+            # Fallback for words typed without accents; keeps the spans found with accents
+            folded = self._folded_words(words)
+            if any(word != MASKED_WORD for word in folded):
+                self._collect(self._folded_automaton.find(folded), spans, positions)
+                result = self._apply_rules(words, spans, positions)
+        return result or {"intent": RAG_INTENT, "confidence": 0.0, "source": "keywords", "position": None}
+
+    def route(self, question: str, embed: Optional[Callable[[str], List[float]]] = None) -> Dict:
+        """
+        Intent of `question`: {"intent", "confidence", "source", "position"}.
+        `embed` is only called when the classifier has to decide; when it fails
+        (embedding API down or rate limited) the keyword result stands.
+        """
+        result = self.match_keywords(question)
+        if self.classifier is not None and embed is not None and (
+                result["intent"] == RAG_INTENT or result["confidence"] < INTENT_KEYWORD_CONFIDENCE):
+            try:
+                predicted = self.classifier.classify(embed(question))
+            except Exception as e:
+                print(f"⚠️ Intent classifier unavailable, using the keyword intent: {e}")
+                self.counters["classifier_errors"] += 1
+                predicted = None
+            # The classifier has no per-position roadmap intent; a keyword roadmap match keeps its position
+            same = predicted is not None and (predicted["intent"] == result["intent"] or
+                                              (result["intent"], predicted["intent"]) == ("roadmap", "roadmap_help"))
+            if predicted is not None and predicted["confidence"] >= self.classifier_threshold and not same:
+                result = {**predicted, "source": "classifier", "position": None}
+        if result["intent"] == RAG_INTENT:
+            self.counters[RAG_INTENT] += 1
+        else:
+            self.counters[result["source"]] += 1
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            "states": len(self._automaton.goto) + len(self._folded_automaton.goto),
+            "positions": len(self._positions),
+            "classifier_enabled": self.classifier is not None,
+            **self.counters,
+        }
+
+
+# Khởi tạo instance global
+intent_router = IntentRouter()
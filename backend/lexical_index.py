@@ -0,0 +1,390 @@
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from retriever import RETRIEVER_RELOAD_INTERVAL, empty_results
+from startup import env_flag
+from text_normalization import fold, fold_many, nfc, strip_accents
+
+LEXICAL_INDEX_DIR = os.environ.get("LEXICAL_INDEX_DIR", "./database/lexical_index")
+# Fuse BM25 results into vector retrieval (reciprocal rank fusion)
+LEXICAL_RETRIEVAL = env_flag("LEXICAL_RETRIEVAL")
+# Answer short exact-term queries ("BHXH", "nghỉ phép năm") from the index alone, without embedding them
+LEXICAL_FAST_PATH = env_flag("LEXICAL_FAST_PATH")
+LEXICAL_FAST_PATH_MAX_WORDS = int(os.environ.get("LEXICAL_FAST_PATH_MAX_WORDS", "4"))
+# A phrase found in more than this fraction of rows is too common to answer on its own
+LEXICAL_FAST_PATH_MAX_DF = float(os.environ.get("LEXICAL_FAST_PATH_MAX_DF", "0.05"))
+# Rank constant of reciprocal rank fusion: score = sum(1 / (RRF_K + rank))
+RRF_K = int(os.environ.get("RRF_K", "60"))
+# BM25 hits scoring below this fraction of the best hit (or below LEXICAL_MIN_SCORE) are not fused,
+# so one shared folded word ("bao" in "bảo hiểm") does not pull in an unrelated row
+LEXICAL_MIN_SCORE_RATIO = float(os.environ.get("LEXICAL_MIN_SCORE_RATIO", "0.5"))
+LEXICAL_MIN_SCORE = float(os.environ.get("LEXICAL_MIN_SCORE", "0"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+WORD_PATTERN = re.compile(r"\w+")
+# Prefix of the accented terms, which share the vocabulary with the folded ones
+ACCENTED_PREFIX = "="
+
+
+def _terms(folded: str) -> List[str]:
+    words = WORD_PATTERN.findall(folded)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _accented_terms(text: str) -> List[str]:
+    """Lowercase words and bigrams with their accents kept, marked with ACCENTED_PREFIX."""
+    return [ACCENTED_PREFIX + term for term in _terms(nfc(text).lower())]
+
+
+def has_accents(text: str) -> bool:
+    return strip_accents(text) != text
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Folded words plus word bigrams, so multi-word terms also match as phrases.
+    A query typed with accents also gets its accented terms, so "bao nhiêu"
+    ranks rows with "bao" above rows with "bảo".
+    """
+    terms = _terms(fold(text))
+    return terms + _accented_terms(text) if has_accents(text) else terms
+
+
+def reciprocal_rank_fusion(rankings: List[List], k: int = RRF_K) -> List:
+    """Merge ranked lists of keys; keys ranked high in several lists come first."""
+    scores: Dict = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def _write_json(path: str, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def _read_json(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class BM25Index:
+    """
+    BM25 over a fixed list of texts, stored as CSR postings.
+
+    Postings of term t are `doc_ids[offsets[t]:offsets[t + 1]]`, each with its
+    precomputed BM25 weight, so scoring a query is one `bincount` over the
+    postings of its terms. The three arrays are .npy files opened with
+    mmap_mode="r": loading is instant and only the postings a query touches are
+    paged in. The vocabulary is a JSON object term -> id.
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], offsets, doc_ids, weights, size: int):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.size = size
+
+    @classmethod
+    def build(cls, texts: List[str], k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        postings: Dict[str, List] = {}
+        lengths = []
+        for doc, (text, folded) in enumerate(zip(texts, fold_many(texts))):
+            counts = Counter(_terms(folded) + _accented_terms(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc, tf))
+        lengths = np.asarray(lengths, dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_ids, weights = [], []
+        for i, term in enumerate(terms):
+            docs, tfs = (np.asarray(column) for column in zip(*postings[term]))
+            idf = math.log(1 + (len(texts) - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = k1 * (1 - b + b * lengths[docs] / average_length)
+            doc_ids.append(docs.astype(np.int32))
+            weights.append((idf * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32))
+            offsets[i + 1] = offsets[i] + len(docs)
+        return cls(
+            {term: i for i, term in enumerate(terms)}, offsets,
+            np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32),
+            np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32),
+            len(texts),
+        )
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        _write_json(os.path.join(path, "terms.json"), {"size": self.size, "terms": self.vocabulary})
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        np.save(os.path.join(path, "doc_ids.npy"), self.doc_ids)
+        np.save(os.path.join(path, "weights.npy"), self.weights)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        meta = _read_json(os.path.join(path, "terms.json"))
+        arrays = [np.load(os.path.join(path, name), mmap_mode="r")
+                  for name in ("offsets.npy", "doc_ids.npy", "weights.npy")]
+        return cls(meta["terms"], *arrays, meta["size"])
+
+    def postings(self, term: str) -> np.ndarray:
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            return np.zeros(0, dtype=np.int32)
+        return self.doc_ids[self.offsets[term_id]:self.offsets[term_id + 1]]
+
+    def scores(self, terms: List[str]) -> np.ndarray:
+        """BM25 score of every document for the (deduplicated) query terms."""
+        slices = []
+        for term in dict.fromkeys(terms):
+            term_id = self.vocabulary.get(term)
+            if term_id is not None:
+                start, end = self.offsets[term_id], self.offsets[term_id + 1]
+                slices.append((self.doc_ids[start:end], self.weights[start:end]))
+        if not slices:
+            return np.zeros(self.size, dtype=np.float32)
+        docs = np.concatenate([docs for docs, _ in slices])
+        weights = np.concatenate([weights for _, weights in slices])
+        return np.bincount(docs, weights=weights, minlength=self.size)
+
+    def top(self, terms: List[str], top_k: int, min_ratio: float = 0.0, min_score: float = 0.0) -> List[int]:
+        """
+        Ids of the top_k documents with a positive score, best first. Documents
+        scoring below `min_score` or below `min_ratio` of the best score are left out.
+        """
+        scores = self.scores(terms)
+        floor = max(min_score, min_ratio * float(scores.max())) if self.size else 0.0
+        matched = np.flatnonzero((scores > 0) & (scores >= floor))
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        return [int(i) for i in matched[np.argsort(-scores[matched], kind="stable")]]
+
+
+def build_lexical_index(collection, chunks: List[Dict], path: str = LEXICAL_INDEX_DIR):
+    """
+    Build the BM25 index over every qa_collection row (question + answer) and
+    every chunk text, and swap it into `path`. Called by the ingestion script
+    after qa_collection changed.
+    """
+    started = time.perf_counter()
+    rows = collection.get(include=["documents", "metadatas"])
+    documents, metadatas = rows["documents"], [metadata or {} for metadata in rows["metadatas"]]
+    row_texts = [f"{document}\n{metadata.get('answer', '')}" for document, metadata in zip(documents, metadatas)]
+    chunk_hashes = [chunk["hash"] for chunk in chunks]
+
+    tmp_path, old_path = path + ".tmp", path + ".old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    BM25Index.build(row_texts).save(os.path.join(tmp_path, "rows"))
+    BM25Index.build([chunk["text"] for chunk in chunks]).save(os.path.join(tmp_path, "chunks"))
+    _write_json(os.path.join(tmp_path, "rows.json"), {"documents": documents, "metadatas": metadatas})
+    _write_json(os.path.join(tmp_path, "chunks.json"), {"hashes": chunk_hashes})
+    _write_json(os.path.join(tmp_path, "meta.json"), {"built_at": time.time_ns(),
+                                                     "rows": len(documents), "chunks": len(chunks)})
+
+    # Readers keep their mmaps of the old files; they pick up the new directory on their next check
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    print(f"✅ Lexical index: {len(documents)} rows, {len(chunks)} chunks in {time.perf_counter() - started:.2f}s")
+
+
+class LexicalIndex:
+    """
+    Query side of the BM25 index built by build_lexical_index.
+
+    Loaded lazily and reloaded when the index directory is rebuilt (checked at
+    most every `reload_interval` seconds). Rows are identified by
+    (document, answer), the same key the vector results are merged on.
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_DIR, reload_interval: float = RETRIEVER_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        # _reload_lock serializes loads; _state_lock guards the check schedule below
+        self._reload_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._checked_at = float("-inf")
+        self._checking = False
+        self._built_at = None
+        # Swapped as one dict so queries never see a half-loaded index
+        self._index: Optional[Dict] = None
+        self.counters = {"queries": 0, "fast_path_hits": 0, "reloads": 0}
+
+    def _load(self) -> Dict:
+        meta = _read_json(os.path.join(self.path, "meta.json"))
+        rows = _read_json(os.path.join(self.path, "rows.json"))
+        chunk_hashes = _read_json(os.path.join(self.path, "chunks.json"))["hashes"]
+        # Rows of each chunk, original questions before their paraphrases
+        rows_by_chunk: Dict[str, List[int]] = {}
+        for i, metadata in sorted(enumerate(rows["metadatas"]), key=lambda item: bool(item[1].get("is_paraphrase"))):
+            rows_by_chunk.setdefault(metadata.get("chunk_hash"), []).append(i)
+        return {
+            "built_at": meta["built_at"],
+            "rows": BM25Index.load(os.path.join(self.path, "rows")),
+            "chunks": BM25Index.load(os.path.join(self.path, "chunks")),
+            "documents": rows["documents"],
+            "metadatas": rows["metadatas"],
+            "chunk_rows": [rows_by_chunk.get(h, []) for h in chunk_hashes],
+        }
+
+    def _maybe_reload(self):
+        """
+        Every `reload_interval` seconds, check for a rebuilt index directory.
+        The first load happens in the caller; later ones run on a background
+        thread while queries keep using the previous index.
+        """
+        with self._state_lock:
+            now = time.monotonic()
+            if self._checking or now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            self._checking = True
+        if self._index is None:
+            self._check_built_at()
+        else:
+            threading.Thread(target=self._check_built_at, name="lexical-index-reload", daemon=True).start()
+
+    def _check_built_at(self):
+        try:
+            with self._reload_lock:
+                try:
+                    built_at = _read_json(os.path.join(self.path, "meta.json"))["built_at"]
+                except (OSError, ValueError, KeyError):
+                    return
+                if built_at == self._built_at:
+                    return
+                self._index = self._load()
+                self._built_at = built_at
+                self.counters["reloads"] += 1
+        except Exception as e:
+            print(f"❌ Lexical index reload failed, keeping the previous index: {e}")
+        finally:
+            with self._state_lock:
+                self._checking = False
+
+    def available(self) -> bool:
+        self._maybe_reload()
+        return self._index is not None
+
+    @staticmethod
+    def row_key(document: str, metadata: Dict):
+        return document, (metadata or {}).get("answer")
+
+    def fuse(self, results: Dict, query: str, top_k: int) -> Dict:
+        """
+        Reciprocal rank fusion of vector results (Chroma-shaped, already filtered
+        by similarity) with BM25 over the rows and BM25 over the chunks, where a
+        chunk hit stands for its rows. Rows only found lexically get distance None.
+        """
+        self._maybe_reload()
+        index = self._index
+        if index is None:
+            return results
+        self.counters["queries"] += 1
+        rows = {}
+        vector_ranking = []
+        for document, metadata, distance in zip(results["documents"][0], results["metadatas"][0],
+                                                results["distances"][0]):
+            key = self.row_key(document, metadata)
+            rows.setdefault(key, (document, metadata, distance))
+            vector_ranking.append(key)
+
+        terms = tokenize(query)
+        chunk_ranking = []
+        for chunk in index["chunks"].top(terms, top_k, LEXICAL_MIN_SCORE_RATIO, LEXICAL_MIN_SCORE):
+            chunk_ranking.extend(index["chunk_rows"][chunk])
+        lexical_rankings = []
+        row_ranking = index["rows"].top(terms, top_k, LEXICAL_MIN_SCORE_RATIO, LEXICAL_MIN_SCORE)
+        for ranking in (row_ranking, chunk_ranking[:top_k]):
+            keys = []
+            for i in ranking:
+                document, metadata = index["documents"][i], index["metadatas"][i]
+                key = self.row_key(document, metadata)
+                rows.setdefault(key, (document, metadata, None))
+                keys.append(key)
+            lexical_rankings.append(keys)
+
+        fused = empty_results()
+        for key in reciprocal_rank_fusion([vector_ranking] + lexical_rankings)[:top_k]:
+            for field, value in zip(("documents", "metadatas", "distances"), rows[key]):
+                fused[field][0].append(value)
+        return fused
+
+    @staticmethod
+    def _phrase_rows(rows: BM25Index, words: List[str]) -> Optional[np.ndarray]:
+        """Rows containing `words` as a phrase, None when there are none."""
+        # Consecutive words must occur next to each other (a bigram posting), a single word on its own
+        prefix = ACCENTED_PREFIX if words and words[0].startswith(ACCENTED_PREFIX) else ""
+        phrase_terms = [f"{a} {b[len(prefix):]}" for a, b in zip(words, words[1:])] or words
+        matched = None
+        for term in phrase_terms:
+            docs = rows.postings(term)
+            matched = docs if matched is None else np.intersect1d(matched, docs, assume_unique=True)
+            if not len(matched):
+                return None
+        return matched
+
+    def exact_match(self, query: str, top_k: int) -> Optional[Dict]:
+        """
+        Chroma-shaped results for a short query whose folded words all occur,
+        as a phrase, in a small number of rows; None when the query is not such
+        an exact-term query. A query typed with accents is matched on its
+        accented phrase first. Distances are None: no embedding was computed.
+        """
+        if not LEXICAL_FAST_PATH:
+            return None
+        self._maybe_reload()
+        index = self._index
+        words = WORD_PATTERN.findall(fold(query))
+        if index is None or not 0 < len(words) <= LEXICAL_FAST_PATH_MAX_WORDS:
+            return None
+        rows = index["rows"]
+        matched = None
+        if has_accents(query):
+            matched = self._phrase_rows(rows, [ACCENTED_PREFIX + word
+                                               for word in WORD_PATTERN.findall(nfc(query).lower())])
+        if matched is None:
+            matched = self._phrase_rows(rows, words)
+        if matched is None or len(matched) > max(1, LEXICAL_FAST_PATH_MAX_DF * rows.size):
+            return None
+
+        scores = rows.scores(tokenize(query))[matched]
+        results = empty_results()
+        for i in matched[np.argsort(-scores, kind="stable")][:top_k]:
+            results["documents"][0].append(index["documents"][i])
+            results["metadatas"][0].append(index["metadatas"][i])
+            results["distances"][0].append(None)
+        self.counters["fast_path_hits"] += 1
+        return results
+
+    def stats(self) -> Dict:
+        index = self._index
+        if index is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "rows": index["rows"].size,
+            "chunks": index["chunks"].size,
+            "terms": len(index["rows"].vocabulary),
+            "postings": int(len(index["rows"].doc_ids) + len(index["chunks"].doc_ids)),
+            **self.counters,
+        }
+
+
+# Khởi tạo instance global
+lexical_index = LexicalIndex()
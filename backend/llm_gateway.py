@@ -0,0 +1,459 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import httpx
+from openai import APIConnectionError, APIStatusError, OpenAI
+
+from inference_executor import LATENCY_WINDOW, percentile
+from rate_limiter import INTERACTIVE, RateLimiter, estimate_tokens
+from startup import env_flag
+
+DEFAULT_BASE_URL = "https://aiportalapi.stu-platform.live/jpe"
+# API keys are read from the environment only (see LLMGateway._settings)
+API_KEY_VARIABLES = {"chat": "OPENAI_API_KEY", "embedding": "EMBEDDING_API_KEY"}
+
+CHAT_MODEL = "GPT-4o-mini"
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Connection pool shared by every upstream call of the process
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_KEEPALIVE = int(os.environ.get("LLM_MAX_KEEPALIVE", "32"))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+# Default read timeouts per call kind, in seconds (a call can pass its own `timeout`)
+LLM_CHAT_TIMEOUT = float(os.environ.get("LLM_CHAT_TIMEOUT", "60"))
+LLM_EMBEDDING_TIMEOUT = float(os.environ.get("LLM_EMBEDDING_TIMEOUT", "20"))
+# Retries after the first attempt on connection errors, timeouts, 429 and 5xx
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "8"))
+
+# Upstream budget per endpoint, 0 = unlimited (defaults: the gpt-4o-mini / text-embedding-3-small tier-1 quotas)
+LLM_CHAT_RPM = int(os.environ.get("LLM_CHAT_RPM", "500"))
+LLM_CHAT_TPM = int(os.environ.get("LLM_CHAT_TPM", "200000"))
+LLM_EMBEDDING_RPM = int(os.environ.get("LLM_EMBEDDING_RPM", "3000"))
+LLM_EMBEDDING_TPM = int(os.environ.get("LLM_EMBEDDING_TPM", "1000000"))
+# Completion budget assumed for requests that do not set max_tokens
+LLM_DEFAULT_COMPLETION_TOKENS = 512
+# Share one upstream call between identical chat requests in flight at the same time
+LLM_COALESCE = env_flag("LLM_COALESCE", default=True)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+    return max(delay, retry_after or 0.0)
+
+
+def estimate_chat_tokens(kwargs: Dict) -> int:
+    texts = [str(message.get("content") or "") for message in kwargs.get("messages", [])]
+    if kwargs.get("tools"):
+        texts.append(json.dumps(kwargs["tools"], ensure_ascii=False))
+    return estimate_tokens(texts, kwargs.get("max_tokens") or LLM_DEFAULT_COMPLETION_TOKENS)
+
+
+def coalesce_key(kwargs: Dict) -> str:
+    """
+    Identity of a chat request: model, messages and temperature, plus every
+    other parameter (max_tokens, tools, ...) so coalesced callers only ever
+    share a response they could have received themselves.
+    """
+    return hashlib.sha1(json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """One upstream call and the callers waiting for its outcome."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[Exception] = None
+
+
+class StreamFlight:
+    """
+    One upstream stream shared by identical streamed requests. Every caller
+    gets its own reader, which replays the chunks received so far and then
+    follows the stream; whichever reader needs the next chunk pulls it from
+    upstream. The stream is closed early when every reader has gone.
+    """
+
+    def __init__(self, on_finish):
+        self.on_finish = on_finish
+        self.stream = None
+        self.chunks = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.readers = 0
+        self._pulling = False
+        self._cond = threading.Condition()
+
+    def open(self, stream):
+        with self._cond:
+            self.stream = stream
+            self._cond.notify_all()
+
+    def fail(self, error: Exception):
+        with self._cond:
+            self.error = error
+            self._cond.notify_all()
+        self.on_finish()
+
+    def _chunk(self, index: int):
+        """Chunk `index`, or None once the stream has ended."""
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done and self.error is None and (
+                        self.stream is None or self._pulling):
+                    self._cond.wait()
+                if index < len(self.chunks):
+                    return self.chunks[index]
+                if self.error is not None:
+                    raise self.error
+                if self.done:
+                    return None
+                self._pulling = True
+            finished = False
+            try:
+                chunk = next(self.stream)
+                with self._cond:
+                    self.chunks.append(chunk)
+            except StopIteration:
+                finished = True
+                with self._cond:
+                    self.done = True
+            except Exception as e:
+                finished = True
+                with self._cond:
+                    self.error = e
+            finally:
+                with self._cond:
+                    self._pulling = False
+                    self._cond.notify_all()
+            if finished:
+                self.on_finish()
+
+    def reader(self):
+        with self._cond:
+            self.readers += 1
+        index = 0
+        try:
+            while True:
+                chunk = self._chunk(index)
+                if chunk is None:
+                    return
+                yield chunk
+                index += 1
+        finally:
+            with self._cond:
+                self.readers -= 1
+                abandoned = self.readers == 0 and not self.done and self.error is None
+                if abandoned:
+                    self.error = RuntimeError("stream closed by all of its readers")
+            if abandoned:
+                self.on_finish()
+                if self.stream is not None:
+                    self.stream.close()
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, APIConnectionError):  # includes APITimeoutError
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after")) if response is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class CallerStats:
+    """Counters, token usage and recent latencies of one caller."""
+
+    def __init__(self):
+        self.counters = {"calls": 0, "errors": 0, "retries": 0, "coalesced": 0,
+                         "prompt_tokens": 0, "completion_tokens": 0}
+        self.latency_ms = deque(maxlen=LATENCY_WINDOW)
+        # Time to first delta of streamed completions
+        self.first_token_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def record_usage(self, usage):
+        if usage is not None:
+            self.counters["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            self.counters["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def snapshot(self) -> Dict:
+        latency_ms, first_token_ms = list(self.latency_ms), list(self.first_token_ms)
+        result = {
+            **self.counters,
+            "latency_ms_p50": round(percentile(latency_ms, 0.5), 2),
+            "latency_ms_p99": round(percentile(latency_ms, 0.99), 2),
+        }
+        if first_token_ms:
+            result["first_token_ms_p50"] = round(percentile(first_token_ms, 0.5), 2)
+            result["first_token_ms_p99"] = round(percentile(first_token_ms, 0.99), 2)
+        return result
+
+
+class LLMGateway:
+    """
+    The one place upstream chat and embedding calls go through.
+
+    Clients are created on first use (so a module's load_dotenv or a
+    benchmark's environment is already applied) and share one keep-alive
+    httpx.Client connection pool. The calls are synchronous; the ASGI server
+    runs them on its I/O thread pool. The SDK's own retries are disabled;
+    failed attempts are retried here with jittered backoff so every retry
+    shows up in stats().
+
+    Every attempt first takes budget from the endpoint's RateLimiter, at the
+    caller's priority: INTERACTIVE (chat, content, roadmap, extraction) ahead
+    of BATCH (ingestion); the budgets are shared by the processes on the host
+    (see RateLimiter). Chat requests identical to one already in flight in
+    this process wait for its response instead of sending their own; streamed
+    ones read a copy of its stream (StreamFlight).
+
+    `caller` names who is calling ("chatbot.answer", "content.generate_welcome_email",
+    ...) and keys the latency and token usage counters.
+
+    API keys come from OPENAI_API_KEY / EMBEDDING_API_KEY; a missing key is an
+    error on the first call that needs it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[str, OpenAI] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._callers: Dict[str, CallerStats] = {}
+        self.limiters = {
+            "chat": RateLimiter("chat", LLM_CHAT_RPM, LLM_CHAT_TPM),
+            "embedding": RateLimiter("embedding", LLM_EMBEDDING_RPM, LLM_EMBEDDING_TPM),
+        }
+        # Single-flight: coalesce_key -> the call in flight (Flight or StreamFlight)
+        self._flights: Dict[str, object] = {}
+
+    # --- clients -----------------------------------------------------------
+
+    def _settings(self, kind: str) -> Dict:
+        variable = API_KEY_VARIABLES[kind]
+        api_key = os.environ.get(variable)
+        if not api_key:
+            raise RuntimeError(f"{variable} is not set")
+        return {"base_url": os.environ.get("OPENAI_BASE_URL", DEFAULT_BASE_URL), "api_key": api_key}
+
+    @staticmethod
+    def missing_api_keys() -> List[str]:
+        """Environment variables that still need a key (the servers warn about them at startup)."""
+        return [variable for variable in API_KEY_VARIABLES.values() if not os.environ.get(variable)]
+
+    @staticmethod
+    def _pool_options() -> Dict:
+        return {
+            "limits": httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                   max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                                   keepalive_expiry=LLM_KEEPALIVE_EXPIRY),
+            "timeout": httpx.Timeout(LLM_CHAT_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        }
+
+    def client(self, kind: str = "chat") -> OpenAI:
+        """Sync client for `kind` ("chat" or "embedding"), on the shared pool."""
+        with self._lock:
+            if kind not in self._clients:
+                if self._http_client is None:
+                    self._http_client = httpx.Client(**self._pool_options())
+                self._clients[kind] = OpenAI(**self._settings(kind), max_retries=0,
+                                             http_client=self._http_client)
+            return self._clients[kind]
+
+    # --- bookkeeping -------------------------------------------------------
+
+    def _stats(self, caller: str) -> CallerStats:
+        stats = self._callers.get(caller)
+        if stats is None:
+            with self._lock:
+                stats = self._callers.setdefault(caller, CallerStats())
+        return stats
+
+    def _finish(self, stats: CallerStats, started: float, usage=None, failed: bool = False):
+        with self._lock:
+            stats.counters["calls"] += 1
+            stats.counters["errors"] += failed
+            stats.latency_ms.append((time.perf_counter() - started) * 1000)
+            stats.record_usage(usage)
+
+    def _retry(self, stats: CallerStats, limiter: RateLimiter, attempt: int, error: Exception) -> Optional[float]:
+        """Backoff before the next attempt, or None when `error` should propagate."""
+        if attempt >= LLM_MAX_RETRIES or not is_retryable(error):
+            return None
+        with self._lock:
+            stats.counters["retries"] += 1
+        delay = backoff_delay(attempt, retry_after(error))
+        if isinstance(error, APIStatusError) and error.status_code == 429:
+            # Upstream is already over budget: hold back every caller, not just this one
+            limiter.penalize(delay)
+        return delay
+
+    def _send(self, caller: str, kind: str, priority: str, tokens: int, request, started: float):
+        stats, limiter = self._stats(caller), self.limiters[kind]
+        attempt = 0
+        while True:
+            try:
+                limiter.acquire(tokens, priority)
+                return request()
+            except Exception as e:
+                delay = self._retry(stats, limiter, attempt, e)
+                if delay is None:
+                    self._finish(stats, started, failed=True)
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    def _settle(self, kind: str, tokens: int, usage):
+        self.limiters[kind].settle(tokens, getattr(usage, "total_tokens", None))
+
+    def _coalesced(self, caller: str):
+        stats = self._stats(caller)
+        with self._lock:
+            stats.counters["coalesced"] += 1
+
+    # --- sync face ---------------------------------------------------------
+
+    def chat(self, caller: str, *, priority: str = INTERACTIVE, timeout: Optional[float] = None, **kwargs):
+        """
+        chat.completions.create(**kwargs) with pooling, rate limiting, timeout and
+        retries. Identical requests in flight at the same time share one
+        upstream call (see coalesce_key).
+
+        With stream=True, returns an iterator of chunks; only opening the stream
+        is retried, never a stream that already produced output. Streams ask
+        for a final usage chunk (stream_options.include_usage), which has no
+        choices, so the limiter is settled with the real token count.
+        """
+        kwargs.setdefault("model", CHAT_MODEL)
+        if not LLM_COALESCE:
+            return self._chat(caller, priority, timeout, kwargs)
+        if kwargs.get("stream"):
+            return self._chat_stream_coalesced(caller, priority, timeout, kwargs)
+
+        key = coalesce_key(kwargs)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+        if not leader:
+            flight.done.wait()
+            self._coalesced(caller)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = self._chat(caller, priority, timeout, kwargs)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _chat_stream_coalesced(self, caller: str, priority: str, timeout: Optional[float], kwargs: Dict):
+        key = coalesce_key(kwargs)
+
+        def finish():
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = StreamFlight(finish)
+        if not leader:
+            self._coalesced(caller)
+            return flight.reader()
+        try:
+            flight.open(self._chat(caller, priority, timeout, kwargs))
+        except Exception as e:
+            flight.fail(e)
+            raise
+        return flight.reader()
+
+    def _chat(self, caller: str, priority: str, timeout: Optional[float], kwargs: Dict):
+        started = time.perf_counter()
+        if kwargs.get("stream"):
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        tokens = estimate_chat_tokens(kwargs)
+        create = self.client("chat").chat.completions.create
+        response = self._send(caller, "chat", priority, tokens,
+                              lambda: create(timeout=timeout or LLM_CHAT_TIMEOUT, **kwargs), started)
+        if kwargs.get("stream"):
+            return self._track_stream(caller, tokens, response, started)
+        self._settle("chat", tokens, response.usage)
+        self._finish(self._stats(caller), started, response.usage)
+        return response
+
+    def _track_stream(self, caller: str, tokens: int, response, started: float):
+        stats, first, usage, failed = self._stats(caller), True, None, True
+        try:
+            for chunk in response:
+                if first and chunk.choices:
+                    first = False
+                    with self._lock:
+                        stats.first_token_ms.append((time.perf_counter() - started) * 1000)
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+            failed = False
+        finally:
+            self._settle("chat", tokens, usage)
+            self._finish(stats, started, usage, failed)
+
+    def embed(self, caller: str, texts: List[str], model: str = EMBEDDING_MODEL, *,
+              priority: str = INTERACTIVE, timeout: Optional[float] = None) -> List[List[float]]:
+        """Embeddings of `texts`, in input order."""
+        started = time.perf_counter()
+        tokens = estimate_tokens(texts)
+        create = self.client("embedding").embeddings.create
+        response = self._send(caller, "embedding", priority, tokens,
+                              lambda: create(model=model, input=texts, timeout=timeout or LLM_EMBEDDING_TIMEOUT),
+                              started)
+        self._settle("embedding", tokens, response.usage)
+        self._finish(self._stats(caller), started, response.usage)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            callers = {name: stats.snapshot() for name, stats in sorted(self._callers.items())}
+        return {
+            "max_connections": LLM_MAX_CONNECTIONS,
+            "max_keepalive": LLM_MAX_KEEPALIVE,
+            "max_retries": LLM_MAX_RETRIES,
+            "coalesce": LLM_COALESCE,
+            "in_flight": len(self._flights),
+            "limiters": {kind: limiter.stats() for kind, limiter in self.limiters.items()},
+            "callers": callers,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+            self._clients.clear()
+            self._http_client = None
+
+
+# Khởi tạo instance global
+llm_gateway = LLMGateway()
@@ -1,13 +1,16 @@
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
-from openai import OpenAI
+from llm_gateway import llm_gateway
+from rate_limiter import BATCH, INTERACTIVE, RateLimited
+from roadmap_cache import roadmap_cache, roadmap_key, data_version
+
+# Các mức kinh nghiệm trên form tạo lộ trình (frontend RoadmapGenerator)
+EXPERIENCE_LEVELS = ["fresher", "junior", "senior"]
+# Số lộ trình được tạo song song khi pre-generate
+ROADMAP_PREGENERATE_WORKERS = int(os.environ.get("ROADMAP_PREGENERATE_WORKERS", "4"))
 
-# Khởi tạo OpenAI client
-client = OpenAI(
-    base_url="https://aiportalapi.stu-platform.live/jpe",
-    api_key="sk-xvI5gYSbiDQ3c4blptwn0A"
-)
 
 class PersonalizedRoadmap:
     def __init__(self):
@@ -161,30 +164,46 @@ class PersonalizedRoadmap:
         """Lấy danh sách các vị trí có sẵn"""
         return list(self.data["positions"].keys())
     
-    def get_roadmap_for_position(self, position: str) -> Optional[Dict]:
-        """Lấy lộ trình cho vị trí cụ thể"""
+    def resolve_position(self, position: str) -> Optional[str]:
+        """Tìm key của vị trí (chính xác, rồi gần đúng theo key hoặc tên)"""
         position_lower = position.lower()
         
         # Tìm kiếm chính xác
         if position_lower in self.data["positions"]:
-            return self.data["positions"][position_lower]
+            return position_lower
         
         # Tìm kiếm gần đúng
         for pos_key, pos_data in self.data["positions"].items():
             if position_lower in pos_key or pos_key in position_lower:
-                return pos_data
+                return pos_key
             if position_lower in pos_data["name"].lower():
-                return pos_data
+                return pos_key
         
         return None
     
+    def get_roadmap_for_position(self, position: str) -> Optional[Dict]:
+        """Lấy lộ trình cho vị trí cụ thể"""
+        position_key = self.resolve_position(position)
+        return self.data["positions"][position_key] if position_key else None
+    
+    def data_version(self, position_key: str) -> str:
+        """Phiên bản dữ liệu mà lộ trình của vị trí được tạo từ đó"""
+        return data_version(self.data["positions"][position_key], self.data["general_onboarding"])
+    
     def generate_personalized_roadmap(self, position: str, experience_level: str = "fresher", 
-                                    specific_interests: List[str] = None) -> str:
+                                    specific_interests: List[str] = None, priority: str = INTERACTIVE) -> str:
         """Tạo lộ trình cá nhân hóa dựa trên vị trí và yêu cầu cụ thể"""
         
-        roadmap_data = self.get_roadmap_for_position(position)
-        if not roadmap_data:
-            return self.generate_custom_roadmap(position, experience_level, specific_interests)
+        position_key = self.resolve_position(position)
+        if not position_key:
+            return self.generate_custom_roadmap(position, experience_level, specific_interests, priority)
+        roadmap_data = self.data["positions"][position_key]
+        
+        # Lộ trình đã tạo cho cùng vị trí, level, sở thích và phiên bản dữ liệu
+        cache_key = roadmap_key(position_key, experience_level, specific_interests, self.data_version(position_key))
+        cached = roadmap_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         # Chuẩn bị context cho AI
         context = f"""
@@ -229,20 +248,32 @@ Trả lời bằng tiếng Việt, format rõ ràng và dễ đọc.
 """
         
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat(
+                "roadmap.generate_personalized_roadmap",
+                priority=priority,
                 model="GPT-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=1500,
                 temperature=0.7
             )
-            return response.choices[0].message.content
+            roadmap = response.choices[0].message.content
+            if roadmap:
+                roadmap_cache.put(cache_key, roadmap, position_key)
+            return roadmap
+        except RateLimited:
+            raise
         except Exception as e:
             return f"❌ Lỗi khi tạo lộ trình: {e}"
     
     def generate_custom_roadmap(self, position: str, experience_level: str, 
-                              specific_interests: List[str] = None) -> str:
+                              specific_interests: List[str] = None, priority: str = INTERACTIVE) -> str:
         """Tạo lộ trình cho vị trí không có sẵn trong database"""
         
+        cache_key = roadmap_key(position, experience_level, specific_interests, "custom")
+        cached = roadmap_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         interests_text = f"Sở thích: {', '.join(specific_interests)}" if specific_interests else ""
         
         prompt = f"""
@@ -271,13 +302,20 @@ Trả lời bằng tiếng Việt, format rõ ràng và thực tế.
 """
         
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat(
+                "roadmap.generate_custom_roadmap",
+                priority=priority,
                 model="GPT-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=1500,
                 temperature=0.7
             )
-            return response.choices[0].message.content
+            roadmap = response.choices[0].message.content
+            if roadmap:
+                roadmap_cache.put(cache_key, roadmap, position)
+            return roadmap
+        except RateLimited:
+            raise
         except Exception as e:
             return f"❌ Lỗi khi tạo lộ trình tùy chỉnh: {e}"
     
@@ -285,15 +323,35 @@ Trả lời bằng tiếng Việt, format rõ ràng và thực tế.
         """Thêm vị trí mới vào database"""
         self.data["positions"][position_key.lower()] = position_data
         self.save_data()
+        # Lộ trình cũ của key này (hoặc lộ trình tùy chỉnh cùng tên) không còn đúng
+        roadmap_cache.invalidate(position_key.lower())
     
     def update_position(self, position_key: str, position_data: Dict):
         """Cập nhật thông tin vị trí"""
         if position_key.lower() in self.data["positions"]:
             self.data["positions"][position_key.lower()].update(position_data)
             self.save_data()
+            roadmap_cache.invalidate(position_key.lower())
             return True
         return False
     
+    def pregenerate(self, experience_levels: List[str] = EXPERIENCE_LEVELS,
+                    workers: int = ROADMAP_PREGENERATE_WORKERS) -> int:
+        """
+        Tạo sẵn lộ trình (không kèm sở thích) cho mọi vị trí x mức kinh nghiệm,
+        ở mức ưu tiên batch; tổ hợp đã có trong cache được bỏ qua.
+        Trả về số lộ trình đã tạo thành công.
+        """
+        combos = [(position_key, level) for position_key in self.get_available_positions()
+                  for level in experience_levels
+                  if roadmap_cache.get(roadmap_key(position_key, level, None, self.data_version(position_key))) is None]
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="roadmap-pregen") as executor:
+            roadmaps = list(executor.map(
+                lambda combo: self.generate_personalized_roadmap(*combo, priority=BATCH), combos))
+        generated = sum(bool(roadmap) and not roadmap.startswith("❌") for roadmap in roadmaps)
+        print(f"✅ Pre-generated {generated}/{len(combos)} roadmaps")
+        return generated
+    
     def get_learning_suggestions(self, position: str, completed_items: List[str] = None) -> str:
         """Đưa ra gợi ý học tập tiếp theo dựa trên tiến độ hiện tại"""
         
@@ -324,16 +382,21 @@ Trả lời bằng tiếng Việt.
 """
         
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat(
+                "roadmap.get_learning_suggestions",
                 model="GPT-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=800,
                 temperature=0.7
             )
             return response.choices[0].message.content
+        except RateLimited:
+            raise
         except Exception as e:
             return f"❌ Lỗi khi tạo gợi ý: {e}"
 
 # Khởi tạo instance global
 roadmap_manager = PersonalizedRoadmap()
 
+if __name__ == "__main__":
+    roadmap_manager.pregenerate()
@@ -0,0 +1,236 @@
+import heapq
+import itertools
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+from file_lock import FileLock
+from inference_executor import LATENCY_WINDOW, percentile
+
+# Priority classes, most urgent first
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+
+# Share of each bucket batch work may not dip into, kept for interactive requests
+LLM_BATCH_RESERVE = float(os.environ.get("LLM_BATCH_RESERVE", "0.2"))
+# Longest an interactive request waits for budget before it is rejected (batch work waits indefinitely)
+LLM_INTERACTIVE_MAX_WAIT = float(os.environ.get("LLM_INTERACTIVE_MAX_WAIT", "20"))
+# Rough size of a token of Vietnamese/English text, used to estimate a request before it is sent
+CHARS_PER_TOKEN = 3
+# Bucket levels shared by every process on the host (gunicorn workers, the ingestion script);
+# empty = each process has its own full budget
+LLM_RATE_LIMIT_DIR = os.environ.get("LLM_RATE_LIMIT_DIR", "./database/llm_rate_limits")
+
+
+def estimate_tokens(texts, max_tokens: int = 0) -> int:
+    """Upper-ish estimate of the tokens a request will use: its text plus the completion budget."""
+    return sum(len(text) for text in texts) // CHARS_PER_TOKEN + len(texts) * 4 + (max_tokens or 0)
+
+
+class RateLimited(RuntimeError):
+    """Raised when an interactive request cannot get budget in time; callers should answer 503."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    def retry_after_header(self) -> str:
+        """Retry-After value in whole seconds (at least 1)."""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """Continuously refilled bucket holding at most one minute of budget (wall-clock times)."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.time()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until the bucket holds `amount` (capped at capacity, so a huge request still passes)."""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+
+class SharedBudget:
+    """
+    Bucket levels of one RateLimiter in a small mmap'ed file, read and written
+    under an fcntl lock, so every process using the same directory draws from
+    one budget. A zero-filled (new) file means "not written yet": the first
+    process stores its own full buckets.
+    """
+
+    # written flag, requests level and refill time, tokens level and refill time, blocked_until
+    LAYOUT = struct.Struct("<6d")
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with FileLock(path + ".lock"):
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < self.LAYOUT.size:
+                    os.ftruncate(fd, self.LAYOUT.size)
+                self._map = mmap.mmap(fd, self.LAYOUT.size)
+            finally:
+                os.close(fd)
+
+    def _load(self, limiter: "RateLimiter"):
+        written, *state, blocked_until = self.LAYOUT.unpack_from(self._map)
+        if not written:
+            return
+        for bucket, (level, updated) in zip((limiter.requests, limiter.tokens), (state[:2], state[2:])):
+            if bucket is not None:
+                bucket.level, bucket.updated = min(bucket.capacity, level), updated
+        limiter._blocked_until = blocked_until
+
+    def _save(self, limiter: "RateLimiter"):
+        state = []
+        for bucket in (limiter.requests, limiter.tokens):
+            state += [bucket.level, bucket.updated] if bucket is not None else [0.0, 0.0]
+        self.LAYOUT.pack_into(self._map, 0, 1.0, *state, limiter._blocked_until)
+
+    @contextmanager
+    def synced(self, limiter: "RateLimiter"):
+        """Load the shared levels into `limiter`, run the block, store them back."""
+        with FileLock(self.path + ".lock"):
+            self._load(limiter)
+            yield
+            self._save(limiter)
+
+
+class RateLimiter:
+    """
+    Client-side requests/min and tokens/min budget for one upstream endpoint.
+
+    Waiting requests are served strictly by priority class, FIFO within a
+    class, and batch requests never take the last LLM_BATCH_RESERVE of a
+    bucket, so a burst of ingestion leaves room for chat. Tokens are
+    estimated when a request is admitted and corrected with the real usage
+    afterwards (settle); a 429 from upstream pauses the limiter (penalize).
+    A limit of 0 disables that bucket.
+
+    With `shared_dir` set, the bucket levels live in `shared_dir/<name>.budget`
+    (see SharedBudget): all processes on the host share one budget, and
+    ingestion's batch requests stay out of the reserve whichever process the
+    interactive requests come from. The priority queue of waiting requests is
+    still per process.
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int, batch_reserve: float = LLM_BATCH_RESERVE,
+                 interactive_max_wait: float = LLM_INTERACTIVE_MAX_WAIT, shared_dir: str = LLM_RATE_LIMIT_DIR):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.batch_reserve = batch_reserve
+        self.interactive_max_wait = interactive_max_wait
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._blocked_until = 0.0
+        self._shared = (SharedBudget(os.path.join(shared_dir, f"{name}.budget"))
+                        if shared_dir and self.enabled else None)
+        self.counters = {"granted": 0, "rejected": 0, "throttled": 0}
+        self.wait_ms = {priority: deque(maxlen=LATENCY_WINDOW) for priority in PRIORITIES}
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _synced(self):
+        return self._shared.synced(self) if self._shared is not None else nullcontext()
+
+    def _delay(self, tokens: int, priority: str, now: float) -> float:
+        """Seconds until a request of `tokens` in `priority` fits the budget (0 = now)."""
+        delay = max(0.0, self._blocked_until - now)
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is None:
+                continue
+            bucket.refill(now)
+            reserve = bucket.capacity * self.batch_reserve if priority == BATCH else 0.0
+            delay = max(delay, bucket.time_until(amount + reserve))
+        return delay
+
+    def acquire(self, tokens: int, priority: str = INTERACTIVE) -> float:
+        """Block until the request may be sent; returns the seconds waited."""
+        if not self.enabled:
+            return 0.0
+        started = time.monotonic()
+        deadline = started + self.interactive_max_wait if priority == INTERACTIVE else None
+        ticket = (PRIORITIES[priority], next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    delay = None
+                    # Only the most urgent waiter may take budget; the others sleep until it has
+                    if self._waiters[0] == ticket:
+                        with self._synced():
+                            delay = self._delay(tokens, priority, time.time())
+                            if delay == 0.0:
+                                if self.requests is not None:
+                                    self.requests.level -= 1
+                                if self.tokens is not None:
+                                    self.tokens.level -= tokens
+                    now = time.monotonic()
+                    if delay == 0.0:
+                        self.counters["granted"] += 1
+                        self.wait_ms[priority].append((now - started) * 1000)
+                        return now - started
+                    if deadline is not None and now + (delay or 0.0) > deadline:
+                        self.counters["rejected"] += 1
+                        raise RateLimited(f"{self.name} rate limit: no budget within {self.interactive_max_wait:g}s",
+                                          retry_after=delay or self.interactive_max_wait)
+                    timeouts = [t for t in (delay, deadline and deadline - now) if t is not None]
+                    self._cond.wait(min(timeouts) if timeouts else None)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def settle(self, estimated: int, used: Optional[int]):
+        """Return (or charge) the difference between a request's estimate and its real token usage."""
+        if self.tokens is None or used is None:
+            return
+        with self._cond:
+            with self._synced():
+                self.tokens.refill(time.time())
+                self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated - used)
+            self._cond.notify_all()
+
+    def penalize(self, seconds: float):
+        """Upstream answered 429: admit nothing for `seconds`."""
+        with self._cond:
+            with self._synced():
+                self._blocked_until = max(self._blocked_until, time.time() + seconds)
+            self.counters["throttled"] += 1
+
+    def stats(self) -> Dict:
+        with self._cond, self._synced():
+            now = time.time()
+            result = {**self.counters, "enabled": self.enabled, "shared": self._shared is not None,
+                      "waiting": {priority: sum(1 for rank, _ in self._waiters if rank == PRIORITIES[priority])
+                                  for priority in PRIORITIES}}
+            for label, bucket in (("rpm", self.requests), ("tpm", self.tokens)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    result[label] = int(bucket.capacity)
+                    result[f"{label}_available"] = int(bucket.level)
+            for priority, samples in self.wait_ms.items():
+                samples = list(samples)
+                result[f"{priority}_wait_ms_p50"] = round(percentile(samples, 0.5), 2)
+                result[f"{priority}_wait_ms_p99"] = round(percentile(samples, 0.99), 2)
+            return result
@@ -0,0 +1,77 @@
+import hashlib
+import json
+from typing import Dict, Optional
+
+from answer_format import clean_answer_text, iter_answer_events, to_answer_text
+
+# Clients must revalidate, but an unchanged answer costs them only a 304
+CANNED_CACHE_CONTROL = "no-cache"
+
+
+class RenderedResponse:
+    """A canned answer in its final wire formats, rendered once."""
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = clean_answer_text(to_answer_text(text))
+        # Body of POST /api/chatbot
+        self.json_body = json.dumps({"response": self.text}, ensure_ascii=False).encode("utf-8")
+        # Body of POST /api/chatbot/stream: the whole answer as one delta, then `done`
+        self.sse_body = "".join(iter_answer_events([text])).encode("utf-8")
+        self.etag = '"' + hashlib.sha1(self.json_body).hexdigest()[:20] + '"'
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "ETag": self.etag,
+            "Cache-Control": CANNED_CACHE_CONTROL,
+            "Content-Location": f"/api/chatbot/responses/{self.name}",
+        }
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header value covers this response (weak comparison)."""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return any(tag.removeprefix("W/") == self.etag for tag in tags)
+
+
+class ResponseRegistry:
+    """
+    Canned chatbot answers (help, command instructions) keyed by intent name,
+    pre-rendered at startup so the servers return them without cleaning or
+    encoding anything per request.
+    """
+
+    def __init__(self):
+        self._responses: Dict[str, RenderedResponse] = {}
+        self.counters = {"hits": 0, "not_modified": 0}
+
+    def register(self, name: str, text: str) -> RenderedResponse:
+        rendered = RenderedResponse(name, text)
+        self._responses[name] = rendered
+        return rendered
+
+    def get(self, name: Optional[str]) -> Optional[RenderedResponse]:
+        rendered = self._responses.get(name) if name else None
+        if rendered is not None:
+            self.counters["hits"] += 1
+        return rendered
+
+    def not_modified(self, rendered: RenderedResponse, if_none_match: Optional[str]) -> bool:
+        if rendered.matches(if_none_match):
+            self.counters["not_modified"] += 1
+            return True
+        return False
+
+    def stats(self) -> Dict:
+        return {
+            "responses": len(self._responses),
+            "bytes": sum(len(r.json_body) + len(r.sse_body) for r in self._responses.values()),
+            **self.counters,
+        }
+
+
+# Khởi tạo instance global
+response_registry = ResponseRegistry()
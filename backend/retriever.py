@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from collection_version import read_collection_version
+
+# numpy: in-memory matrix loaded from qa_collection (default); chroma: query Chroma directly
+RETRIEVER_BACKEND = os.environ.get("RETRIEVER_BACKEND", "numpy").strip().lower()
+# How often (seconds) the numpy retriever checks whether qa_collection was re-ingested
+RETRIEVER_RELOAD_INTERVAL = float(os.environ.get("RETRIEVER_RELOAD_INTERVAL", "2"))
+# Rows fetched per collection.get call when loading the matrix
+LOAD_PAGE_SIZE = 5000
+
+
+def empty_results(queries: int = 1) -> Dict:
+    return {key: [[] for _ in range(queries)] for key in ("documents", "metadatas", "distances")}
+
+
+def collection_metric(collection) -> str:
+    """Distance function of a Chroma collection ("l2" unless set at creation)."""
+    return (collection.metadata or {}).get("hnsw:space", "l2")
+
+
+def similarity_from_distance(distance: float, metric: str) -> float:
+    """
+    Cosine similarity from a Chroma distance, for unit-length embeddings.
+    cosine: d = 1 - cos; ip: d = 1 - dot = 1 - cos; l2 (squared): d = 2 - 2cos.
+    """
+    if metric == "l2":
+        return 1 - distance / 2
+    return 1 - distance
+
+
+def filter_by_similarity(results: Dict, threshold: float, metric: str) -> Dict:
+    """Keep the results whose cosine similarity is at least `threshold`."""
+    filtered = empty_results()
+    for document, metadata, distance in zip(results["documents"][0], results["metadatas"][0],
+                                            results["distances"][0]):
+        if similarity_from_distance(distance, metric) >= threshold:
+            filtered["documents"][0].append(document)
+            filtered["metadatas"][0].append(metadata)
+            filtered["distances"][0].append(distance)
+    return filtered
+
+
+class ChromaRetriever:
+    """Top-k straight from the Chroma collection (one count + one query per call)."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.metric = collection_metric(collection)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def query(self, embedding, top_k: int) -> Dict:
+        return self.query_many([embedding], top_k)
+
+    def query_many(self, embeddings, top_k: int) -> Dict:
+        """One Chroma query for several vectors; result lists are per query vector."""
+        count = self.collection.count()
+        if count == 0:
+            return empty_results(len(embeddings))
+        return self.collection.query(
+            query_embeddings=list(embeddings),
+            n_results=min(top_k, count),
+            include=["documents", "metadatas", "distances"]
+        )
+
+    def stats(self) -> Dict:
+        return {"backend": "chroma", "metric": self.metric, "rows": self.count()}
+
+
+class NumpyRetriever:
+    """
+    Exact cosine top-k over an in-memory copy of qa_collection.
+
+    The embeddings are kept as one contiguous float32 matrix of unit vectors,
+    so a query is a single matrix-vector product plus `argpartition`. Chroma
+    stays the durable store: the matrix is reloaded from it whenever the
+    collection version changes (see collection_version.py).
+    """
+
+    # Distances are always computed here as cosine, whatever the collection's metadata says
+    metric = "cosine"
+
+    def __init__(self, collection, reload_interval: float = RETRIEVER_RELOAD_INTERVAL):
+        self.collection = collection
+        self.reload_interval = reload_interval
+        # _reload_lock serializes rebuilds; _state_lock guards the check schedule below
+        self._reload_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._checked_at = 0.0
+        self._checking = False
+        self._version = None
+        # Swapped as one tuple so queries never see a half-built index
+        self._index = (np.zeros((0, 0), dtype=np.float32), [], [])
+        self.counters = {"queries": 0, "reloads": 0}
+        self.reload()
+
+    def _fetch(self):
+        documents: List[str] = []
+        metadatas: List[Dict] = []
+        vectors = []
+        offset = 0
+        while True:
+            page = self.collection.get(include=["embeddings", "documents", "metadatas"],
+                                       limit=LOAD_PAGE_SIZE, offset=offset)
+            if not len(page["ids"]):
+                break
+            vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+            offset += len(page["ids"])
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32), [], []
+        matrix = np.ascontiguousarray(np.concatenate(vectors))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return matrix, documents, metadatas
+
+    def reload(self):
+        """Rebuild the matrix from Chroma (also called automatically on version change)."""
+        with self._reload_lock:
+            version = read_collection_version()
+            started = time.perf_counter()
+            self._index = self._fetch()
+            self._version = version
+            with self._state_lock:
+                self._checked_at = time.monotonic()
+            self.counters["reloads"] += 1
+            print(f"✅ Retriever loaded {len(self._index[1])} rows in {time.perf_counter() - started:.2f}s")
+
+    def _maybe_reload(self):
+        """
+        Every `reload_interval` seconds, start a background check of the
+        collection version; queries keep using the current index until a
+        rebuilt one is swapped in.
+        """
+        with self._state_lock:
+            now = time.monotonic()
+            if self._checking or now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            self._checking = True
+        threading.Thread(target=self._check_version, name="retriever-reload", daemon=True).start()
+
+    def _check_version(self):
+        try:
+            if read_collection_version() != self._version:
+                self.reload()
+        except Exception as e:
+            print(f"❌ Retriever reload failed, keeping the previous index: {e}")
+        finally:
+            with self._state_lock:
+                self._checking = False
+
+    def count(self) -> int:
+        self._maybe_reload()
+        return len(self._index[1])
+
+    def query(self, embedding, top_k: int) -> Dict:
+        return self.query_many([embedding], top_k)
+
+    def query_many(self, embeddings, top_k: int) -> Dict:
+        """
+        Top-k for several query vectors with one matrix product; result lists
+        are per query vector, as with a multi-vector Chroma query.
+        """
+        self._maybe_reload()
+        matrix, documents, metadatas = self._index
+        self.counters["queries"] += len(embeddings)
+        if not documents:
+            return empty_results(len(embeddings))
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        similarities = queries @ matrix.T
+        k = min(top_k, len(documents))
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        results = empty_results(0)
+        for row, candidates in zip(similarities, top):
+            candidates = candidates[np.argsort(-row[candidates])]
+            results["documents"].append([documents[i] for i in candidates])
+            results["metadatas"].append([metadatas[i] for i in candidates])
+            # Cosine distance, the same scale Chroma reports for an "hnsw:space: cosine" collection
+            results["distances"].append([float(1 - row[i]) for i in candidates])
+        return results
+
+    def stats(self) -> Dict:
+        matrix, documents, _ = self._index
+        return {
+            "backend": "numpy",
+            "metric": self.metric,
+            "rows": len(documents),
+            "dimensions": matrix.shape[1] if documents else 0,
+            "matrix_mb": round(matrix.nbytes / (1024 * 1024), 2),
+            **self.counters,
+        }
+
+
+def create_retriever(collection, backend: str = RETRIEVER_BACKEND):
+    if backend == "chroma":
+        return ChromaRetriever(collection)
+    if backend == "numpy":
+        return NumpyRetriever(collection)
+    raise ValueError(f"Unknown RETRIEVER_BACKEND '{backend}', expected numpy or chroma")
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from file_lock import FileLock
+from text_normalization import fold, normalize_text
+
+ROADMAP_CACHE_FILE = os.environ.get("ROADMAP_CACHE_FILE", "./database/roadmap_cache.json")
+ROADMAP_CACHE_MAX_ENTRIES = int(os.environ.get("ROADMAP_CACHE_MAX_ENTRIES", "1000"))
+# Bump when the roadmap prompts change, so roadmaps written from the old prompt are not served
+ROADMAP_PROMPT_VERSION = 1
+
+
+def normalize_term(text: str) -> str:
+    """Key form of a free-text field: "  Fresher " and "fresher" (or "Kiểm thử"/"kiem thu") are one key."""
+    return fold(normalize_text(text or ""))
+
+
+def data_version(*parts) -> str:
+    """Content hash of the roadmap data a roadmap was generated from."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def roadmap_key(position: str, experience_level: str, interests: Optional[List[str]], version: str) -> str:
+    """Key of a roadmap: normalized position and level, sorted distinct interests, data version."""
+    terms = sorted({normalize_term(interest) for interest in interests or []} - {""})
+    payload = json.dumps([ROADMAP_PROMPT_VERSION, normalize_term(position), normalize_term(experience_level),
+                          terms, version], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class RoadmapCache:
+    """
+    Generated roadmaps, persisted in one JSON file and keyed by roadmap_key.
+
+    The key contains a hash of the position's roadmap data, so editing a
+    position makes its old roadmaps unreachable; invalidate() then deletes
+    them. The file is re-read when another process has rewritten it; writes
+    re-read, modify and replace it under an fcntl lock, so concurrent workers
+    do not drop each other's entries. The oldest entries are dropped beyond
+    `max_entries`.
+    """
+
+    def __init__(self, path: str = ROADMAP_CACHE_FILE, max_entries: int = ROADMAP_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.lock_file = f"{path}.lock"
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._mtime = None
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._refresh()
+
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = OrderedDict(json.load(f))
+            self._mtime = mtime
+        except (OSError, ValueError) as e:
+            print(f"❌ Roadmap cache is unreadable, starting empty: {e}")
+            self._entries = OrderedDict()
+
+    def _save(self):
+        tmp_file = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp_file, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._refresh()
+                entry = self._entries.get(key)
+            self.counters["hits" if entry is not None else "misses"] += 1
+            return entry["roadmap"] if entry is not None else None
+
+    def put(self, key: str, roadmap: str, position: str):
+        with self._lock, FileLock(self.lock_file):
+            self._refresh()
+            self._entries[key] = {"roadmap": roadmap, "position": normalize_term(position),
+                                  "created_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+            self.counters["stores"] += 1
+
+    def invalidate(self, position: str) -> int:
+        """Delete every roadmap of `position`; returns how many were dropped."""
+        position = normalize_term(position)
+        with self._lock, FileLock(self.lock_file):
+            self._refresh()
+            stale = [key for key, entry in self._entries.items() if entry["position"] == position]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self._save()
+                self.counters["invalidations"] += 1
+            return len(stale)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "positions": len({entry["position"] for entry in self._entries.values()}),
+                **self.counters,
+            }
+
+
+# Khởi tạo instance global
+roadmap_cache = RoadmapCache()
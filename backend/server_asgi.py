@@ -0,0 +1,128 @@
+"""
+ASGI server for the API in api_routes.py (the same routes as server.py), served by uvicorn:
+
+    uvicorn server_asgi:app --host 0.0.0.0 --port 5001
+
+The event loop never blocks: each route runs on the executor of its lane.
+Upstream LLM calls use a large I/O thread pool, while CPU-bound work (OCR /
+PDF / DOCX extraction, STT, TTS) runs on small dedicated executors so it
+cannot starve chat traffic.
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from startup import startup_report
+
+with startup_report.measure("import fastapi"):
+    from fastapi import FastAPI, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
+    from starlette.datastructures import UploadFile
+import api_routes
+from api_routes import ApiRequest, Reply, UploadedFile, LLM, DOCUMENT, SPEECH
+from inference_executor import inference_executor
+from llm_gateway import llm_gateway
+from rate_limiter import RateLimited
+
+# Threads waiting on upstream LLM / embedding responses (I/O bound, so many are cheap)
+LLM_WORKERS = int(os.environ.get("ASGI_LLM_WORKERS", "256"))
+# CPU-bound pool
+DOCUMENT_WORKERS = int(os.environ.get("ASGI_DOCUMENT_WORKERS", "2"))
+# Speech threads decode audio and wait on inference_executor, which bounds the forward passes
+SPEECH_WORKERS = int(os.environ.get("ASGI_SPEECH_WORKERS", "16"))
+
+executors = {
+    LLM: ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm"),
+    DOCUMENT: ThreadPoolExecutor(max_workers=DOCUMENT_WORKERS, thread_name_prefix="document"),
+    SPEECH: ThreadPoolExecutor(max_workers=SPEECH_WORKERS, thread_name_prefix="speech"),
+}
+
+FORM_TYPES = ('multipart/form-data', 'application/x-www-form-urlencoded')
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    api_routes.start_background_jobs()
+    startup_report.print_report()
+    yield
+    for executor in executors.values():
+        executor.shutdown(wait=False)
+    inference_executor.shutdown()
+    llm_gateway.close()
+
+
+app = FastAPI(title="Chatbot Onboarding", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+async def run_in(executor, fn, *args):
+    """Chạy hàm đồng bộ trên executor mà không chặn event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, lambda: fn(*args))
+
+
+async def iterate_in(executor, iterator):
+    """Duyệt một generator đồng bộ trên executor, trả về từng phần tử cho event loop"""
+    done = object()
+    while True:
+        item = await run_in(executor, next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+@app.exception_handler(RateLimited)
+async def rate_limited(request: Request, e: RateLimited):
+    """Hết ngân sách gọi LLM (rate limit phía client): báo client thử lại sau"""
+    return JSONResponse({"error": str(e)}, status_code=503, headers={'Retry-After': e.retry_after_header()})
+
+
+async def read_request(request: Request) -> ApiRequest:
+    json_body, form, files = None, {}, {}
+    if request.headers.get('content-type', '').startswith(FORM_TYPES):
+        for name, value in (await request.form()).multi_items():
+            if isinstance(value, UploadFile):
+                if name not in files:
+                    files[name] = UploadedFile(value.filename or '', await value.read())
+            else:
+                form.setdefault(name, value)
+    else:
+        body = await request.body()
+        if body:
+            try:
+                json_body = json.loads(body)
+            except ValueError:
+                pass
+    return ApiRequest(json_body, form, request.query_params, files, request.headers, request.path_params)
+
+
+def to_response(reply: Reply, lane):
+    if reply.stream:
+        executor = executors[reply.lane or lane or LLM]
+        return StreamingResponse(iterate_in(executor, reply.body), status_code=reply.status,
+                                 media_type=reply.media_type, headers=reply.headers)
+    return Response(reply.body, status_code=reply.status, media_type=reply.media_type, headers=reply.headers)
+
+
+def endpoint(route):
+    async def handle(request: Request):
+        api_request = await read_request(request)
+        if route.lane is None:
+            reply = route.handler(api_request)
+        else:
+            reply = await run_in(executors[route.lane], route.handler, api_request)
+        return to_response(reply, route.lane)
+    handle.__doc__ = route.handler.__doc__
+    return handle
+
+
+for route in api_routes.ROUTES:
+    app.add_api_route(route.path, endpoint(route), methods=[route.method], name=route.handler.__name__)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5001)
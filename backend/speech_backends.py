@@ -0,0 +1,89 @@
+import os
+from types import SimpleNamespace
+
+# eager: full-precision PyTorch (default)
+# quantized: PyTorch with int8 dynamic quantization of the Linear layers
+# onnx: ONNX Runtime session over a file written by export_speech_onnx.py
+SPEECH_BACKEND = os.environ.get("SPEECH_BACKEND", "eager").strip().lower()
+SPEECH_ONNX_DIR = os.environ.get("SPEECH_ONNX_DIR", "./database/onnx")
+BACKENDS = ("eager", "quantized", "onnx")
+
+
+def onnx_path(model_name: str, onnx_dir: str = SPEECH_ONNX_DIR) -> str:
+    return os.path.join(onnx_dir, model_name.replace("/", "--") + ".onnx")
+
+
+def quantize_dynamic(model):
+    """int8 weights for every nn.Linear; activations are quantized on the fly."""
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def onnx_session(path: str, threads: int = None):
+    import onnxruntime as ort
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found, run `python export_speech_onnx.py` first")
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+class OnnxCTCModel:
+    """
+    Wav2Vec2ForCTC stand-in backed by ONNX Runtime: same call signature,
+    `.config` and output-length helper as used by stt.transcribe_batch.
+    """
+
+    def __init__(self, model_name: str, path: str, threads: int = None):
+        from transformers import AutoConfig
+        self.config = AutoConfig.from_pretrained(model_name)
+        self.session = onnx_session(path, threads)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, input_values, attention_mask=None):
+        import torch
+        feeds = {"input_values": input_values.numpy()}
+        if attention_mask is not None and "attention_mask" in self.input_names:
+            feeds["attention_mask"] = attention_mask.numpy().astype("int64")
+        logits = self.session.run(["logits"], feeds)[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    def _get_feat_extract_output_lengths(self, input_lengths):
+        # Length of the conv feature encoder output (same formula as transformers)
+        for kernel_size, stride in zip(self.config.conv_kernel, self.config.conv_stride):
+            input_lengths = (input_lengths - kernel_size) // stride + 1
+        return input_lengths
+
+
+class OnnxVitsModel:
+    """VitsModel stand-in backed by ONNX Runtime (input_ids/attention_mask -> waveform)."""
+
+    def __init__(self, path: str, threads: int = None):
+        self.session = onnx_session(path, threads)
+
+    def __call__(self, input_ids, attention_mask=None):
+        import torch
+        feeds = {"input_ids": input_ids.numpy()}
+        if attention_mask is not None:
+            feeds["attention_mask"] = attention_mask.numpy()
+        waveform = self.session.run(["waveform"], feeds)[0]
+        return SimpleNamespace(waveform=torch.from_numpy(waveform))
+
+
+def load_speech_model(model_class, model_name: str, backend: str = SPEECH_BACKEND, threads: int = None):
+    """
+    Load `model_name` with the configured backend. `model_class` is the
+    transformers class used by the eager and quantized backends.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown SPEECH_BACKEND '{backend}', expected one of {', '.join(BACKENDS)}")
+    if backend == "onnx":
+        if model_class.__name__ == "VitsModel":
+            return OnnxVitsModel(onnx_path(model_name), threads)
+        return OnnxCTCModel(model_name, onnx_path(model_name), threads)
+    model = model_class.from_pretrained(model_name)
+    model.eval()
+    if backend == "quantized":
+        model = quantize_dynamic(model)
+    return model
@@ -0,0 +1,87 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def env_flag(name: str, default: bool = True) -> bool:
+    """Đọc cờ bật/tắt từ biến môi trường (0/false/no/off = tắt)"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off", "")
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StartupReport:
+    """
+    Records how long each import / model initialisation step takes and how much
+    it grows peak RSS, so slow cold starts can be attributed to a module.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps: List[Dict] = []
+        self.started_at = time.perf_counter()
+
+    @contextmanager
+    def measure(self, name: str):
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.steps.append({
+                    "step": name,
+                    "seconds": round(time.perf_counter() - started, 3),
+                    "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+                    "thread": threading.current_thread().name,
+                })
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "uptime_seconds": round(time.perf_counter() - self.started_at, 3),
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+                "steps": list(self.steps),
+            }
+
+    def print_report(self):
+        report = self.as_dict()
+        print("⏱️  Startup report")
+        for step in report["steps"]:
+            print(f"   {step['step']:<32} {step['seconds']:>8.3f}s  +{step['peak_rss_growth_mb']:.1f} MB")
+        print(f"   {'peak RSS':<32} {report['peak_rss_mb']:>8.1f} MB")
+
+
+def warm_up(loaders: Dict[str, Callable[[], object]]):
+    """Gọi các hàm load model trên một thread nền để request đầu tiên không phải chờ"""
+    def run():
+        for name, load in loaders.items():
+            try:
+                load()
+            except Exception as e:
+                print(f"❌ Warm-up of {name} failed: {e}")
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+# Khởi tạo instance global
+startup_report = StartupReport()
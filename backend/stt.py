@@ -1,66 +1,307 @@
-import torch
-from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
+import io
 import soundfile as sf
 import subprocess
 import os
-import tempfile
+import threading
+from collections import deque
+from math import gcd
+import numpy as np
 from scipy.signal import resample_poly
+from startup import env_flag, startup_report
+from inference_batcher import MicroBatcher
+from inference_executor import inference_executor, INFERENCE_TORCH_THREADS
+from speech_backends import SPEECH_BACKEND, load_speech_model
 
 MODEL_NAME = "nguyenvulebinh/wav2vec2-base-vietnamese-250h"
+# Chat-only replicas set ENABLE_STT=0 and never import torch
+STT_ENABLED = env_flag("ENABLE_STT")
+SAMPLE_RATE = 16000
+# Concurrent transcriptions are collected for up to STT_MAX_WAIT_MS and run as one batch
+STT_BATCHING = env_flag("STT_BATCHING")
+STT_MAX_BATCH_SIZE = int(os.environ.get("STT_MAX_BATCH_SIZE", "8"))
+STT_MAX_WAIT_MS = float(os.environ.get("STT_MAX_WAIT_MS", "10"))
+# Long recordings are split on silence and transcribed in windows of at most this length,
+# so model memory stays bounded regardless of recording length
+STT_WINDOW_SECONDS = float(os.environ.get("STT_WINDOW_SECONDS", "15"))
+# Windows of one recording in flight at the same time
+STT_SEGMENT_PARALLELISM = int(os.environ.get("STT_SEGMENT_PARALLELISM", "2"))
+# Energy VAD: 30 ms frames; speech is anything louder than the clip's noise floor
+# (10th percentile frame energy) plus VAD_MARGIN_DB, and never below VAD_MIN_DB.
+# In a clip that is mostly speech the 10th percentile is speech too, so the
+# threshold is also capped at VAD_MARGIN_DB below the loudest frame
+VAD_FRAME_MS = 30
+VAD_MIN_SILENCE_MS = 300
+VAD_PADDING_MS = 150
+VAD_MARGIN_DB = float(os.environ.get("VAD_MARGIN_DB", "10"))
+VAD_MIN_DB = float(os.environ.get("VAD_MIN_DB", "-50"))
+# Below this share of voiced frames the VAD is not trusted and the clip is cut into
+# plain windows at its quietest frames instead
+VAD_MIN_COVERAGE = float(os.environ.get("VAD_MIN_COVERAGE", "0.1"))
+# Forward passes run on the "stt" inference lane with this many workers
+STT_WORKERS = int(os.environ.get("STT_WORKERS", "1"))
+# Intra-op threads of the ONNX Runtime session (SPEECH_BACKEND=onnx); torch models use INFERENCE_TORCH_THREADS
+STT_ONNX_THREADS = int(os.environ.get("STT_ONNX_THREADS", str(INFERENCE_TORCH_THREADS)))
 
-try:
-    print("Loading Wav2Vec2 model for Vietnamese...")
-    processor = Wav2Vec2Processor.from_pretrained(MODEL_NAME)
-    model = Wav2Vec2ForCTC.from_pretrained(MODEL_NAME)
-    STT_AVAILABLE = True
-    print("STT model loaded successfully.")
-except Exception as e:
-    print(f"Error loading STT model: {e}")
-    STT_AVAILABLE = False
+# Loaded on first use by load_model()
+torch = None
+processor = None
+model = None
+_load_lock = threading.Lock()
+_load_failed = False
 
 
-def convert_to_wav16k(input_path):
+def load_model():
     """
-    Dùng ffmpeg để convert mọi định dạng audio sang wav 16kHz mono
+    Load the Wav2Vec2 processor and model on first use (thread-safe).
+    Returns True when the STT model is available.
+    """
+    global torch, processor, model, _load_failed
+    if model is not None:
+        return True
+    if not STT_ENABLED or _load_failed:
+        return False
+    with _load_lock:
+        if model is None and not _load_failed:
+            try:
+                print("Loading Wav2Vec2 model for Vietnamese...")
+                with startup_report.measure("stt: import torch/transformers"):
+                    import torch as torch_module
+                    from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
+                with startup_report.measure(f"stt: load model ({SPEECH_BACKEND})"):
+                    loaded_processor = Wav2Vec2Processor.from_pretrained(MODEL_NAME)
+                    loaded_model = load_speech_model(Wav2Vec2ForCTC, MODEL_NAME, threads=STT_ONNX_THREADS)
+                # `model` is assigned last: other threads treat it as the ready flag
+                torch, processor = torch_module, loaded_processor
+                model = loaded_model
+                print("STT model loaded successfully.")
+            except Exception as e:
+                print(f"Error loading STT model: {e}")
+                _load_failed = True
+    return model is not None
+
+
+def is_available():
+    return load_model()
+
+
+def decode_with_ffmpeg(data: bytes):
+    """
+    Dùng ffmpeg (qua stdin/stdout, không tạo file tạm) để decode các codec soundfile không đọc được
+    (ví dụ webm/opus từ MediaRecorder) thành float32 16kHz mono
     """
-    tmp_wav = tempfile.NamedTemporaryFile(delete=False, suffix=".wav").name
     cmd = [
-        "ffmpeg", "-y",
-        "-i", input_path,
+        "ffmpeg", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-f", "f32le",       # raw float32
         "-ac", "1",          # mono
-        "-ar", "16000",      # 16kHz
-        tmp_wav
+        "-ar", str(SAMPLE_RATE),
+        "pipe:1"
     ]
-    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    return tmp_wav
+    result = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode audio: {result.stderr.decode('utf-8', errors='ignore').strip()}")
+    return np.frombuffer(result.stdout, dtype=np.float32)
 
 
-def transcribe(audio_path: str) -> str:
-    if not STT_AVAILABLE:
-        return "[STT model not available]"
+def decode_audio(data: bytes):
+    """
+    Decode an uploaded audio payload in memory to a 16kHz mono float32 array.
+    """
+    try:
+        speech, sample_rate = sf.read(io.BytesIO(data), dtype="float32")
+    except RuntimeError:
+        return decode_with_ffmpeg(data)
 
-    # Chuyển audio sang WAV 16kHz mono
-    wav_path = convert_to_wav16k(audio_path)
+    if speech.ndim > 1:
+        speech = speech.mean(axis=1)
+    # Resample trong tiến trình nếu không phải 16kHz
+    if sample_rate != SAMPLE_RATE:
+        factor = gcd(SAMPLE_RATE, sample_rate)
+        speech = resample_poly(speech, SAMPLE_RATE // factor, sample_rate // factor)
+    return speech.astype(np.float32, copy=False)
 
-    # Đọc file wav
-    speech, sample_rate = sf.read(wav_path)
 
-    # Nếu không phải 16kHz (trường hợp ffmpeg lỗi), resample lại
-    if sample_rate != 16000:
-        speech = resample_poly(speech, 16000, sample_rate)
-        sample_rate = 16000
+def load_audio(audio_path: str):
+    """
+    Decode any audio file to a 16kHz mono float array.
+    """
+    with open(audio_path, "rb") as f:
+        return decode_audio(f.read())
+
 
+def transcribe_batch(speeches):
+    """
+    Transcribe several 16kHz clips with one forward pass.
+    Clips are zero-padded to the longest one; each transcription is decoded from
+    its own frames only, so padding does not leak into the text.
+    """
     # Xử lý audio
-    input_values = processor(speech, sampling_rate=sample_rate, return_tensors="pt", padding=True).input_values
+    inputs = processor(speeches, sampling_rate=SAMPLE_RATE, return_tensors="pt",
+                       padding=True, return_attention_mask=True)
+    # Base wav2vec2 checkpoints (group norm) expect plain zero padding without a mask
+    model_kwargs = {}
+    if model.config.feat_extract_norm == "layer":
+        model_kwargs["attention_mask"] = inputs.attention_mask
 
     # Suy luận
     with torch.no_grad():
-        logits = model(input_values).logits
+        logits = model(inputs.input_values, **model_kwargs).logits
 
     predicted_ids = torch.argmax(logits, dim=-1)
-    transcription = processor.batch_decode(predicted_ids)[0]
+    frame_counts = model._get_feat_extract_output_lengths(inputs.attention_mask.sum(-1))
+    transcriptions = processor.batch_decode(
+        [ids[:int(n)] for ids, n in zip(predicted_ids, frame_counts)]
+    )
+    return [text.lower() for text in transcriptions]
+
+
+def run_transcribe_batch(speeches):
+    """transcribe_batch on the STT inference lane (bounded concurrency and threads)."""
+    return inference_executor.run("stt", transcribe_batch, speeches)
+
+
+def transcribe_one(speech) -> str:
+    return transcribe_batch([speech])[0]
+
+
+def frame_energies_db(speech, frame):
+    """RMS energy in dBFS of each full frame."""
+    count = len(speech) // frame
+    frames = speech[:count * frame].reshape(count, frame).astype(np.float64)
+    return 20 * np.log10(np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-10)
+
+
+def speech_regions(speech):
+    """
+    Energy-based VAD: return (start_frame, end_frame) runs of speech, with
+    pauses shorter than VAD_MIN_SILENCE_MS kept inside the run.
+    """
+    frame = SAMPLE_RATE * VAD_FRAME_MS // 1000
+    energies = frame_energies_db(speech, frame)
+    if not len(energies):
+        return [], energies
+    threshold = max(min(np.percentile(energies, 10), energies.max() - 2 * VAD_MARGIN_DB) + VAD_MARGIN_DB,
+                    VAD_MIN_DB)
+    voiced = np.flatnonzero(energies > threshold)
+    if not len(voiced):
+        return [], energies
+
+    min_gap = VAD_MIN_SILENCE_MS // VAD_FRAME_MS
+    regions = []
+    start = previous = voiced[0]
+    for index in voiced[1:]:
+        if index - previous > min_gap:
+            regions.append((start, previous + 1))
+            start = index
+        previous = index
+    regions.append((start, previous + 1))
+    return regions, energies
+
+
+def segment_audio(speech, window_seconds=STT_WINDOW_SECONDS):
+    """
+    Split a clip into (start, end) sample ranges of at most `window_seconds`.
+    Cuts fall in silences; consecutive speech runs are packed into one window
+    while they fit, and runs longer than a window are cut at their quietest
+    frame in the second half of the window. Clips that fit in one window are
+    returned whole; clips where the VAD finds less than VAD_MIN_COVERAGE of
+    speech are treated as one long run.
+    """
+    window = int(window_seconds * SAMPLE_RATE)
+    if len(speech) <= window:
+        return [(0, len(speech))]
+
+    frame = SAMPLE_RATE * VAD_FRAME_MS // 1000
+    window_frames = window // frame
+    padding = VAD_PADDING_MS // VAD_FRAME_MS
+    regions, energies = speech_regions(speech)
+    if sum(end - start for start, end in regions) < VAD_MIN_COVERAGE * len(energies):
+        # Nothing (or next to nothing) detected as speech: cut the whole clip into
+        # windows at the quietest frames rather than risk dropping what was said
+        regions, padding = [(0, len(energies))], 0
+
+    windows = []
+    for start, end in regions:
+        start = max(0, start - padding)
+        end = min(len(energies), end + padding)
+        if windows and end - windows[-1][0] <= window_frames:
+            # Fits in the current window together with the pause before it
+            windows[-1] = (windows[-1][0], max(end, windows[-1][1]))
+            continue
+        if windows:
+            start = max(start, windows[-1][1])
+        while end - start > window_frames:
+            half = start + window_frames // 2
+            cut = half + int(np.argmin(energies[half:start + window_frames]))
+            windows.append((start, cut))
+            start = cut
+        windows.append((start, end))
+    if windows and windows[-1][1] == len(energies):
+        # Keep the samples of the trailing partial frame
+        windows[-1] = (windows[-1][0], len(speech) / frame)
+    return [(int(start * frame), int(min(end * frame, len(speech)))) for start, end in windows]
+
+
+def transcribe_segments(speech):
+    """
+    Transcribe a clip window by window (see segment_audio), yielding
+    {"index", "start", "end", "text"} in order as each window finishes.
+    Up to STT_SEGMENT_PARALLELISM windows are in flight; with batching enabled
+    they share forward passes with other requests.
+    """
+    pending = deque()
+
+    def result(index, start, end, future):
+        return {
+            "index": index,
+            "start": round(start / SAMPLE_RATE, 2),
+            "end": round(end / SAMPLE_RATE, 2),
+            "text": future.result(),
+        }
+
+    for index, (start, end) in enumerate(segment_audio(speech)):
+        piece = speech[start:end]
+        if STT_BATCHING:
+            future = stt_batcher.submit(piece)
+        else:
+            future = inference_executor.lanes["stt"].submit(transcribe_one, piece)
+        pending.append((index, start, end, future))
+        if len(pending) >= max(1, STT_SEGMENT_PARALLELISM):
+            yield result(*pending.popleft())
+    while pending:
+        yield result(*pending.popleft())
+
+
+def transcribe_array(speech) -> str:
+    """Transcribe one 16kHz clip, batched with concurrent requests when enabled."""
+    if not load_model():
+        return "[STT model not available]"
+    if len(speech) > STT_WINDOW_SECONDS * SAMPLE_RATE:
+        texts = [segment["text"] for segment in transcribe_segments(speech)]
+        return " ".join(text for text in texts if text)
+    if STT_BATCHING:
+        return stt_batcher.process(speech)
+    return run_transcribe_batch([speech])[0]
+
+
+def transcribe(audio_path: str) -> str:
+    if not load_model():
+        return "[STT model not available]"
+    return transcribe_array(load_audio(audio_path))
+
+
+def transcribe_bytes(data: bytes) -> str:
+    if not load_model():
+        return "[STT model not available]"
+    return transcribe_array(decode_audio(data))
+
 
-    # Xóa file tạm
-    os.remove(wav_path)
+inference_executor.register("stt", workers=STT_WORKERS)
 
-    return transcription.lower()
+# Gom các request đồng thời thành một batch cho Wav2Vec2ForCTC
+stt_batcher = MicroBatcher(
+    run_transcribe_batch,
+    max_batch_size=STT_MAX_BATCH_SIZE,
+    max_wait_ms=STT_MAX_WAIT_MS,
+    name="stt-batcher"
+)
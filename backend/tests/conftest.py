@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Keep the module-level caches and rate-limit files out of ./database while testing
+_scratch = tempfile.mkdtemp(prefix="backend_tests_")
+for name in ("EMBEDDING_CACHE_DIR", "LLM_RATE_LIMIT_DIR"):
+    os.environ.setdefault(name, os.path.join(_scratch, name.lower()))
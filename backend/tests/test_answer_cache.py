@@ -0,0 +1,61 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from answer_cache import SemanticAnswerCache  # noqa: E402
+from collection_version import bump_collection_version  # noqa: E402
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # COLLECTION_VERSION_FILE is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return SemanticAnswerCache(threshold=0.9, ttl=60, max_entries=10)
+
+
+def test_near_duplicate_question_reuses_the_answer(cache):
+    cache.store("Nghỉ phép mấy ngày?", [1.0, 0.0, 0.0], "12 ngày")
+    assert cache.lookup([0.99, 0.05, 0.0]) == "12 ngày"
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    assert cache.lookup_question("  nghỉ phép   MẤY ngày? ") == "12 ngày"
+
+
+def test_reingestion_drops_every_cached_answer(cache):
+    cache.store("Nghỉ phép mấy ngày?", [1.0, 0.0, 0.0], "12 ngày")
+    cache.store("Giờ làm việc?", None, "8h - 17h")
+    bump_collection_version()
+    assert cache.lookup([1.0, 0.0, 0.0]) is None
+    assert cache.lookup_question("Giờ làm việc?") is None
+    assert cache.stats()["invalidations"] == 1
+    # Answers stored after the bump are served again
+    cache.store("Nghỉ phép mấy ngày?", [1.0, 0.0, 0.0], "14 ngày")
+    assert cache.lookup([1.0, 0.0, 0.0]) == "14 ngày"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_invalidate_clears_both_tiers(cache):
+    cache.store("Nghỉ phép mấy ngày?", [1.0, 0.0, 0.0], "12 ngày")
+    cache.invalidate()
+    assert cache.lookup([1.0, 0.0, 0.0]) is None
+    assert cache.lookup_question("Nghỉ phép mấy ngày?") is None
+    assert cache.stats()["entries"] == cache.stats()["question_entries"] == 0
+
+
+def test_expired_answers_are_not_served(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = SemanticAnswerCache(threshold=0.9, ttl=0)
+    cache.store("Nghỉ phép mấy ngày?", [1.0, 0.0, 0.0], "12 ngày")
+    assert cache.lookup([1.0, 0.0, 0.0]) is None
+    assert cache.lookup_question("Nghỉ phép mấy ngày?") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_embedding_model_change_replaces_old_vectors(cache):
+    cache.store("Nghỉ phép mấy ngày?", [1.0, 0.0, 0.0], "12 ngày")
+    assert cache.lookup([1.0, 0.0]) is None
+    cache.store("Giờ làm việc?", [0.0, 1.0], "8h - 17h")
+    assert cache.stats()["entries"] == 1
+    assert cache.lookup([0.0, 1.0]) == "8h - 17h"
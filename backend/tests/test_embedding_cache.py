@@ -0,0 +1,71 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import EmbeddingCache  # noqa: E402
+
+
+def vector(value, dimensions=4):
+    return [float(value)] * dimensions
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), memory_entries=0)
+    cache.put_many("model", ["một", "hai"], [vector(1), vector(2)])
+
+    reopened = EmbeddingCache(str(tmp_path), memory_entries=0)
+    assert reopened.get("model", "hai") == vector(2)
+    # Keys use the NFC, whitespace-collapsed text
+    assert reopened.get("model", "  hai ") == vector(2)
+    assert reopened.stats()["disk_hits"] == 2
+
+
+def test_ring_overwrites_the_oldest_slot(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=2, memory_entries=0)
+    cache.put_many("model", ["a", "b", "c"], [vector(1), vector(2), vector(3)])
+
+    assert cache.get("model", "a") is None
+    assert cache.get("model", "b") == vector(2)
+    assert cache.get("model", "c") == vector(3)
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["disk_entries"] == 2
+
+
+def test_memory_tier_is_lru(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), memory_entries=2)
+    cache.put_many("model", ["a", "b"], [vector(1), vector(2)])
+    cache.get("model", "a")
+    cache.put("model", "c", vector(3))
+
+    assert cache.stats()["memory_entries"] == 2
+    before = cache.stats()["disk_hits"]
+    cache.get("model", "b")  # evicted from memory, still on disk
+    assert cache.stats()["disk_hits"] == before + 1
+
+
+def test_models_of_different_dimensions_both_persist(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), memory_entries=0)
+    cache.put("fake", "xin chào", vector(1, dimensions=64))
+    cache.put("real", "xin chào", vector(2, dimensions=1536))
+
+    reopened = EmbeddingCache(str(tmp_path), memory_entries=0)
+    assert reopened.get("fake", "xin chào") == vector(1, dimensions=64)
+    assert reopened.get("real", "xin chào") == vector(2, dimensions=1536)
+    assert reopened.stats()["models"] == {"fake": 64, "real": 1536}
+
+
+def test_get_or_embed_only_embeds_distinct_misses(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put("model", "đã có", vector(9))
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [vector(len(text)) for text in texts]
+
+    results = cache.get_or_embed("model", ["đã có", "mới", "mới", "khác"], embed)
+
+    assert calls == [["mới", "khác"]]
+    assert results == [vector(9), vector(3), vector(3), vector(4)]
+    assert cache.stats()["api_calls"] == 1
@@ -0,0 +1,69 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_router import RAG_INTENT, IntentRouter  # noqa: E402
+
+POSITIONS = {"developer": "Lập trình viên", "hr": "Nhân sự"}
+
+
+def make_router():
+    router = IntentRouter()
+    router.set_positions(POSITIONS)
+    return router
+
+
+def test_words_differing_only_in_accents_do_not_collide():
+    router = make_router()
+    # "họ sợ" (they fear) folds to the same letters as the "hồ sơ" (profile) keyword
+    assert router.match_keywords("Nếu họ sợ đi muộn thì báo cho ai?")["intent"] == RAG_INTENT
+    assert router.match_keywords("Trích xuất hồ sơ của tôi")["intent"] == "extraction"
+
+
+def test_questions_typed_without_accents_fall_back_to_folded_keywords():
+    router = make_router()
+    assert router.match_keywords("tao lo trinh onboarding")["intent"] == "roadmap_help"
+    assert router.match_keywords("tro giup toi voi")["intent"] == "help"
+    # Mixed input: the accented keyword matches as typed, the bare ones through the fallback
+    result = router.match_keywords("Tạo lo trinh cho lap trinh vien")
+    assert result["intent"] == "roadmap"
+    assert result["position"] == "developer"
+
+
+def test_roadmap_takes_the_first_position_mentioned():
+    result = make_router().match_keywords("Tạo lộ trình cho Nhân sự và developer")
+    assert result == {"intent": "roadmap", "confidence": result["confidence"],
+                      "source": "keywords", "position": "hr"}
+
+
+def test_confidence_is_the_share_of_words_covered():
+    router = make_router()
+    assert router.match_keywords("HƯỚNG DẪN")["confidence"] == 1.0
+    assert router.match_keywords("hướng dẫn xin nghỉ phép")["confidence"] == 0.4
+
+
+def test_keywords_match_on_word_boundaries():
+    # "cv" inside another word is not the extraction keyword
+    assert make_router().match_keywords("Quy trình cvtt là gì?")["intent"] == RAG_INTENT
+
+
+def test_classifier_overrides_a_weak_keyword_match():
+    router = make_router()
+    router.enable_classifier(lambda texts: [[1.0, 0.0] if "nghỉ" in text else [0.0, 1.0] for text in texts],
+                             threshold=0.5)
+    router.classifier.examples = {RAG_INTENT: ["nghỉ phép"], "help": ["trợ giúp"]}
+    result = router.route("hướng dẫn xin nghỉ phép", embed=lambda text: [1.0, 0.0])
+    assert result["intent"] == RAG_INTENT
+    assert result["source"] == "classifier"
+
+
+def test_classifier_failure_keeps_the_keyword_intent():
+    router = make_router()
+    router.enable_classifier(lambda texts: [[1.0, 0.0] for _ in texts])
+
+    def embed(text):
+        raise RuntimeError("embedding API down")
+
+    assert router.route("hướng dẫn xin nghỉ phép", embed=embed)["intent"] == "help"
+    assert router.stats()["classifier_errors"] == 1
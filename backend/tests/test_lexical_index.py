@@ -0,0 +1,111 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import lexical_index  # noqa: E402
+from lexical_index import BM25Index, LexicalIndex, build_lexical_index, reciprocal_rank_fusion, tokenize  # noqa: E402
+
+ROWS = [
+    ("Nghỉ phép năm được bao nhiêu ngày?", "12 ngày", "leave"),
+    ("Công ty đóng bảo hiểm xã hội khi nào?", "Sau thử việc", "insurance"),
+    ("Giờ làm việc thế nào?", "8h - 17h", "hours"),
+    ("Nghỉ phép năm được bao nhiêu ngày", "Mười hai ngày", "leave"),
+]
+CHUNKS = [
+    {"hash": "leave", "text": "Người lao động được nghỉ phép năm 12 ngày."},
+    {"hash": "insurance", "text": "BHXH được đóng từ tháng đầu tiên sau thử việc."},
+    {"hash": "hours", "text": "Giờ làm việc từ 8h đến 17h."},
+]
+
+
+class Collection:
+    """The two fields of a Chroma collection.get() the index is built from."""
+
+    def get(self, include):
+        return {"documents": [question for question, _, _ in ROWS],
+                "metadatas": [{"answer": answer, "chunk_hash": chunk, "is_paraphrase": i == 3}
+                              for i, (_, answer, chunk) in enumerate(ROWS)]}
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / "lexical_index")
+    build_lexical_index(Collection(), CHUNKS, path)
+    return LexicalIndex(path, reload_interval=0)
+
+
+def vector_results(*rows):
+    return {"documents": [[question for question, _ in rows]],
+            "metadatas": [[{"answer": answer} for _, answer in rows]],
+            "distances": [[0.1 * (i + 1) for i in range(len(rows))]]}
+
+
+def test_reciprocal_rank_fusion_favours_keys_ranked_in_several_lists():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60) == ["b", "a", "d", "c"]
+    assert reciprocal_rank_fusion([["a"], []]) == ["a"]
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_tokenize_adds_bigrams_and_accented_terms():
+    assert tokenize("bao hiem") == ["bao", "hiem", "bao hiem"]
+    assert tokenize("Bảo hiểm") == ["bao", "hiem", "bao hiem", "=bảo", "=hiểm", "=bảo hiểm"]
+
+
+def test_accented_query_ranks_the_accented_spelling_first():
+    bm25 = BM25Index.build(["bảo hiểm xã hội", "bao nhiêu ngày phép", "giờ làm việc"])
+    assert bm25.top(tokenize("bao nhiêu"), 3)[0] == 1
+    assert bm25.top(tokenize("bảo hiểm"), 3)[0] == 0
+
+
+def test_weak_hits_below_the_score_ratio_are_dropped():
+    bm25 = BM25Index.build(["bảo hiểm xã hội bắt buộc", "bao nhiêu", "giờ làm việc"])
+    terms = tokenize("bảo hiểm xã hội")
+    assert bm25.top(terms, 3) == [0, 1]
+    assert bm25.top(terms, 3, min_ratio=0.5) == [0]
+    assert bm25.top(tokenize("không có"), 3) == []
+
+
+def test_saved_index_scores_like_the_built_one(tmp_path):
+    texts = [chunk["text"] for chunk in CHUNKS]
+    built = BM25Index.build(texts)
+    built.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    terms = tokenize("nghỉ phép năm")
+    assert loaded.top(terms, 3) == built.top(terms, 3)
+    assert list(loaded.scores(terms)) == pytest.approx(list(built.scores(terms)))
+
+
+def test_fuse_adds_lexical_only_rows_without_a_distance(index):
+    results = vector_results(("Giờ làm việc thế nào?", "8h - 17h"))
+    fused = index.fuse(results, "BHXH đóng khi nào", top_k=3)
+    assert "Công ty đóng bảo hiểm xã hội khi nào?" in fused["documents"][0]
+    distances = dict(zip(fused["documents"][0], fused["distances"][0]))
+    assert distances["Giờ làm việc thế nào?"] == pytest.approx(0.1)
+    assert distances["Công ty đóng bảo hiểm xã hội khi nào?"] is None
+
+
+def test_fuse_puts_rows_found_by_both_retrievers_first(index):
+    results = vector_results(("Giờ làm việc thế nào?", "8h - 17h"),
+                             ("Nghỉ phép năm được bao nhiêu ngày?", "12 ngày"))
+    fused = index.fuse(results, "nghỉ phép năm", top_k=3)
+    assert fused["documents"][0][0] == "Nghỉ phép năm được bao nhiêu ngày?"
+    assert fused["metadatas"][0][0]["answer"] == "12 ngày"
+
+
+def test_fuse_without_an_index_returns_the_vector_results(tmp_path):
+    results = vector_results(("Giờ làm việc thế nào?", "8h - 17h"))
+    assert LexicalIndex(str(tmp_path / "missing"), reload_interval=0).fuse(results, "giờ", 3) is results
+
+
+def test_exact_match_answers_short_phrase_queries(index, monkeypatch):
+    monkeypatch.setattr(lexical_index, "LEXICAL_FAST_PATH", True)
+    monkeypatch.setattr(lexical_index, "LEXICAL_FAST_PATH_MAX_DF", 0.5)
+    results = index.exact_match("bảo hiểm xã hội", top_k=3)
+    assert results["metadatas"][0] == [{"answer": "Sau thử việc", "chunk_hash": "insurance", "is_paraphrase": False}]
+    assert results["distances"][0] == [None]
+    # Words present but not next to each other are not an exact-term query
+    assert index.exact_match("giờ nghỉ", top_k=3) is None
+    assert index.exact_match("một câu hỏi rất dài về nghỉ phép năm", top_k=3) is None
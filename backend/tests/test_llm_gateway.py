@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+pytest.importorskip("httpx")
+pytest.importorskip("openai")
+
+from llm_gateway import LLMGateway  # noqa: E402
+from rate_limiter import INTERACTIVE, RateLimited, RateLimiter  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "Nghỉ phép năm được bao nhiêu ngày?"}]
+
+
+class Completions:
+    """Upstream chat.completions: counts calls, answers after `delay` seconds."""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+
+    def create(self, timeout=None, stream=False, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="12 ngày"))], usage=usage)
+        deltas = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+                  for text in ("12", " ngày")]
+        return iter(deltas + [SimpleNamespace(choices=[], usage=usage)])
+
+
+@pytest.fixture
+def upstream():
+    return Completions()
+
+
+@pytest.fixture
+def gateway(upstream):
+    gateway = LLMGateway()
+    gateway._clients["chat"] = SimpleNamespace(chat=SimpleNamespace(completions=upstream))
+    yield gateway
+    gateway.close()
+
+
+def run_together(count, call):
+    results, errors = [None] * count, [None] * count
+
+    def run(i):
+        try:
+            results[i] = call()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results, errors
+
+
+def test_identical_requests_in_flight_share_one_upstream_call(gateway, upstream):
+    results, errors = run_together(5, lambda: gateway.chat("test", messages=MESSAGES))
+    assert errors == [None] * 5
+    assert upstream.calls == 1
+    assert len({id(result) for result in results}) == 1
+    assert gateway.stats()["callers"]["test"]["coalesced"] == 4
+    assert gateway.stats()["in_flight"] == 0
+
+
+def test_different_requests_are_not_coalesced(gateway, upstream):
+    gateway.chat("test", messages=MESSAGES)
+    gateway.chat("test", messages=MESSAGES, max_tokens=10)
+    assert upstream.calls == 2
+
+
+def test_coalesced_streams_replay_the_same_chunks(gateway, upstream):
+    results, errors = run_together(3, lambda: [chunk.choices[0].delta.content
+                                               for chunk in gateway.chat("test", messages=MESSAGES, stream=True)
+                                               if chunk.choices])
+    assert errors == [None] * 3
+    assert results == [["12", " ngày"]] * 3
+    assert upstream.calls == 1
+    assert gateway.stats()["in_flight"] == 0
+
+
+def test_rate_limited_reaches_the_leader_and_every_coalesced_caller(gateway, upstream):
+    limiter = gateway.limiters["chat"] = RateLimiter("chat", rpm=0, tpm=600, shared_dir="",
+                                                     interactive_max_wait=2)
+    limiter.acquire(600)
+    # An earlier interactive request holds the head of the queue for ~0.5s (5 tokens at 10 tokens/s)
+    blocker = threading.Thread(target=limiter.acquire, args=(5, INTERACTIVE))
+    blocker.start()
+    time.sleep(0.05)
+    limiter.interactive_max_wait = 0.2
+    _, errors = run_together(4, lambda: gateway.chat("test", messages=MESSAGES, max_tokens=1))
+    blocker.join(5)
+    assert all(isinstance(error, RateLimited) for error in errors)
+    assert len({id(error) for error in errors}) == 1
+    assert upstream.calls == 0
+    assert gateway.stats()["in_flight"] == 0
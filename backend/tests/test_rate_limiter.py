@@ -0,0 +1,76 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from rate_limiter import BATCH, INTERACTIVE, RateLimited, RateLimiter  # noqa: E402
+
+
+def token_limiter(tpm, shared_dir="", **options):
+    """A limiter with only a tokens/min bucket (one token per 60 / tpm seconds)."""
+    return RateLimiter("test", rpm=0, tpm=tpm, shared_dir=shared_dir, **options)
+
+
+def test_batch_requests_leave_the_reserve_to_interactive_ones():
+    limiter = token_limiter(600, batch_reserve=0.5, interactive_max_wait=0.05)
+    assert limiter.acquire(300, BATCH) < 0.05
+    # 300 tokens left, all of them reserve: interactive work still goes through at once
+    assert limiter.acquire(100, INTERACTIVE) < 0.05
+    assert limiter.stats()["tpm_available"] == 200
+
+
+def test_batch_request_waits_until_the_bucket_is_above_the_reserve():
+    limiter = token_limiter(600, batch_reserve=0.5)
+    limiter.acquire(300, BATCH)
+    # Needs 301 tokens in the bucket, which refills at 10 tokens/s
+    waited = limiter.acquire(1, BATCH)
+    assert 0.05 <= waited < 1.0
+
+
+def test_interactive_request_is_rejected_when_budget_is_too_far_off():
+    limiter = token_limiter(600, interactive_max_wait=0.1)
+    limiter.acquire(600)
+    with pytest.raises(RateLimited) as raised:
+        limiter.acquire(200)
+    assert raised.value.retry_after == pytest.approx(20, abs=0.5)
+    assert raised.value.retry_after_header() == "20"
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_waiting_interactive_request_goes_ahead_of_an_earlier_batch_one():
+    limiter = token_limiter(120, batch_reserve=0)  # one token every 0.5s
+    limiter.acquire(120)
+    order = []
+
+    def acquire(priority):
+        limiter.acquire(1, priority)
+        order.append(priority)
+
+    batch = threading.Thread(target=acquire, args=(BATCH,))
+    interactive = threading.Thread(target=acquire, args=(INTERACTIVE,))
+    batch.start()
+    time.sleep(0.1)
+    interactive.start()
+    batch.join(5)
+    interactive.join(5)
+    assert order == [INTERACTIVE, BATCH]
+
+
+def test_settle_returns_unused_tokens():
+    limiter = token_limiter(600)
+    limiter.acquire(500)
+    limiter.settle(500, used=100)
+    assert limiter.stats()["tpm_available"] >= 500
+
+
+def test_processes_sharing_a_directory_share_one_budget(tmp_path):
+    first = token_limiter(600, shared_dir=str(tmp_path), interactive_max_wait=0.05)
+    second = token_limiter(600, shared_dir=str(tmp_path), interactive_max_wait=0.05)
+    first.acquire(600)
+    with pytest.raises(RateLimited):
+        second.acquire(100)
+    assert second.stats()["shared"] is True
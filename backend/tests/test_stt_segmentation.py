@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stt import SAMPLE_RATE, STT_WINDOW_SECONDS, segment_audio  # noqa: E402
+
+rng = np.random.default_rng(0)
+
+
+def noise(seconds, level):
+    return (level * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+
+def coverage(speech, windows):
+    return sum(end - start for start, end in windows) / len(speech)
+
+
+def check_windows(speech, windows):
+    assert windows
+    for start, end in windows:
+        assert 0 <= start < end <= len(speech)
+        assert end - start <= STT_WINDOW_SECONDS * SAMPLE_RATE
+    for (_, end), (start, _) in zip(windows, windows[1:]):
+        assert end <= start
+
+
+def test_continuous_speech_is_not_dropped():
+    # 60 s of tone with a slowly varying loudness and pitch: no silence anywhere
+    t = np.arange(60 * SAMPLE_RATE) / SAMPLE_RATE
+    speech = ((0.3 + 0.2 * np.sin(2 * np.pi * 0.7 * t)) *
+              np.sin(2 * np.pi * (200 + 50 * np.sin(2 * np.pi * 0.3 * t)) * t)).astype(np.float32)
+    windows = segment_audio(speech)
+    check_windows(speech, windows)
+    assert coverage(speech, windows) > 0.99
+
+
+def test_mostly_speech_with_short_quiet_gaps():
+    speech = np.concatenate([noise(19, 0.2), noise(1, 0.02)] * 2)
+    windows = segment_audio(speech)
+    check_windows(speech, windows)
+    assert coverage(speech, windows) > 0.9
+
+
+def test_silence_between_utterances_is_skipped():
+    speech = np.concatenate([noise(10, 0.2), noise(10, 0.001), noise(10, 0.2)])
+    windows = segment_audio(speech)
+    check_windows(speech, windows)
+    assert 0.6 < coverage(speech, windows) < 0.8
+
+
+def test_short_clip_is_one_window():
+    speech = noise(5, 0.2)
+    assert segment_audio(speech) == [(0, len(speech))]
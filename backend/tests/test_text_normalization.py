@@ -0,0 +1,36 @@
+import os
+import sys
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.text_normalization import LEGACY_PATTERNS, legacy_no_accent  # noqa: E402
+from text_normalization import fold, normalize_text, strip_accents  # noqa: E402
+
+# Every letter the old StructExtract.no_accent_vietnamese table replaced
+LEGACY_ALPHABET = "".join(pattern.pattern.strip("[]") for pattern, _ in LEGACY_PATTERNS)
+
+
+def test_strip_accents_matches_the_old_table_letter_by_letter():
+    assert len(LEGACY_ALPHABET) == 134
+    for letter in LEGACY_ALPHABET:
+        assert strip_accents(letter) == legacy_no_accent(letter), letter
+
+
+def test_d_with_stroke_maps_like_the_old_table():
+    assert strip_accents("đĐ") == legacy_no_accent("đĐ") == "dD"
+
+
+def test_strip_accents_matches_the_old_table_on_sentences():
+    text = "Điều 5. Người lao động được nghỉ phép năm 12 ngày; ĐƯỢC hưởng nguyên LƯƠNG."
+    assert strip_accents(text) == legacy_no_accent(text) == \
+        "Dieu 5. Nguoi lao dong duoc nghi phep nam 12 ngay; DUOC huong nguyen LUONG."
+    assert strip_accents("Onboarding - HR 101") == "Onboarding - HR 101"
+
+
+def test_decomposed_input_folds_like_composed_input():
+    composed = "Hướng dẫn nghỉ phép"
+    decomposed = unicodedata.normalize("NFD", composed)
+    assert strip_accents(decomposed) == strip_accents(composed) == "Huong dan nghi phep"
+    assert normalize_text(decomposed) == normalize_text(composed)
+    assert fold(decomposed) == "huong dan nghi phep"
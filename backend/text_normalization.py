@@ -0,0 +1,60 @@
+import re
+import unicodedata
+from typing import List
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def _build_fold_table():
+    """
+    str.translate table mapping every accented Latin letter to its base letter.
+
+    Built once from the NFD decomposition of the precomposed letters (Latin-1
+    Supplement through Latin Extended Additional, which holds the Vietnamese
+    vowels), plus đ/Đ, which have no decomposition. Combining marks are
+    dropped, so text that arrives in NFD form folds the same way.
+    """
+    table = {ord("đ"): "d", ord("Đ"): "D"}
+    for code in range(0x00C0, 0x1F00):
+        base = unicodedata.normalize("NFD", chr(code))[0]
+        if base != chr(code) and base.isascii() and base.isalpha():
+            table[code] = base
+    for code in range(0x0300, 0x0370):
+        table[code] = None
+    return table
+
+
+FOLD_TABLE = _build_fold_table()
+
+
+def nfc(text: str) -> str:
+    """NFC form of `text` (the composed form .docx text and typed queries normally use)."""
+    return unicodedata.normalize("NFC", text)
+
+
+def normalize_text(text: str) -> str:
+    """NFC-normalize and collapse whitespace so trivially different strings share a key."""
+    return WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def strip_accents(text: str) -> str:
+    """Remove Vietnamese accents in one pass ("Nghỉ phép" -> "Nghi phep")."""
+    # isascii() is a flag check on the string object, no scan
+    return text if text.isascii() else text.translate(FOLD_TABLE)
+
+
+def fold(text: str) -> str:
+    """Lowercase, accent-free form for matching ("Nghỉ PHÉP năm" -> "nghi phep nam")."""
+    return strip_accents(text).lower()
+
+
+def strip_accents_many(texts: List[str]) -> List[str]:
+    return [strip_accents(text) for text in texts]
+
+
+def fold_many(texts: List[str]) -> List[str]:
+    return [fold(text) for text in texts]
+
+
+def normalize_many(texts: List[str]) -> List[str]:
+    return [normalize_text(text) for text in texts]
@@ -1,23 +1,86 @@
 import io
+import os
+import queue
+import re
+import struct
+import threading
 import numpy as np
+from startup import env_flag, startup_report
+from tts_cache import tts_cache
+from inference_executor import inference_executor, InferenceQueueFull, INFERENCE_TORCH_THREADS
+from speech_backends import SPEECH_BACKEND, load_speech_model
+
+MODEL_NAME = "facebook/mms-tts-vie"
+# Chat-only replicas set ENABLE_TTS=0 and never import torch
+TTS_ENABLED = env_flag("ENABLE_TTS")
+SAMPLE_RATE = 16000
+# Streaming mode: sentences longer than this are split further at commas/spaces
+MAX_SENTENCE_CHARS = 200
+# Short pause inserted between streamed sentences
+SENTENCE_PAUSE_SECONDS = 0.15
+# Forward passes run on the "tts" inference lane with this many workers
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "1"))
+# Intra-op threads of the ONNX Runtime session (SPEECH_BACKEND=onnx); torch models use INFERENCE_TORCH_THREADS
+TTS_ONNX_THREADS = int(os.environ.get("TTS_ONNX_THREADS", str(INFERENCE_TORCH_THREADS)))
+
+# Quantized/ONNX backends sound slightly different, so they get their own cache entries
+CACHE_MODEL_ID = MODEL_NAME if SPEECH_BACKEND == "eager" else f"{MODEL_NAME}@{SPEECH_BACKEND}"
+
+# Loaded on first use by load_model()
+torch = None
+sf = None
+tokenizer = None
+model = None
+_load_lock = threading.Lock()
+_load_failed = False
+
+
+def load_model():
+    """
+    Load the VITS model and tokenizer on first use (thread-safe).
+    Returns True when TTS is available.
+    """
+    global torch, sf, tokenizer, model, _load_failed
+    if model is not None:
+        return True
+    if not TTS_ENABLED or _load_failed:
+        return False
+    with _load_lock:
+        if model is None and not _load_failed:
+            try:
+                with startup_report.measure("tts: import torch/transformers"):
+                    from transformers import VitsModel, AutoTokenizer
+                    import torch as torch_module
+                    import soundfile as soundfile_module
+                with startup_report.measure(f"tts: load model ({SPEECH_BACKEND})"):
+                    loaded_model = load_speech_model(VitsModel, MODEL_NAME, threads=TTS_ONNX_THREADS)
+                    loaded_tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+                # `model` is assigned last: other threads treat it as the ready flag
+                torch, sf, tokenizer = torch_module, soundfile_module, loaded_tokenizer
+                model = loaded_model
+            except Exception as e:
+                _load_failed = True
+                print(f"Warning: TTS model not available ({e}). TTS functionality will be disabled.")
+    return model is not None
+
+
+def is_available():
+    return load_model()
 
-try:
-    from transformers import VitsModel, AutoTokenizer
-    import torch
-    import soundfile as sf
-    
-    model = VitsModel.from_pretrained("facebook/mms-tts-vie") 
-    tokenizer = AutoTokenizer.from_pretrained("facebook/mms-tts-vie") 
-    TTS_AVAILABLE = True
-except ImportError:
-    TTS_AVAILABLE = False
-    print("Warning: TTS libraries not available. TTS functionality will be disabled.")
 
 def generate_tts_audio(text):
     """
     Convert text to speech and return a BytesIO WAV buffer.
+
+    The text is synthesized sentence by sentence with short pauses (render_pcm),
+    the same audio /api/tts/stream sends.
     """
-    if not TTS_AVAILABLE:
+    # A cached clip is served without loading the model
+    pcm = tts_cache.get(CACHE_MODEL_ID, text, SAMPLE_RATE) if TTS_ENABLED else None
+    if pcm is not None:
+        return io.BytesIO(wav_bytes(pcm))
+
+    if not load_model():
         # Return empty audio buffer as fallback
         buffer = io.BytesIO()
         # Create a simple silence audio
@@ -27,7 +90,7 @@ def generate_tts_audio(text):
             with wave.open(buffer, 'wb') as wav_file:
                 wav_file.setnchannels(1)
                 wav_file.setsampwidth(2)
-                wav_file.setframerate(16000)
+                wav_file.setframerate(SAMPLE_RATE)
                 wav_file.writeframes((silence * 32767).astype(np.int16).tobytes())
         except:
             pass
@@ -35,20 +98,197 @@ def generate_tts_audio(text):
         return buffer
     
     try:
-        inputs = tokenizer(text, return_tensors="pt")
-        with torch.no_grad():
-            output = model(**inputs)
-            waveform = output.waveform if hasattr(output, "waveform") else output
-        audio_np = waveform.squeeze().cpu().numpy()
-
-        # Encode audio to WAV format using soundfile
-        buffer = io.BytesIO()
-        sf.write(buffer, audio_np, samplerate=16000, format='WAV')
-        buffer.seek(0)
-        return buffer
+        pcm = render_pcm(text)
+        tts_cache.put(CACHE_MODEL_ID, text, pcm, SAMPLE_RATE)
+        return io.BytesIO(wav_bytes(pcm))
+    except InferenceQueueFull:
+        raise
     except Exception as e:
         print(f"TTS Error: {e}")
         # Return empty buffer on error
         buffer = io.BytesIO()
         buffer.seek(0)
-        return buffer
\ No newline at end of file
+        return buffer
+
+
+def sentence_pause():
+    return to_pcm16(np.zeros(int(SAMPLE_RATE * SENTENCE_PAUSE_SECONDS), dtype=np.float32))
+
+
+def render_pcm(text):
+    """
+    The same rendition iter_tts_audio streams (sentences joined by short pauses),
+    synthesized in one go, so both endpoints sound the same and share cache entries.
+    """
+    pause = sentence_pause()
+    parts = []
+    for sentence in split_sentences(text):
+        if parts:
+            parts.append(pause)
+        parts.append(to_pcm16(synthesize(sentence)))
+    return b"".join(parts)
+
+
+def synthesize(text):
+    """
+    Run VITS on `text` (on the TTS inference lane) and return the waveform as a float32 array.
+    """
+    return inference_executor.run("tts", _synthesize, text)
+
+
+def _synthesize(text):
+    inputs = tokenizer(text, return_tensors="pt")
+    with torch.no_grad():
+        output = model(**inputs)
+        waveform = output.waveform if hasattr(output, "waveform") else output
+    return waveform.squeeze().cpu().numpy()
+
+
+inference_executor.register("tts", workers=TTS_WORKERS)
+
+
+SENTENCE_END = re.compile(r'(?<=[.!?…;:])\s+|\n+')
+CLAUSE_END = re.compile(r'(?<=[,])\s+')
+
+
+def split_sentences(text, max_chars=MAX_SENTENCE_CHARS):
+    """
+    Split text into sentences for streaming synthesis; overly long sentences are
+    split at commas, then at word boundaries, so each piece stays under max_chars.
+    """
+    pieces = []
+    for sentence in SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        current = ""
+        for part in CLAUSE_END.split(sentence):
+            for word in (part.split(" ") if len(part) > max_chars else [part]):
+                if current and len(current) + len(word) + 1 > max_chars:
+                    pieces.append(current)
+                    current = word
+                else:
+                    current = f"{current} {word}".strip()
+        if current:
+            pieces.append(current)
+    return pieces
+
+
+def wav_stream_header(sample_rate=SAMPLE_RATE):
+    """
+    16-bit mono WAV header with unknown length (0xFFFFFFFF sizes), as used for
+    streamed WAV: players read until the connection closes.
+    """
+    byte_rate = sample_rate * 2
+    return (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, byte_rate, 2, 16)
+            + b"data" + struct.pack("<I", 0xFFFFFFFF))
+
+
+def wav_bytes(pcm, sample_rate=SAMPLE_RATE):
+    """Complete 16-bit mono WAV file for a known block of PCM."""
+    header = wav_stream_header(sample_rate)
+    return (b"RIFF" + struct.pack("<I", 36 + len(pcm)) + header[8:40]
+            + struct.pack("<I", len(pcm)) + pcm)
+
+
+def to_pcm16(audio_np):
+    return (np.clip(audio_np, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def iter_tts_audio(text):
+    """
+    Stream text as WAV: yields the header, then the PCM frames of each sentence
+    as soon as it is synthesized. Synthesis runs one sentence ahead on a worker
+    thread, so the next sentence is being generated while the current one plays.
+    """
+    yield wav_stream_header()
+    if not TTS_ENABLED:
+        yield to_pcm16(np.zeros(SAMPLE_RATE, dtype=np.float32))
+        return
+    cached = tts_cache.get(CACHE_MODEL_ID, text, SAMPLE_RATE)
+    if cached is not None:
+        yield cached
+        return
+    if not load_model():
+        yield to_pcm16(np.zeros(SAMPLE_RATE, dtype=np.float32))
+        return
+
+    pause = sentence_pause()
+    frames = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    failed = threading.Event()
+    done = object()
+
+    def offer(item):
+        # Bounded waits, so a producer facing a full queue notices a disconnected client
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for sentence in split_sentences(text):
+                if stop.is_set():
+                    return
+                try:
+                    pcm = to_pcm16(synthesize(sentence))
+                except InferenceQueueFull as e:
+                    print(f"TTS Error: {e}")
+                    failed.set()
+                    return
+                except Exception as e:
+                    print(f"TTS Error: {e}")
+                    failed.set()
+                    continue
+                if not offer(pcm):
+                    return
+        finally:
+            offer(done)
+
+    threading.Thread(target=produce, name="tts-stream", daemon=True).start()
+    parts = []
+    try:
+        while True:
+            pcm = frames.get()
+            if pcm is done:
+                break
+            if parts:
+                parts.append(pause)
+                yield pause
+            parts.append(pcm)
+            yield pcm
+        # Only complete renditions are cached, so a replay sounds the same
+        if parts and not failed.is_set():
+            tts_cache.put(CACHE_MODEL_ID, text, b"".join(parts), SAMPLE_RATE)
+    finally:
+        # Client disconnected: let the producer stop after its current sentence
+        stop.set()
+        while not frames.empty():
+            frames.get_nowait()
+
+
+def prewarm(texts):
+    """
+    Render `texts` into the TTS cache (e.g. the chatbot's canned responses) so
+    the first playback is already a cache hit. The model is only loaded if a
+    text is missing from the cache.
+    """
+    if not TTS_ENABLED:
+        return 0
+    rendered = 0
+    for text in texts:
+        if tts_cache.contains(CACHE_MODEL_ID, text):
+            continue
+        # Same sentence-by-sentence rendition the streaming endpoint produces
+        for _ in iter_tts_audio(text):
+            pass
+        rendered += 1
+    return rendered
@@ -0,0 +1,153 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from text_normalization import normalize_text
+
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "./database/tts_cache")
+# Budget of decoded 16-bit PCM kept in the in-memory LRU tier
+TTS_CACHE_MEMORY_MB = float(os.environ.get("TTS_CACHE_MEMORY_MB", "64"))
+# Maximum number of FLAC files kept on disk; the least recently used are deleted first
+TTS_CACHE_MAX_FILES = int(os.environ.get("TTS_CACHE_MAX_FILES", "2000"))
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha1(f"{model}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Synthesized speech keyed by (model id, normalized text).
+
+    The disk tier stores one FLAC file per key (lossless, roughly half the size of
+    WAV); the memory tier keeps the decoded 16-bit PCM of recently played clips,
+    bounded by total bytes, so a hit only costs a dict lookup.
+    """
+
+    def __init__(self, path: str = TTS_CACHE_DIR, memory_mb: float = TTS_CACHE_MEMORY_MB,
+                 max_files: int = TTS_CACHE_MAX_FILES):
+        self.path = path
+        self.memory_budget = int(memory_mb * 1024 * 1024)
+        self.max_files = max(1, max_files)
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.flac")
+
+    def _remember(self, key: str, pcm: bytes):
+        if len(pcm) > self.memory_budget:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = pcm
+        self._memory_bytes += len(pcm)
+        while self._memory_bytes > self.memory_budget:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def get(self, model: str, text: str, sample_rate: int) -> Optional[bytes]:
+        """Return the cached clip as little-endian 16-bit mono PCM, or None."""
+        key = cache_key(model, text)
+        with self._lock:
+            pcm = self._memory.get(key)
+            if pcm is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return pcm
+
+        pcm = self._read_flac(self._file(key), sample_rate)
+        with self._lock:
+            if pcm is None:
+                self.counters["misses"] += 1
+                return None
+            self._remember(key, pcm)
+            self.counters["disk_hits"] += 1
+            return pcm
+
+    def contains(self, model: str, text: str) -> bool:
+        key = cache_key(model, text)
+        with self._lock:
+            if key in self._memory:
+                return True
+        return os.path.exists(self._file(key))
+
+    def put(self, model: str, text: str, pcm: bytes, sample_rate: int):
+        if not pcm:
+            return
+        key = cache_key(model, text)
+        with self._lock:
+            self._remember(key, pcm)
+            self.counters["stores"] += 1
+        try:
+            import soundfile as sf
+            buffer = io.BytesIO()
+            sf.write(buffer, np.frombuffer(pcm, dtype="<i2"), samplerate=sample_rate,
+                     format="FLAC", subtype="PCM_16")
+            # Write to a temp file first so concurrent readers never see a partial FLAC
+            tmp_file = f"{self._file(key)}.{threading.get_ident()}.tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(tmp_file, self._file(key))
+            self._evict_files()
+        except Exception as e:
+            print(f"❌ TTS cache write failed: {e}")
+
+    def _read_flac(self, file: str, sample_rate: int) -> Optional[bytes]:
+        if not os.path.exists(file):
+            return None
+        try:
+            import soundfile as sf
+            audio, file_rate = sf.read(file, dtype="int16")
+            if file_rate != sample_rate:
+                return None
+            # Touch so disk eviction treats the file as recently used
+            os.utime(file)
+            return audio.astype("<i2").tobytes()
+        except Exception as e:
+            print(f"❌ TTS cache entry unreadable, ignoring: {e}")
+            return None
+
+    def _flac_files(self):
+        return [entry for entry in os.scandir(self.path) if entry.name.endswith(".flac")]
+
+    def _evict_files(self):
+        files = self._flac_files()
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.max_files]:
+            try:
+                os.remove(entry.path)
+                with self._lock:
+                    self.counters["evictions"] += 1
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        disk_files = len(self._flac_files())
+        with self._lock:
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "hits": hits,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_mb": round(self._memory_bytes / (1024 * 1024), 2),
+                "disk_entries": disk_files,
+                "max_files": self.max_files,
+            }
+
+
+# Khởi tạo instance global
+tts_cache = TTSCache()
@@ -165,26 +165,49 @@ const ChatbotInterface = () => {
     setIsLoading(true)
 
     try {
-      const response = await fetch('http://127.0.0.1:5001/api/chatbot', {
+      const response = await fetch('http://127.0.0.1:5001/api/chatbot/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ question: message }),
       })
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error('Network response was not ok')
       }
 
-      const data = await response.json()
-      
-      const botMessage = {
-        id: Date.now() + 1,
-        type: 'bot',
-        content: data.response || 'Xin lỗi, tôi không thể xử lý yêu cầu này lúc này.',
-        timestamp: new Date()
+      // Hiển thị câu trả lời dần theo từng sự kiện SSE
+      const botId = Date.now() + 1
+      let content = ''
+      const showContent = (text) => {
+        setMessages(prev => prev.some(m => m.id === botId)
+          ? prev.map(m => m.id === botId ? { ...m, content: text } : m)
+          : [...prev, { id: botId, type: 'bot', content: text, timestamp: new Date() }])
+      }
+
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const events = buffer.split('\n\n')
+        buffer = events.pop()
+        for (const event of events) {
+          const dataLine = event.split('\n').find(line => line.startsWith('data: '))
+          if (!dataLine) continue
+          const payload = JSON.parse(dataLine.slice(6))
+          if (payload.delta) {
+            content += payload.delta
+            setIsLoading(false)
+            showContent(content)
+          }
+        }
       }
 
-      setMessages(prev => [...prev, botMessage])
+      if (!content) {
+        showContent('Xin lỗi, tôi không thể xử lý yêu cầu này lúc này.')
+      }
     } catch (error) {
       console.error('Error:', error)
       const errorMessage = {
@@ -215,6 +238,51 @@ const ChatbotInterface = () => {
     ))
   }
 
+  // Phát WAV 16-bit mono được stream theo từng câu: đọc body bằng fetch và lên lịch
+  // từng đoạn PCM bằng Web Audio, nên câu đầu tiên phát ngay khi server gửi tới
+  const playWavStream = async (response, player) => {
+    const reader = response.body.getReader()
+    const context = player.context
+    let header = null
+    let pending = new Uint8Array(0)
+    let sampleRate = 0
+    let playAt = 0
+    let lastSource = null
+
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done || player.stopped) break
+      const merged = new Uint8Array(pending.length + value.length)
+      merged.set(pending)
+      merged.set(value, pending.length)
+      pending = merged
+
+      if (!header) {
+        if (pending.length < 44) continue
+        header = new DataView(pending.buffer, 0, 44)
+        sampleRate = header.getUint32(24, true)
+        pending = pending.slice(44)
+      }
+      const usable = pending.length - (pending.length % 2)
+      if (!usable) continue
+      const samples = new Int16Array(pending.buffer.slice(0, usable))
+      pending = pending.slice(usable)
+
+      const buffer = context.createBuffer(1, samples.length, sampleRate)
+      const channel = buffer.getChannelData(0)
+      for (let i = 0; i < samples.length; i++) channel[i] = samples[i] / 32768
+      const source = context.createBufferSource()
+      source.buffer = buffer
+      source.connect(context.destination)
+      playAt = Math.max(playAt, context.currentTime)
+      source.start(playAt)
+      playAt += buffer.duration
+      lastSource = source
+    }
+    reader.cancel().catch(() => {})
+    return lastSource
+  }
+
   const handlePlayTTS = async (message) => {
     if (playingId === message.id) {
       audioRef.current?.pause()
@@ -223,30 +291,54 @@ const ChatbotInterface = () => {
       return
     }
 
+    if (audioRef.current) {
+      audioRef.current.pause()
+    }
+    const controller = new AbortController()
+    const player = {
+      context: new (window.AudioContext || window.webkitAudioContext)(),
+      stopped: false,
+      pause() {
+        this.stopped = true
+        controller.abort()
+        this.context.close().catch(() => {})
+      }
+    }
+    audioRef.current = player
+
+    const finish = () => {
+      if (audioRef.current === player) {
+        audioRef.current = null
+        setPlayingId(null)
+      }
+    }
+
     try {
       setPlayingId(message.id)
-      const res = await fetch("http://127.0.0.1:5001/api/tts", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ text: message.content })
+      // Gửi câu trả lời trong body (không đưa vào URL) và phát audio theo từng câu
+      const res = await fetch('http://127.0.0.1:5001/api/tts/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ text: message.content }),
+        signal: controller.signal
       })
-      if (!res.ok) throw new Error("TTS API error")
-      const blob = await res.blob()
-      const url = URL.createObjectURL(blob)
-
-      if (audioRef.current) {
-        audioRef.current.pause()
-      }
-      audioRef.current = new Audio(url)
-      audioRef.current.play()
+      if (!res.ok || !res.body) throw new Error("TTS API error")
 
-      audioRef.current.onended = () => {
-        setPlayingId(null)
-        audioRef.current = null
+      const lastSource = await playWavStream(res, player)
+      if (lastSource && !player.stopped) {
+        lastSource.onended = () => {
+          player.pause()
+          finish()
+        }
+      } else {
+        finish()
       }
     } catch (err) {
-      console.error("TTS error:", err)
-      setPlayingId(null)
+      if (!player.stopped) {
+        console.error("TTS error:", err)
+        player.pause()
+      }
+      finish()
     }
   }
 
@@ -278,16 +370,35 @@ const ChatbotInterface = () => {
     const audioBlob = new Blob(audioChunksRef.current, { type: 'audio/webm' })
     const formData = new FormData()
     formData.append('audio', audioBlob, 'recording.webm')
+    // Nhận transcript từng đoạn để bản ghi dài hiện dần vào ô nhập
+    formData.append('stream', 'true')
 
     try {
       const res = await fetch('http://127.0.0.1:5001/api/stt', {
         method: 'POST',
         body: formData
       })
-      if (!res.ok) throw new Error("STT API error")
-      const data = await res.json()
-      if (data.text) {
-        setInputValue(data.text)
+      if (!res.ok || !res.body) throw new Error("STT API error")
+
+      const reader = res.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const events = buffer.split('\n\n')
+        buffer = events.pop()
+        for (const event of events) {
+          const dataLine = event.split('\n').find(line => line.startsWith('data: '))
+          if (!dataLine) continue
+          const payload = JSON.parse(dataLine.slice(6))
+          if (payload.error) throw new Error(payload.error)
+          const text = payload.transcript ?? payload.text
+          if (text) {
+            setInputValue(text)
+          }
+        }
       }
     } catch (err) {
       console.error("STT error:", err)